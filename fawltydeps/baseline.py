@@ -0,0 +1,287 @@
+"""Reuse the results of a previous run, and only parse the files that changed.
+
+In pre-commit hooks and CI jobs, typically only a handful of files change
+between two runs of FawltyDeps. Given the --json output from a previous run
+(the "baseline") and the list of files that have changed since (e.g. from
+'git diff --name-only'), we only need to parse the changed files; the imports
+and declared dependencies of all other files are taken from the baseline.
+
+The project is still traversed as usual (so that new, removed and excluded
+files are handled exactly as in a full run), and undeclared/unused
+dependencies are calculated from scratch from the merged results.
+
+Paths in the baseline are interpreted relative to the current directory, so
+the baseline must be created from the same directory as where it is used.
+"""
+
+import json
+import logging
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+from fawltydeps import extract_deps, extract_imports
+from fawltydeps.main import Analysis, RecordCallback
+from fawltydeps.settings import Settings
+from fawltydeps.timings import timed
+from fawltydeps.toml_cache import toml_cache
+from fawltydeps.types import (
+    CodeSource,
+    DeclaredDependency,
+    DepsSource,
+    Location,
+    ParsedImport,
+    ParserChoice,
+    UnparseablePathError,
+)
+
+logger = logging.getLogger(__name__)
+
+# The (name, cellno, lineno) of an import or declared dependency in a file
+Entry = tuple[str, Optional[int], Optional[int]]
+
+
+@dataclass
+class Baseline:
+    """The parts of a previous analysis that can be reused.
+
+    All paths are absolute. A file is only present in .code or .deps if its
+    imports or declared dependencies were part of the previous analysis, in
+    which case it is also present (possibly with no entries) in .imports or
+    .declared_deps, respectively.
+    """
+
+    code: dict[Path, Optional[Path]] = field(default_factory=dict)  # -> base_dir
+    deps: dict[Path, ParserChoice] = field(default_factory=dict)
+    imports: dict[Path, list[Entry]] = field(default_factory=dict)
+    declared_deps: dict[Path, list[Entry]] = field(default_factory=dict)
+
+    @cached_property
+    def known_dirs(self) -> set[Path]:
+        """All directories that contained a source in the baseline."""
+        return {parent for path in [*self.code, *self.deps] for parent in path.parents}
+
+    def changed_dirs(self, changed: Iterable[Path]) -> set[Path]:
+        """Find the directories where entries were added or removed.
+
+        A file that is added or removed might also add or remove one or more
+        directories above it. Return the parent directory of the topmost of
+        these, i.e. the directory whose listing has changed. Adding or
+        removing a module there may change whether imports of that module in
+        other files are considered first- or third-party.
+        """
+        ret = set()
+        for path in changed:
+            if path in self.code or path in self.deps:
+                if path.exists():
+                    continue  # modified, not added or removed
+                added = False
+            elif path.exists():
+                added = True
+            else:
+                continue  # neither here now, nor known in the baseline
+            top = path
+            for parent in path.parents:
+                # Was 'parent' also added (i.e. new) or removed (i.e. gone)?
+                if (parent in self.known_dirs) if added else parent.exists():
+                    break
+                top = parent
+            ret.add(top.parent)
+        return ret
+
+
+def _entries(items: list[dict[str, object]]) -> dict[Path, list[Entry]]:
+    """Group the given imports/declared_deps from the JSON output by path."""
+    ret: dict[Path, list[Entry]] = {}
+    for item in items:
+        location = item["source"]
+        assert isinstance(location, dict)  # noqa: S101, sanity check
+        ret.setdefault(Path(location["path"]).absolute(), []).append(
+            (str(item["name"]), location.get("cellno"), location.get("lineno"))
+        )
+    return ret
+
+
+def load_baseline(path: Path) -> Baseline:
+    """Read a Baseline from the --json output of a previous FawltyDeps run.
+
+    Raise UnparseablePathError if the file cannot be read or parsed.
+    """
+    try:
+        with path.open(encoding="utf-8") as f:
+            data = json.load(f)
+        ret = Baseline()
+        code_sources: dict[Path, Optional[Path]] = {}
+        deps_sources: dict[Path, ParserChoice] = {}
+        # Code from stdin, or that failed to parse, has no imports to reuse
+        unusable = {"<stdin>"}
+        unusable.update(src["path"] for src in data.get("failed_sources") or [])
+        for src in data.get("sources") or []:
+            if src["source_type"] == "CodeSource" and src["path"] not in unusable:
+                base_dir = src.get("base_dir")
+                code_sources[Path(src["path"]).absolute()] = (
+                    None if base_dir is None else Path(base_dir).absolute()
+                )
+            elif src["source_type"] == "DepsSource":
+                deps_sources[Path(src["path"]).absolute()] = ParserChoice(
+                    src["parser_choice"]
+                )
+        # Sources are only reusable if they were also parsed
+        if data.get("imports") is not None:
+            ret.code = code_sources
+            ret.imports = _entries(data["imports"])
+            for code_path in ret.code:
+                ret.imports.setdefault(code_path, [])
+        if data.get("declared_deps") is not None:
+            ret.deps = deps_sources
+            ret.declared_deps = _entries(data["declared_deps"])
+            for deps_path in ret.deps:
+                ret.declared_deps.setdefault(deps_path, [])
+    except OSError as exc:
+        raise UnparseablePathError(
+            ctx=f"Cannot read baseline: {exc.strerror}", path=path
+        ) from exc
+    except (ValueError, KeyError, TypeError, AttributeError) as exc:
+        raise UnparseablePathError(
+            ctx=f"Not a valid baseline (from fawltydeps --json): {exc!r}", path=path
+        ) from exc
+    return ret
+
+
+def read_changed_paths(paths: list[str], stdin: BinaryIO) -> set[Path]:
+    """Return the (absolute) changed paths; "-" reads paths from 'stdin'."""
+    ret: set[Path] = set()
+    for arg in paths:
+        if arg == "-":
+            lines = stdin.read().decode("utf-8").splitlines()
+            ret.update(Path(line).absolute() for line in lines if line)
+        else:
+            ret.add(Path(arg).absolute())
+    return ret
+
+
+class BaselineAnalysis(Analysis):
+    """Analysis that reuses results for files that did not change.
+
+    The .imports and .declared_deps of each source are taken from the
+    baseline, unless the file has changed, is not in the baseline, or was
+    parsed differently in the baseline (i.e. with another base_dir or parser).
+    All other members are calculated as usual. The sources that were parsed
+    are collected in .parsed.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        settings: Settings,
+        baseline: Baseline,
+        changed: set[Path],
+        stdin: Optional[BinaryIO] = None,
+        on_record: Optional[RecordCallback] = None,
+        *,
+        aggregate_imports: bool = False,
+    ):
+        super().__init__(
+            settings, stdin, on_record, aggregate_imports=aggregate_imports
+        )
+        self.baseline = baseline
+        self.changed = changed
+        self.changed_dirs = baseline.changed_dirs(changed)
+        self.parsed: set[Union[CodeSource, DepsSource]] = set()
+
+    def _baseline_imports(self, src: CodeSource) -> Optional[list[Entry]]:
+        """Return the imports of 'src' from the baseline, if still valid."""
+        if not isinstance(src.path, Path):
+            return None  # <stdin>
+        path = src.path.absolute()
+        base_dir = None if src.base_dir is None else src.base_dir.absolute()
+        if path in self.changed or path not in self.baseline.code:
+            return None
+        if self.baseline.code[path] != base_dir:
+            return None
+        if any(
+            d.absolute() in self.changed_dirs
+            for d in extract_imports.first_party_dirs(src)
+        ):
+            return None  # a first-party module might have been added/removed
+        return self.baseline.imports[path]
+
+    def _baseline_declared_deps(self, src: DepsSource) -> Optional[list[Entry]]:
+        """Return the declared deps of 'src' from the baseline, if still valid."""
+        path = src.path.absolute()
+        if path in self.changed or self.baseline.deps.get(path) != src.parser_choice:
+            return None
+        return self.baseline.declared_deps[path]
+
+    @cached_property
+    @timed("parse code")
+    def imports(self) -> list[ParsedImport]:
+        """The list of 3rd-party imports from the baseline or parsed anew."""
+
+        def generate() -> Iterator[ParsedImport]:
+            todo: list[CodeSource] = []
+            for src in self.sources:
+                if not isinstance(src, CodeSource):
+                    continue
+                entries = self._baseline_imports(src)
+                if entries is None:
+                    self.parsed.add(src)
+                    todo.append(src)
+                else:
+                    for name, cellno, lineno in entries:
+                        yield ParsedImport(name, Location(src.path, cellno, lineno))
+            # Parsed like in a full analysis, e.g. in isolated workers
+            yield from self.parse_code(todo)
+
+        return self._collect_imports(generate())
+
+    @cached_property
+    @timed("parse deps")
+    def declared_deps(self) -> list[DeclaredDependency]:
+        """The list of declared dependencies from the baseline or parsed anew."""
+
+        def generate() -> Iterator[DeclaredDependency]:
+            for src in self.sources:
+                if not isinstance(src, DepsSource):
+                    continue
+                entries = self._baseline_declared_deps(src)
+                if entries is None:
+                    self.parsed.add(src)
+                    yield from extract_deps.parse_source(src)
+                else:
+                    for name, cellno, lineno in entries:
+                        yield DeclaredDependency(
+                            name, Location(src.path, cellno, lineno)
+                        )
+
+        return list(self._records("declared_dep", generate()))
+
+
+def create_analysis(  # noqa: PLR0913
+    settings: Settings,
+    baseline: Baseline,
+    changed: set[Path],
+    stdin: Optional[BinaryIO] = None,
+    on_record: Optional[RecordCallback] = None,
+    *,
+    aggregate_imports: bool = False,
+) -> BaselineAnalysis:
+    """Like Analysis.create(), but reuse results from the given baseline."""
+    ret = BaselineAnalysis(
+        settings,
+        baseline,
+        changed,
+        stdin,
+        on_record,
+        aggregate_imports=aggregate_imports,
+    )
+    try:
+        ret.compute()
+    finally:
+        toml_cache.clear()  # parsed TOML is only shared within one run
+    logger.info(
+        "Parsed %d changed or new sources, reused the rest from the baseline",
+        len(ret.parsed),
+    )
+    return ret
@@ -0,0 +1,336 @@
+"""Analyze all the projects in a monorepo in one go.
+
+In a monorepo with many Python projects (directories containing any of
+PROJECT_FILES), running FawltyDeps once per project repeats a lot of work:
+The monorepo is traversed over and over, and - more importantly - the Python
+environments that are shared between projects are enumerated once for every
+project.
+
+In batch mode, we instead traverse the monorepo _once_ to find all projects
+and Python environments. Each project is then analyzed separately, but the
+package resolvers (and the packages they have found) are shared between all
+projects that use the same Python environments. The projects are spread
+across a pool of worker processes, and the results are combined into one
+report.
+
+A project sees the Python environments found inside it, as well as those that
+are not inside any project (e.g. a virtualenv shared by the whole monorepo).
+The code and dependency declarations of nested projects are excluded from
+their enclosing project.
+
+A project with a [tool.fawltydeps] section in its own pyproject.toml is
+configured by that (overridden by the environment and the command line), as
+if FawltyDeps was run inside the project. Other projects use the settings of
+the batch run itself.
+"""
+
+import argparse
+import json
+import logging
+import os
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import cached_property, partial
+from io import StringIO
+from pathlib import Path
+from typing import Optional, TextIO
+
+from fawltydeps.gitignore_parser import RuleError as ExcludeRuleError
+from fawltydeps.json_writer import JsonWriter, write_ndjson_record
+from fawltydeps.main import Analysis, RecordCallback, assign_exit_code, print_output
+from fawltydeps.packages import BasePackageResolver, InstalledEnvsCache
+from fawltydeps.settings import OutputFormat, PyprojectTomlSettingsSource, Settings
+from fawltydeps.timings import timed
+from fawltydeps.toml_cache import toml_cache
+from fawltydeps.traverse_project import find_projects
+from fawltydeps.types import (
+    PyEnvSource,
+    UnparseablePathError,
+    UnresolvedDependenciesError,
+)
+from fawltydeps.utils import version
+
+logger = logging.getLogger(__name__)
+
+PROJECT_FILES = {"pyproject.toml", "setup.py", "setup.cfg"}
+JSON_FORMATS = {OutputFormat.JSON, OutputFormat.JSON_COMPACT}
+
+
+@dataclass
+class SharedResolvers:
+    """The resolvers shared between the projects analyzed in one process.
+
+    .resolvers holds the resolvers for each set of Python environments, and
+    .envs_cache holds the packages found in each Python environment (shared
+    between differently configured resolvers). A new SharedResolvers is made
+    for each batch run (and each worker process), so nothing is reused from
+    earlier runs.
+    """
+
+    resolvers: dict[frozenset[PyEnvSource], list[BasePackageResolver]] = field(
+        default_factory=dict
+    )
+    envs_cache: InstalledEnvsCache = field(default_factory=InstalledEnvsCache)
+
+
+# The SharedResolvers of this worker process (see init_worker())
+worker_shared: Optional[SharedResolvers] = None
+
+
+@dataclass
+class Monorepo:
+    """The projects and Python environments found in a monorepo."""
+
+    projects: list[Path]
+    pyenvs: set[PyEnvSource]
+
+    @classmethod
+    def find(cls, settings: Settings) -> "Monorepo":
+        """Traverse the directories in settings to find projects and pyenvs."""
+        return cls(*find_projects(settings, PROJECT_FILES))
+
+    def owner(self, path: Path) -> Optional[Path]:
+        """Return the innermost project that contains 'path', if any."""
+        owners = [proj for proj in self.projects if path.is_relative_to(proj)]
+        return max(owners, key=lambda proj: len(proj.parts), default=None)
+
+    def project_settings(
+        self,
+        settings: Settings,
+        project: Path,
+        cmdline_args: Optional[argparse.Namespace] = None,
+    ) -> Settings:
+        """Return the settings for analyzing one project.
+
+        Use the project's own configuration (see project_config()) if it has
+        one, otherwise the given settings. Either way, the code, deps and
+        pyenvs are those of the project, and the output format is the one
+        from the given settings (as the output of all projects is combined).
+        """
+        config = project_config(project, cmdline_args or argparse.Namespace())
+        if config is not None:
+            settings = config.copy(update={"output_format": settings.output_format})
+        nested = [
+            f"/{other.relative_to(project).as_posix()}/"
+            for other in self.projects
+            if other != project and other.is_relative_to(project)
+        ]
+        return settings.copy(
+            update={
+                "code": {project},
+                "deps": {project},
+                "pyenvs": {
+                    src.path
+                    for src in self.pyenvs
+                    if self.owner(src.path) in {project, None}
+                },
+                "exclude": settings.exclude | set(nested),
+            }
+        )
+
+
+def project_config(
+    project: Path, cmdline_args: argparse.Namespace
+) -> Optional[Settings]:
+    """Return the settings from the project's own configuration, if any.
+
+    These are read from the [tool.fawltydeps] section of the project's
+    pyproject.toml, and then overridden by the environment and the given
+    command-line args. Return None if there is no such section.
+    """
+    config_file = project / "pyproject.toml"
+    source = PyprojectTomlSettingsSource(config_file, Settings.config_section)
+    try:
+        with toml_cache.document(config_file) as toml_data:
+            source.get_section(toml_data)
+    except (KeyError, FileNotFoundError):
+        return None
+    saved_config_file = Settings.config_file
+    try:
+        settings = Settings.config(config_file=config_file).create(cmdline_args)
+    finally:
+        Settings.config(config_file=saved_config_file)
+    # Paths in the configuration file are relative to the project
+    args = vars(cmdline_args)
+    update: dict[str, object] = {}
+    if "custom_mapping_file" not in args:
+        update["custom_mapping_file"] = {
+            project / path for path in settings.custom_mapping_file
+        }
+    if "exclude_from" not in args:
+        update["exclude_from"] = {project / path for path in settings.exclude_from}
+    if "base_dir" not in args and settings.base_dir is not None:
+        update["base_dir"] = project / settings.base_dir
+    return settings.copy(update=update)
+
+
+class ProjectAnalysis(Analysis):
+    """Analysis of one project that shares resolvers with other projects."""
+
+    def __init__(
+        self,
+        settings: Settings,
+        shared: SharedResolvers,
+        on_record: Optional[RecordCallback] = None,
+    ):
+        super().__init__(settings, on_record=on_record)
+        self.shared = shared
+        self.envs_cache = shared.envs_cache
+
+    @cached_property
+    @timed("setup resolvers")
+    def resolvers(self) -> list[BasePackageResolver]:
+        """The resolvers for this project's Python environments (shared)."""
+        key = frozenset(src for src in self.sources if isinstance(src, PyEnvSource))
+        if key not in self.shared.resolvers:
+            self.shared.resolvers[key] = super().resolvers
+        return self.shared.resolvers[key]
+
+
+@dataclass
+class ProjectResult:
+    """The exit code and output from analyzing one project."""
+
+    project: Path
+    exit_code: int
+    output: str
+
+
+def analyze_project(
+    project: Path, settings: Settings, shared: SharedResolvers
+) -> ProjectResult:
+    """Analyze one project, sharing resolvers via 'shared', and capture its output.
+
+    The JSON output formats are always captured in compact form, so that they
+    can be combined by print_results(). Errors are logged, and reflected in
+    the exit code (as in main()).
+    """
+    out = StringIO()
+    on_record: Optional[RecordCallback] = None
+    if settings.output_format == OutputFormat.NDJSON:
+        # Identify the project (first) in each record
+        on_record = partial(write_ndjson_record, out, project=project)
+    analysis = ProjectAnalysis(settings, shared, on_record)
+    try:
+        analysis.compute()
+    except (UnparseablePathError, ExcludeRuleError) as exc:
+        logger.error("%s: %s", project, exc)
+        return ProjectResult(project, 2, "")
+    except UnresolvedDependenciesError as exc:
+        logger.error("%s: %s", project, exc.msg)
+        return ProjectResult(project, 5, "")
+    finally:
+        toml_cache.clear()  # as in Analysis.create()
+    exit_code = assign_exit_code(analysis)
+    if settings.output_format in JSON_FORMATS:
+        analysis.print_json(out, compact=True)
+    else:
+        print_output(analysis, exit_code, out)
+    return ProjectResult(project, exit_code, out.getvalue())
+
+
+def init_worker() -> None:
+    """Give this (new) worker process its own SharedResolvers."""
+    global worker_shared  # noqa: PLW0603
+    worker_shared = SharedResolvers()
+
+
+def analyze_project_in_worker(project: Path, settings: Settings) -> ProjectResult:
+    """Analyze one project with the SharedResolvers of this worker process."""
+    assert worker_shared is not None  # noqa: S101, set by init_worker()
+    return analyze_project(project, settings, worker_shared)
+
+
+def analyze_projects(
+    projects: list[Path], settings: list[Settings], jobs: int
+) -> Iterator[ProjectResult]:
+    """Analyze the given projects, using 'jobs' worker processes."""
+    if jobs <= 1 or len(projects) <= 1:
+        shared = SharedResolvers()
+        yield from map(partial(analyze_project, shared=shared), projects, settings)
+        return
+    # Bigger chunks share more resolvers, smaller chunks balance the load
+    chunksize = max(1, len(projects) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as executor:
+        yield from executor.map(
+            analyze_project_in_worker, projects, settings, chunksize=chunksize
+        )
+
+
+def combined_exit_code(exit_codes: Iterable[int]) -> int:
+    """Return the most important of the given exit codes.
+
+    Lower non-zero exit codes take precedence, like in assign_exit_code().
+    """
+    return min((code for code in exit_codes if code != 0), default=0)
+
+
+def print_results(
+    results: Iterable[ProjectResult], output_format: OutputFormat, out: TextIO
+) -> int:
+    """Print the combined report for all projects, and return the exit code."""
+    if output_format in JSON_FORMATS:
+        results = list(results)
+        exit_code = combined_exit_code(result.exit_code for result in results)
+        writer = JsonWriter(
+            out, indent=None if output_format == OutputFormat.JSON_COMPACT else 2
+        )
+        writer.write_object(
+            [
+                (
+                    "projects",
+                    [
+                        {
+                            "project": result.project,
+                            "exit_code": result.exit_code,
+                            "analysis": json.loads(result.output or "null"),
+                        }
+                        for result in results
+                    ],
+                ),
+                ("exit_code", exit_code),
+                ("version", version()),
+            ]
+        )
+        out.write("\n")
+        return exit_code
+
+    exit_codes: list[int] = []
+    for result in results:
+        if output_format == OutputFormat.NDJSON:
+            out.write(result.output)
+        else:
+            if exit_codes:
+                out.write("\n")
+            out.write(f"==> {result.project} <==\n{result.output}")
+        exit_codes.append(result.exit_code)
+    return combined_exit_code(exit_codes)
+
+
+def run_batch(
+    settings: Settings,
+    out: TextIO,
+    jobs: Optional[int] = None,
+    cmdline_args: Optional[argparse.Namespace] = None,
+) -> int:
+    """Find and analyze all projects in a monorepo, and print the results.
+
+    The 'cmdline_args' (if given) override the projects' own configuration.
+    """
+    monorepo = Monorepo.find(settings)
+    logger.info(
+        "Found %d projects and %d Python environments",
+        len(monorepo.projects),
+        len(monorepo.pyenvs),
+    )
+    if not monorepo.projects:
+        logger.warning("No projects found (looking for any of %s)", PROJECT_FILES)
+    project_settings = [
+        monorepo.project_settings(settings, project, cmdline_args)
+        for project in monorepo.projects
+    ]
+    results = analyze_projects(
+        monorepo.projects, project_settings, jobs or os.cpu_count() or 1
+    )
+    return print_results(results, settings.output_format, out)
@@ -9,9 +9,11 @@ from collections.abc import Sequence
 from pathlib import Path
 from typing import Any, Optional
 
+from fawltydeps.extract_imports import CODE_SUFFIXES, DEFAULT_CODE_SUFFIXES
 from fawltydeps.settings import (
     Action,
     ParserChoice,
+    SourceDiscovery,
     parse_path_or_stdin,
     read_parser_choice,
 )
@@ -116,6 +118,23 @@ def populate_output_formats(parser: argparse._ActionsContainer) -> None:
         const="json",
         help="Generate JSON output instead of a human-readable report",
     )
+    parser.add_argument(
+        "--json-compact",
+        dest="output_format",
+        action="store_const",
+        const="json_compact",
+        help="Generate JSON output without any indentation or whitespace",
+    )
+    parser.add_argument(
+        "--ndjson",
+        dest="output_format",
+        action="store_const",
+        const="ndjson",
+        help=(
+            "Generate one line of JSON per source, import, dependency, etc."
+            " as soon as it is found"
+        ),
+    )
 
 
 def populate_parser_paths_options(parser: argparse._ActionsContainer) -> None:
@@ -204,6 +223,16 @@ def populate_parser_paths_options(parser: argparse._ActionsContainer) -> None:
             " (imports), dependency declarations and/or Python environments."
         ),
     )
+    parser.add_argument(
+        "--use-gitignore",
+        dest="use_gitignore",
+        action="store_true",
+        help=(
+            "Also exclude the paths that are ignored by the .gitignore files"
+            " (and .git/info/exclude) found while traversing directories, each"
+            " within its own directory tree, like git does."
+        ),
+    )
     parser.add_argument(
         "--base-dir",
         type=Path,
@@ -215,6 +244,93 @@ def populate_parser_paths_options(parser: argparse._ActionsContainer) -> None:
             " (or search_paths) arguments. See docs for more details."
         ),
     )
+    parser.add_argument(
+        "--source-discovery",
+        type=SourceDiscovery,
+        choices=list(SourceDiscovery),
+        help=(
+            "How to find files when traversing directories: 'walk' the"
+            " filesystem (default), or read the git index to find files tracked"
+            " by git, plus untracked files that are not ignored ('git'), or only"
+            " tracked files ('git_tracked')."
+        ),
+    )
+    parser.add_argument(
+        "--extra-code-formats",
+        nargs="+",
+        action="union",
+        choices=sorted(CODE_SUFFIXES - DEFAULT_CODE_SUFFIXES, key=str.lower),
+        metavar="SUFFIX",
+        help=(
+            "Also parse code files with these suffixes when traversing"
+            " directories: Python stubs (.pyi), and the Python code blocks in"
+            " Quarto (.qmd), R Markdown (.Rmd) and Jupytext Markdown (.md)"
+            " documents. By default, only .py and .ipynb files are found."
+        ),
+    )
+    parser.add_argument(
+        "--traversal-threads",
+        type=int,
+        metavar="N",
+        help=(
+            "Number of threads that list directories concurrently while walking"
+            " the filesystem, e.g. to speed up traversal of several big"
+            " directory trees or of network filesystems (default: 0, i.e. no"
+            " threads)."
+        ),
+    )
+    parser.add_argument(
+        "--max-file-size",
+        type=int,
+        metavar="BYTES",
+        help=(
+            "Skip code and dependency files that are bigger than this, when"
+            " found while traversing directories (default: no limit). Skipped"
+            " files are reported separately, and are not parsed."
+        ),
+    )
+    parser.add_argument(
+        "--max-files-per-dir",
+        type=int,
+        metavar="N",
+        help=(
+            "Skip all code and dependency files in directories that contain"
+            " more than N of them, e.g. directories of generated code (default:"
+            " no limit). Skipped directories are reported separately."
+        ),
+    )
+    parser.add_argument(
+        "--max-files",
+        type=int,
+        metavar="N",
+        help=(
+            "Stop parsing code and dependency files found while traversing"
+            " directories after the first N (default: no limit). Files beyond"
+            " that are reported separately, per directory."
+        ),
+    )
+    parser.add_argument(
+        "--parse-timeout",
+        type=float,
+        metavar="SECONDS",
+        help=(
+            "Parse each code file in an isolated worker process, and give up on"
+            " files that take longer than this to parse. Files that fail to"
+            " parse are reported separately, and the analysis continues."
+        ),
+    )
+    parser.add_argument(
+        "--parse-memory-limit",
+        type=int,
+        metavar="BYTES",
+        help=(
+            "Parse each code file in an isolated worker process, whose memory"
+            " use is limited to this (not supported on Windows). The limit"
+            " applies to each worker process as a whole, over its lifetime."
+            " Files that fail to parse are reported separately, and the"
+            " analysis continues."
+        ),
+    )
     parser.add_argument(
         "--install-deps",
         dest="install_deps",
@@ -294,6 +410,83 @@ def populate_parser_other_options(parser: argparse._ActionsContainer) -> None:
         default=False,
         help="Print a TOML config section with the current settings, and exit",
     )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        default=False,
+        help=(
+            "Keep running, and update the analysis whenever files in the project"
+            " change. Only the changed files are parsed again"
+        ),
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        metavar="JSON_FILE",
+        default=None,
+        help=(
+            "Reuse the imports and declared dependencies from the --json output"
+            " of a previous run, and only parse the files given to --changed"
+        ),
+    )
+    parser.add_argument(
+        "--changed",
+        nargs="+",
+        metavar="PATH",
+        default=None,
+        help=(
+            "Files that changed since the --baseline was created (e.g. from"
+            " 'git diff --name-only'). Pass '-' to read paths from stdin, one"
+            " per line"
+        ),
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        default=False,
+        help=(
+            "Find all projects (directories with a pyproject.toml, setup.py or"
+            " setup.cfg) under the given paths, and analyze each of them"
+            " separately, sharing the Python environments between them"
+        ),
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        metavar="N",
+        default=None,
+        help=(
+            "Number of worker processes to use with --batch (default: the"
+            " number of CPUs)"
+        ),
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        default=False,
+        help=(
+            "Report the time, number of items and peak memory use of each"
+            " stage of the analysis (on stderr, and in the JSON output)"
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        metavar="PSTATS_FILE",
+        default=None,
+        help="Run with cProfile, and write the profile (in pstats format) to file",
+    )
+    parser.add_argument(
+        "--daemon",
+        type=Path,
+        metavar="SOCKET",
+        default=None,
+        help=(
+            "Run as a long-running server that answers requests on the given"
+            " Unix socket, keeping caches warm between requests. Send requests"
+            " with: python -m fawltydeps.daemon SOCKET [ARGS...]"
+        ),
+    )
     parser.add_argument(
         "-V",
         "--version",
@@ -0,0 +1,278 @@
+"""Run FawltyDeps as a long-running server, and talk to it from a thin client.
+
+Start the server with 'fawltydeps --daemon SOCKET'. It listens for requests on
+the given Unix socket, and keeps caches warm between requests:
+ - the sources found by traversing the project (see SourcesCache),
+ - the imports parsed from each code file (see ParsedImportsCache),
+ - the packages found in each Python environment (see InstalledEnvsCache),
+ - the parsed contents of TOML files (see TomlCache).
+All of these are invalidated per file/directory by mtime, so the results of a
+request are the same as running 'fawltydeps' directly. The caches are bounded,
+and entries for files and projects that have since been deleted are pruned
+every PRUNE_INTERVAL requests.
+
+The protocol is one line of JSON per request, answered by one line of JSON:
+ - Request: {"argv": [command-line args...], "cwd": "working directory"}
+ - Response: {"exit_code": int, "stdout": "...", "stderr": "..."}
+
+The thin client is run with 'python -m fawltydeps.daemon SOCKET [ARGS...]'.
+It forwards the given command-line arguments (and the current directory) to
+the server, and prints the result. The client only uses the standard library,
+and does not import the rest of FawltyDeps, in order to start up quickly.
+Reading from stdin ('--code -', '--deps -' or '--changed -') is not supported
+via the client, and neither are the modes that would take over the server
+(--daemon, --watch and --batch).
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import traceback
+from collections.abc import Iterator
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from io import BytesIO, StringIO
+from itertools import count
+from pathlib import Path
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+Request = dict[str, Union[str, list[str]]]
+Response = dict[str, Union[int, str]]
+
+# Prune the caches (see prune_caches()) after this many requests
+PRUNE_INTERVAL = 100
+
+# Command-line options (by argparse dest) that cannot be used in a request:
+# they would start a nested server, a blocking loop, or a pool of processes.
+REJECTED_OPTIONS = {"daemon": "--daemon", "watch": "--watch", "batch": "--batch"}
+
+# Command-line options (by argparse dest) that cannot read from stdin in a
+# request, as the client does not forward its stdin to the server.
+STDIN_OPTIONS = {"code": "--code", "deps": "--deps", "changed": "--changed"}
+STDIN_VALUES: set[Union[str, Path]] = {"-", "<stdin>", Path("-")}
+
+
+def enable_caches() -> None:
+    """Enable the caches that make subsequent runs in this process faster."""
+    from fawltydeps import (  # noqa: PLC0415, not needed by the thin client
+        extract_imports,
+        packages,
+        traverse_project,
+    )
+
+    if extract_imports.parsed_imports_cache is None:
+        extract_imports.parsed_imports_cache = extract_imports.ParsedImportsCache()
+    if packages.installed_envs_cache is None:
+        packages.installed_envs_cache = packages.InstalledEnvsCache()
+    if traverse_project.sources_cache is None:
+        traverse_project.sources_cache = traverse_project.SourcesCache()
+
+
+def prune_caches() -> None:
+    """Forget cache entries for files and projects that no longer exist."""
+    from fawltydeps import (  # noqa: PLC0415, not needed by the thin client
+        extract_imports,
+        packages,
+        traverse_project,
+    )
+
+    caches = [
+        extract_imports.parsed_imports_cache,
+        packages.installed_envs_cache,
+        traverse_project.sources_cache,
+    ]
+    for cache in caches:
+        if cache is not None:
+            pruned = cache.prune()
+            logger.debug("Pruned %d entries from %s", pruned, type(cache).__name__)
+
+
+@contextmanager
+def captured_logging() -> Iterator[None]:
+    """Let each request configure logging from scratch (via main()).
+
+    main() configures the root logger with logging.basicConfig(), which only
+    has an effect when the root logger has no handlers. Remove any handlers
+    before and after running a request, so that the verbosity and the stderr
+    (which is redirected) of each request are respected.
+    """
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    root.handlers.clear()
+    try:
+        yield
+    finally:
+        root.handlers[:] = saved_handlers
+        root.setLevel(saved_level)
+
+
+def run_request(argv: list[str], cwd: str) -> Response:
+    """Run FawltyDeps with the given command-line, and capture the result."""
+    # Not needed by the thin client (and fawltydeps.main imports this module)
+    from fawltydeps.cli_parser import build_parser  # noqa: PLC0415
+    from fawltydeps.extract_imports import forget_module_locations  # noqa: PLC0415
+    from fawltydeps.main import main  # noqa: PLC0415
+    from fawltydeps.toml_cache import toml_cache  # noqa: PLC0415
+
+    # isort caches stat() results for the duration of the process, but the
+    # directory structure may have changed since the previous request.
+    forget_module_locations()
+
+    stdout, stderr = StringIO(), StringIO()
+    prev_cwd = Path.cwd()
+    try:
+        os.chdir(cwd)
+        with redirect_stdout(stdout), redirect_stderr(stderr), captured_logging():
+            args = build_parser().parse_args(argv)
+            rejected = [
+                option
+                for dest, option in REJECTED_OPTIONS.items()
+                if getattr(args, dest) not in {None, False}
+            ]
+            from_stdin = [
+                f"{option} -"
+                for dest, option in STDIN_OPTIONS.items()
+                if STDIN_VALUES.intersection(getattr(args, dest, None) or [])
+            ]
+            if rejected:
+                stderr.write(
+                    f"Cannot use {', '.join(rejected)} in a request to the"
+                    " FawltyDeps daemon\n"
+                )
+                exit_code = 2
+            elif from_stdin:
+                stderr.write(
+                    f"Cannot read from stdin ({', '.join(from_stdin)}) in a request"
+                    " to the FawltyDeps daemon\n"
+                )
+                exit_code = 2
+            else:
+                exit_code = main(argv, stdin=BytesIO(), stdout=stdout)
+    except SystemExit as exc:  # e.g. from argparse on --help or parse errors
+        exit_code = exc.code if isinstance(exc.code, int) else 1
+        if isinstance(exc.code, str):
+            stderr.write(exc.code + "\n")
+    except Exception:  # noqa: BLE001 keep serving, but report the failure
+        exit_code = 1
+        stderr.write(traceback.format_exc())
+    finally:
+        os.chdir(prev_cwd)
+        toml_cache.clear()  # parsed TOML is only shared within one request
+    return {
+        "exit_code": exit_code,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+    }
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Handle one request from a client connected to our Unix socket."""
+
+    # Number of requests handled so far (by this process)
+    counter = count(1)
+
+    def handle(self) -> None:
+        """Read a JSON request, run it, and write the JSON response."""
+        try:
+            request = json.loads(self.rfile.readline())
+            argv, cwd = request["argv"], request["cwd"]
+            if not isinstance(argv, list) or not isinstance(cwd, str):
+                raise TypeError("Expected 'argv' (list) and 'cwd' (str)")
+        except (ValueError, KeyError, TypeError) as exc:
+            response: Response = {"exit_code": 2, "stdout": "", "stderr": f"{exc}\n"}
+        else:
+            response = run_request([str(arg) for arg in argv], cwd)
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+        if next(self.counter) % PRUNE_INTERVAL == 0:
+            prune_caches()
+
+
+def make_server(socket_path: Path) -> socketserver.BaseServer:
+    """Create (but don't start) a server listening on the given Unix socket.
+
+    Requests are handled one at a time, as each request changes the current
+    working directory of this process. Only our own user may connect to the
+    socket, as requests run with our permissions.
+    """
+    if not hasattr(socketserver, "UnixStreamServer"):
+        raise OSError("Unix sockets are not supported on this platform")
+    if socket_path.exists():
+        if is_server_alive(socket_path):
+            raise OSError(f"Another server is already listening on {socket_path}")
+        socket_path.unlink()  # remove stale socket left behind by a dead server
+    enable_caches()
+    # Create the socket without any permissions for group/others. (Changing
+    # its permissions after creating it would leave a window for others.)
+    saved_umask = os.umask(0o077)
+    try:
+        return socketserver.UnixStreamServer(str(socket_path), RequestHandler)
+    finally:
+        os.umask(saved_umask)
+
+
+def serve(socket_path: Path) -> int:
+    """Serve requests on the given Unix socket until interrupted."""
+    try:
+        server = make_server(socket_path)
+    except OSError as exc:
+        logger.error("Cannot start FawltyDeps daemon: %s", exc)
+        return 2
+    logger.warning("FawltyDeps daemon listening on %s", socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        socket_path.unlink(missing_ok=True)
+    return 0
+
+
+def send_request(
+    socket_path: Path, argv: list[str], cwd: Optional[Path] = None
+) -> Response:
+    """Send a request to the server listening on 'socket_path'."""
+    request: Request = {"argv": argv, "cwd": str(cwd or Path.cwd())}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile("rb") as response:
+            ret: Response = json.loads(response.readline())
+    return ret
+
+
+def is_server_alive(socket_path: Path) -> bool:
+    """Return True iff a server is accepting connections on 'socket_path'."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            return False
+    return True
+
+
+def client_main(args: Optional[list[str]] = None) -> int:
+    """Thin client entry point: Forward command-line args to a daemon."""
+    if args is None:
+        args = sys.argv[1:]
+    if not args or args[0] in {"-h", "--help"}:
+        sys.stderr.write(
+            "Usage: python -m fawltydeps.daemon SOCKET [FAWLTYDEPS_ARGS...]\n"
+        )
+        return 2
+    try:
+        response = send_request(Path(args[0]), args[1:])
+    except OSError as exc:
+        sys.stderr.write(f"Cannot connect to FawltyDeps daemon at {args[0]}: {exc}\n")
+        return 2
+    sys.stdout.write(str(response["stdout"]))
+    sys.stderr.write(str(response["stderr"]))
+    return int(response["exit_code"])
+
+
+if __name__ == "__main__":
+    sys.exit(client_main())
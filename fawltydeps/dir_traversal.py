@@ -4,14 +4,22 @@ from __future__ import annotations
 
 import logging
 import os
-from collections.abc import Iterator
+import threading
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
-from functools import lru_cache
+from functools import lru_cache, partial
 from pathlib import Path
 from typing import Generic, NamedTuple, Optional, TypeVar
 
+from fawltydeps.git_index import find_git_dir, find_worktree, gitignore_rules
 from fawltydeps.gitignore_parser import Rule as ExcludeRule
-from fawltydeps.gitignore_parser import match_rules, parse_gitignore
+from fawltydeps.gitignore_parser import (
+    last_matching_rule,
+    match_rules,
+    match_rules_in_dir,
+    parse_gitignore,
+)
 from fawltydeps.utils import dirs_between
 
 T = TypeVar("T")
@@ -31,21 +39,193 @@ class DirId(NamedTuple):
     ino: int
 
     @classmethod
-    @lru_cache  # Cache stat() calls, but only with absolute paths
-    def from_abs_path(cls, abs_path: Path) -> DirId:
-        """Construct DirId from given absolute directory path."""
-        assert abs_path.is_absolute()  # noqa: S101, sanity check
-        dir_stat = abs_path.stat()  # <- expensive
+    def from_path(cls, path: Path) -> DirId:
+        """Construct DirId from given directory path.
+
+        This calls stat() every time, use a StatCache to avoid repeated calls.
+        """
+        dir_stat = path.stat()  # <- expensive
         return cls(dir_stat.st_dev, dir_stat.st_ino)
 
-    @classmethod
-    def from_path(cls, path: Path) -> DirId:
-        """Construct DirId from given directory path."""
-        # Cannot cache calls with relative paths, as caching the result of
-        # DirId.from_path(".") is wrong as soon as CWD is changed.
+
+class StatCache:
+    """Cache the DirIds of the directories looked up during a traversal.
+
+    Looking up the same directories over and over (e.g. to check whether they
+    are to be skipped) is a big part of a traversal, so cache the results, but
+    keep at most 'max_size' of them (evicting the least recently used first).
+    The cache can be shared between threads.
+
+    Relative paths are resolved against the current directory at the time of
+    the first lookup, and the cache assumes that directories are not replaced
+    while it is used. Call .reset() when this no longer holds, e.g. when a
+    traversal is finished.
+    """
+
+    def __init__(self, max_size: int = 65_536) -> None:
+        self.max_size = max_size
+        self._cwd: Optional[Path] = None
+        self._lookup = lru_cache(maxsize=max_size)(DirId.from_path)
+
+    def dir_id(self, path: Path) -> DirId:
+        """Return the DirId of the given directory path."""
         if not path.is_absolute():
-            path = Path.cwd() / path
-        return cls.from_abs_path(path)
+            if self._cwd is None:
+                self._cwd = Path.cwd()
+            path = self._cwd / path
+        return self._lookup(path)
+
+    @property
+    def hits(self) -> int:
+        """The number of lookups that were answered from the cache."""
+        return self._lookup.cache_info().hits
+
+    @property
+    def misses(self) -> int:
+        """The number of lookups that called stat()."""
+        return self._lookup.cache_info().misses
+
+    def __len__(self) -> int:
+        return self._lookup.cache_info().currsize
+
+    def reset(self) -> None:
+        """Forget all cached DirIds (and the current directory), and counters."""
+        self._lookup.cache_clear()
+        self._cwd = None
+
+
+# The lists of data attached to each directory level (that has any) of a path
+AttachedLevels = tuple[list[T], ...]
+
+# A function with the same interface as os.walk(), yielding (dir, subdirs, files)
+Walker = Callable[[Path], Iterator[tuple[str, list[str], list[str]]]]
+
+
+def walk_filesystem(top: Path) -> Iterator[tuple[str, list[str], list[str]]]:
+    """Walk the given directory tree, following symlinks to directories."""
+    return os.walk(top, followlinks=True)
+
+
+# A directory listing: the names of subdirectories and files (like os.walk())
+Listing = tuple[list[str], list[str]]
+
+
+def list_dir(path: Path) -> Optional[Listing]:
+    """List the given directory, like os.walk() does.
+
+    Symlinks to directories count as directories. Return None if the directory
+    cannot be listed (os.walk() silently skips such directories).
+    """
+    dirs: list[str] = []
+    files: list[str] = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()  # follows symlinks
+                except OSError:
+                    is_dir = False
+                (dirs if is_dir else files).append(entry.name)
+    except OSError:
+        return None
+    return dirs, files
+
+
+class Prefetcher:
+    """List directories in worker threads, ahead of a walk_filesystem() walk.
+
+    Walking a big directory tree is mostly waiting for the filesystem, which
+    threads can do in parallel. Once a directory has been listed, its
+    subdirectories are queued for listing too, so that e.g. several separate
+    roots (or the subtrees of one root) are listed concurrently. Meanwhile
+    .walk() consumes these listings (waiting for them if needed), in the same
+    order as os.walk(). Prefetching is only an optimization: a directory that
+    was not prefetched is listed by .walk() itself.
+
+    To not waste too much effort on directories that will not be walked:
+    - 'skip' is asked whether to prefetch a directory (e.g. excluded ones).
+    - Nothing is prefetched below the subdirectories that the caller of .walk()
+      prunes (by modifying the returned list of subdirectories in place).
+    - Each directory (identified by DirId, as looked up by 'dir_id') is only
+      prefetched once, which also prevents following symlink loops.
+    - At most 'max_pending' listings are kept ahead of the walk.
+    """
+
+    def __init__(
+        self,
+        executor: ThreadPoolExecutor,
+        skip: Callable[[Path], bool],
+        max_pending: int = 10_000,
+        dir_id: Callable[[Path], DirId] = DirId.from_path,
+    ) -> None:
+        self._executor = executor
+        self._skip = skip
+        self._dir_id = dir_id
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+        self._listings: dict[Path, Future[Optional[Listing]]] = {}
+        self._seen: set[DirId] = set()
+        self._pruned: set[Path] = set()
+        self._stopped = False
+
+    def _is_pruned(self, path: Path) -> bool:
+        return path in self._pruned or any(p in self._pruned for p in path.parents)
+
+    def prefetch(self, path: Path, *, force: bool = False) -> None:
+        """Start listing the given directory (and its subdirectories)."""
+        try:
+            if self._skip(path):
+                return
+            dir_id = self._dir_id(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._stopped or dir_id in self._seen or self._is_pruned(path):
+                return
+            if not force and len(self._listings) >= self._max_pending:
+                return
+            self._seen.add(dir_id)
+            self._listings[path] = self._executor.submit(self._list, path)
+
+    def _list(self, path: Path) -> Optional[Listing]:
+        listing = list_dir(path)
+        if listing is not None and not self._stopped:
+            for name in listing[0]:
+                self.prefetch(path / name)
+        return listing
+
+    def stop(self) -> None:
+        """Stop prefetching, e.g. when the walk is finished or abandoned."""
+        with self._lock:
+            self._stopped = True
+            self._listings.clear()
+
+    def walk(self, top: Path) -> Iterator[tuple[str, list[str], list[str]]]:
+        """Walk the given directory tree, like walk_filesystem()."""
+        stack = [top]
+        while stack:
+            cur = stack.pop()
+            with self._lock:
+                future = self._listings.pop(cur, None)
+            listing = list_dir(cur) if future is None else future.result()
+            if listing is None:
+                continue
+            subdirs, files = listing
+            found = list(subdirs)
+            yield str(cur), subdirs, files
+
+            # The caller may have pruned 'subdirs' in place
+            if len(subdirs) < len(found):
+                with self._lock:
+                    for name in set(found) - set(subdirs):
+                        self._pruned.add(cur / name)
+                        self._listings.pop(cur / name, None)
+            paths = [cur / name for name in subdirs]
+            with self._lock:
+                unlisted = [path for path in paths if path not in self._listings]
+            for path in unlisted:  # not prefetched (yet)
+                self.prefetch(path, force=True)
+            stack.extend(reversed(paths))
 
 
 @dataclass(frozen=True, order=True)
@@ -102,6 +282,21 @@ class DirectoryTraversal(Generic[T]):
     skip_dirs: set[DirId] = field(default_factory=set)  # includes already-traversed
     attached: dict[DirId, list[T]] = field(default_factory=dict)
     exclude_rules: list[ExcludeRule] = field(default_factory=list)
+    # How to walk a directory tree (e.g. git_index.walk() to skip untracked files)
+    walk: Walker = field(default=walk_filesystem)
+    # Number of threads listing directories ahead of the traversal (0: none).
+    # Only used with walk_filesystem(), see Prefetcher for details.
+    threads: int = 0
+    # Also exclude what is ignored by .gitignore files (and .git/info/exclude)
+    # found during the traversal, each within its own part of the tree.
+    use_gitignore: bool = False
+    # The git ignore files that were read (or looked for) with .use_gitignore
+    ignore_files: list[Path] = field(default_factory=list, init=False, repr=False)
+    # Bumped when data is attached to a directory that had none, as this may
+    # invalidate the attached data that .traverse() passes down the walk.
+    attached_dirs_version: int = field(default=0, init=False, repr=False)
+    # The DirIds looked up by this traversal, reset when .traverse() finishes.
+    stat_cache: StatCache = field(default_factory=StatCache, compare=False, repr=False)
 
     def add(self, dir_path: Path, *attach_data: T) -> None:
         """Add one directory to this traversal, optionally w/attached data.
@@ -121,9 +316,12 @@ class DirectoryTraversal(Generic[T]):
         """
         if not dir_path.is_dir():
             raise NotADirectoryError(dir_path)
-        dir_id = DirId.from_path(dir_path)
+        dir_id = self.stat_cache.dir_id(dir_path)
         self.to_traverse[dir_path] = dir_id
-        self.attached.setdefault(dir_id, []).extend(attach_data)
+        if dir_id not in self.attached:
+            self.attached[dir_id] = []
+            self.attached_dirs_version += 1
+        self.attached[dir_id].extend(attach_data)
 
     def skip_dir(self, dir_path: Path) -> None:
         """Ignore a directory in future traversal.
@@ -131,7 +329,7 @@ class DirectoryTraversal(Generic[T]):
         The given directory or its subdirectories will _not_ be traversed
         (although explicitly .add()ed subdirectories _will_ be traversed).
         """
-        self.skip_dirs.add(DirId.from_path(dir_path))
+        self.skip_dirs.add(self.stat_cache.dir_id(dir_path))
 
     def exclude(self, pattern: str, base_dir: Optional[Path] = None) -> None:
         """Add gitignore-style exclude pattern to this traversal.
@@ -146,10 +344,10 @@ class DirectoryTraversal(Generic[T]):
         Files that match an exclude pattern will not be part of the step.files
         returned while traversing the parent.
         """
-        logger.debug(f"Parsing rule from pattern {pattern!r}")
+        logger.debug("Parsing rule from pattern %r", pattern)
         rule = ExcludeRule.from_pattern(pattern.rstrip("\n"), base_dir)
 
-        logger.debug(f"Adding rule {rule!r} @ {rule.base_dir!r}")
+        logger.debug("Adding rule %r @ %r", rule, rule.base_dir)
         self.exclude_rules.append(rule)
 
     def exclude_from(self, file_with_exclude_patterns: Path) -> None:
@@ -163,7 +361,7 @@ class DirectoryTraversal(Generic[T]):
 
         See .exclude() for details about how each gitignore pattern is used.
         """
-        logger.debug(f"Reading exclude patterns from {file_with_exclude_patterns}...")
+        logger.debug("Reading exclude patterns from %s...", file_with_exclude_patterns)
         self.exclude_rules = (
             list(parse_gitignore(file_with_exclude_patterns)) + self.exclude_rules
         )
@@ -191,17 +389,158 @@ class DirectoryTraversal(Generic[T]):
         Directories that have already been .skip_dir()ed will not be traversed,
         nor will a directory previously traversed by this instance be traversed
         again.
-        """
 
-        def accumulate_attached_data(parent_dir: Path, child_dir: Path) -> Iterator[T]:
-            """Yield attached data items for child_dir (starting from parent_dir).
+        With .threads > 0, directories are listed concurrently ahead of the
+        traversal, but the steps (and their order) are unchanged.
 
-            For each directory level from parent_dir to child_dir (inclusive),
-            yield each attached data item in the order they were attached.
-            """
-            for dir_path in reversed(list(dirs_between(parent_dir, child_dir))):
-                yield from self.attached.get(DirId.from_path(dir_path), [])
+        The .stat_cache is reset when the traversal is finished (or abandoned).
+        """
+        try:
+            if self.threads <= 0 or self.walk is not walk_filesystem:
+                yield from self._traverse(self.walk)
+            else:
+                yield from self._traverse_with_threads()
+        finally:
+            cache = self.stat_cache
+            logger.debug(
+                "Stat cache: %d hits, %d misses, %d entries",
+                cache.hits,
+                cache.misses,
+                len(cache),
+            )
+            cache.reset()
+
+    def _traverse_with_threads(self) -> Iterator[TraversalStep[T]]:
+        """Perform the traversal with a Prefetcher, see .traverse().
+
+        The prefetching threads skip directories that are excluded by the rules
+        known when the traversal starts (rules added later by the caller only
+        apply to the traversal itself), or ignored by the git ignore rules of
+        the nearest directory that has been traversed so far.
+        """
+        exclude_rules = list(self.exclude_rules)
+        ignores: dict[Path, list[ExcludeRule]] = {}
+
+        def skip(path: Path) -> bool:
+            if self.stat_cache.dir_id(path) in self.skip_dirs:
+                return True
+            rule = last_matching_rule(exclude_rules, path, is_dir=True)
+            if rule is None and ignores:  # our exclude rules take precedence
+                ignore_rules = next(
+                    (r for r in map(ignores.get, path.parents) if r is not None), []
+                )
+                rule = last_matching_rule(ignore_rules, path.absolute(), is_dir=True)
+            return rule is not None and not rule.negated
 
+        executor = ThreadPoolExecutor(
+            self.threads, thread_name_prefix="fawltydeps-traversal"
+        )
+        prefetcher = Prefetcher(executor, skip, dir_id=self.stat_cache.dir_id)
+        try:
+            yield from self._traverse(prefetcher.walk, prefetcher.prefetch, ignores)
+        finally:
+            prefetcher.stop()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _read_ignore_file(self, path: Path, base_dir: Path) -> list[ExcludeRule]:
+        self.ignore_files.append(path)
+        return gitignore_rules(path, base_dir)
+
+    def _ignore_rules(
+        self,
+        abs_dir: Path,
+        names: set[str],
+        parent_rules: Optional[list[ExcludeRule]],
+    ) -> list[ExcludeRule]:
+        """Return the git ignore rules for the entries (named 'names') in abs_dir.
+
+        Extend the rules passed down from the parent dir, if given, otherwise
+        start with the rules from the parents of abs_dir (up to the root of its
+        git checkout). Rules are anchored at absolute paths.
+        """
+        if parent_rules is None:
+            rules = []
+            found = find_worktree(abs_dir)
+            if found is not None:
+                worktree, git_dir = found
+                rules = self._read_ignore_file(git_dir / "info" / "exclude", worktree)
+                for parent in reversed(list(dirs_between(worktree, abs_dir.parent))):
+                    rules.extend(self._read_ignore_file(parent / ".gitignore", parent))
+        elif ".git" in names:  # a nested git checkout does not inherit rules
+            nested_git_dir = find_git_dir(abs_dir)
+            rules = []
+            if nested_git_dir is not None:
+                exclude_file = nested_git_dir / "info" / "exclude"
+                rules = self._read_ignore_file(exclude_file, abs_dir)
+        else:
+            rules = parent_rules
+        if ".gitignore" in names:
+            rules = rules + self._read_ignore_file(abs_dir / ".gitignore", abs_dir)
+        return rules
+
+    def _excluded_names(
+        self,
+        cur_dir: Path,
+        names: set[str],
+        *,
+        is_dir: bool,
+        ignore_rules: list[ExcludeRule],
+        abs_dir: Path,
+    ) -> set[str]:
+        """Return the given entries of cur_dir that are excluded, or ignored by git.
+
+        Our exclude rules take precedence over the given git ignore rules, which
+        are anchored at abs_dir (the absolute version of cur_dir).
+        """
+        found = match_rules_in_dir(self.exclude_rules, cur_dir, names, is_dir=is_dir)
+        if ignore_rules:
+            rest = names - found.keys()
+            found.update(match_rules_in_dir(ignore_rules, abs_dir, rest, is_dir=is_dir))
+        return {name for name, rule in found.items() if not rule.negated}
+
+    def _attached_levels(
+        self,
+        base_dir: Path,
+        cur_dir: Path,
+        cur_id: DirId,
+        parent_levels: Optional[AttachedLevels[T]],
+    ) -> AttachedLevels[T]:
+        """Return the attached data lists for cur_dir.
+
+        For each directory level from base_dir to cur_dir (inclusive) that has
+        data attached, return its list of attached data items. Extend the levels
+        passed down from the parent dir, if given, otherwise look up all levels.
+        """
+        if parent_levels is None:
+            return tuple(
+                self.attached[dir_id]
+                for dir_id in map(
+                    self.stat_cache.dir_id,
+                    reversed(list(dirs_between(base_dir, cur_dir))),
+                )
+                if dir_id in self.attached
+            )
+        if cur_id in self.attached:
+            return (*parent_levels, self.attached[cur_id])
+        return parent_levels
+
+    def _traverse(  # noqa: C901
+        self,
+        walk: Walker,
+        prefetch: Optional[Callable[[Path], None]] = None,
+        ignores: Optional[dict[Path, list[ExcludeRule]]] = None,
+    ) -> Iterator[TraversalStep[T]]:
+        """Perform the traversal, see .traverse().
+
+        If given, 'prefetch' is called for all remaining base directories, each
+        time before walking the next one. If given, 'ignores' is kept up to date
+        with the git ignore rules in scope for each directory traversed within
+        the current base directory.
+        """
+        # The git ignore rules in scope for each traversed dir, passed down
+        # from parent to child, instead of reading all parents at each step.
+        if ignores is None:
+            ignores = {}
         while True:
             remaining = {
                 path: dir_id
@@ -210,35 +549,73 @@ class DirectoryTraversal(Generic[T]):
             }
             if not remaining:  # nothing left to do
                 break
-            logger.debug(f"Left to traverse: {remaining}")
+            logger.debug("Left to traverse: %s", remaining)
+            if prefetch is not None:
+                for path in sorted(remaining.keys()):
+                    prefetch(path)
             base_dir = min(remaining.keys())
             assert base_dir.is_dir()  # noqa: S101, sanity check
-            for cur, subdirs, filenames in os.walk(base_dir, followlinks=True):
+            # The attached data levels of each traversed dir, passed down from
+            # parent to child, instead of looking up all parents at each step.
+            levels: dict[Path, AttachedLevels[T]] = {}
+            ignores.clear()
+            version = self.attached_dirs_version
+            for cur, subdirs, filenames in walk(base_dir):
                 cur_dir = Path(cur)
-                cur_id = DirId.from_path(cur_dir)
+                cur_id = self.stat_cache.dir_id(cur_dir)
                 if cur_id in self.skip_dirs:
-                    logger.debug(f"  Ignoring {cur_dir}")
+                    logger.debug("  Ignoring %s", cur_dir)
                     subdirs[:] = []  # don't recurse into subdirs
                     continue  # skip to next
 
-                logger.debug(f"  Traversing {cur_dir}: {cur_id}")
+                logger.debug("  Traversing %s: %s", cur_dir, cur_id)
                 self.skip_dirs.add(cur_id)  # don't traverse this dir again
 
+                if version != self.attached_dirs_version:  # start over
+                    levels.clear()
+                    version = self.attached_dirs_version
+                parent_levels = levels.get(cur_dir.parent)
+                if cur_dir == base_dir:  # don't pass down from outside base_dir
+                    parent_levels = None
+                cur_levels = self._attached_levels(
+                    base_dir, cur_dir, cur_id, parent_levels
+                )
+                levels[cur_dir] = cur_levels
+
+                abs_dir, ignore_rules = cur_dir, []
+                if self.use_gitignore:
+                    abs_dir = cur_dir.absolute()
+                    ignore_rules = self._ignore_rules(
+                        abs_dir,
+                        {*subdirs, *filenames},
+                        None if cur_dir == base_dir else ignores.get(cur_dir.parent),
+                    )
+                    ignores[cur_dir] = ignore_rules
+                excluded_names = partial(
+                    self._excluded_names,
+                    cur_dir,
+                    ignore_rules=ignore_rules,
+                    abs_dir=abs_dir,
+                )
+
                 subdir_paths = {cur_dir / subdir for subdir in subdirs}
                 file_paths = {cur_dir / filename for filename in filenames}
 
                 # Process excludes
                 exclude_subdirs = {
                     path
-                    for path in subdir_paths
-                    if self.is_excluded(path, is_dir=True)
-                    and (DirId.from_path(path) not in remaining.values())
+                    for path in (
+                        cur_dir / name
+                        for name in excluded_names(set(subdirs), is_dir=True)
+                    )
+                    if self.stat_cache.dir_id(path) not in remaining.values()
                 }
                 for subdir in exclude_subdirs:
-                    logger.debug(f"    skip traversing excluded subdir {subdir}")
+                    logger.debug("    skip traversing excluded subdir %s", subdir)
                     self.skip_dir(subdir)
                 exclude_files = {
-                    path for path in file_paths if self.is_excluded(path, is_dir=False)
+                    cur_dir / name
+                    for name in excluded_names(set(filenames), is_dir=False)
                 }
 
                 # At this yield, the caller takes over control, and may modify
@@ -248,7 +625,7 @@ class DirectoryTraversal(Generic[T]):
                     cur_dir,
                     frozenset(subdir_paths - exclude_subdirs),
                     frozenset(file_paths - exclude_files),
-                    list(accumulate_attached_data(base_dir, cur_dir)),
+                    [item for level in cur_levels for item in level],
                     frozenset(exclude_subdirs),
                     frozenset(exclude_files),
                 )
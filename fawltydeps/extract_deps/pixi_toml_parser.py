@@ -2,19 +2,14 @@
 
 import contextlib
 import logging
-import sys
 from collections.abc import Iterator
 from pathlib import Path
 
-from fawltydeps.types import DeclaredDependency, Location
+from fawltydeps.toml_cache import TOMLDecodeError, toml_cache
+from fawltydeps.types import DeclaredDependency, Location, TomlData
 
 from .pyproject_toml_parser import parse_pixi_pyproject_dependencies
 
-if sys.version_info >= (3, 11):
-    import tomllib
-else:
-    import tomli as tomllib
-
 logger = logging.getLogger(__name__)
 
 
@@ -25,13 +20,17 @@ def parse_pixi_toml(path: Path) -> Iterator[DeclaredDependency]:
     information about the pixi.toml format.
     """
     source = Location(path)
-    with path.open("rb") as tomlfile:
-        try:
-            parsed_contents = tomllib.load(tomlfile)
-        except tomllib.TOMLDecodeError as e:
-            logger.error(f"Failed to parse {source}: {e}")
-            return
+    try:
+        with toml_cache.document(path) as parsed_contents:
+            yield from parse_pixi_contents(parsed_contents, source)
+    except TOMLDecodeError as e:
+        logger.error(f"Failed to parse {source}: {e}")
+
 
+def parse_pixi_contents(
+    parsed_contents: TomlData, source: Location
+) -> Iterator[DeclaredDependency]:
+    """Extract dependencies from the already-parsed contents of a pixi.toml."""
     skip = set()
 
     # Skip dependencies onto self (such as Pixi's "editable mode" hack)
@@ -2,19 +2,14 @@
 
 import contextlib
 import logging
-import sys
 from collections.abc import Callable, Iterable, Iterator
 from pathlib import Path
 
+from fawltydeps.toml_cache import TOMLDecodeError, toml_cache
 from fawltydeps.types import DeclaredDependency, Location, TomlData
 
 from .requirements_parser import parse_one_req, parse_requirements_txt
 
-if sys.version_info >= (3, 11):
-    import tomllib
-else:
-    import tomli as tomllib
-
 logger = logging.getLogger(__name__)
 
 ERROR_MESSAGE_TEMPLATE = "Failed to %s %s %s dependencies in %s: %s"
@@ -254,13 +249,17 @@ def parse_pyproject_toml(path: Path) -> Iterator[DeclaredDependency]:
     - Pixi-specific metadata in `tool.pixi` sections.
     """
     source = Location(path)
-    with path.open("rb") as tomlfile:
-        try:
-            parsed_contents = tomllib.load(tomlfile)
-        except tomllib.TOMLDecodeError as e:
-            logger.error(f"Failed to parse {source}: {e}")
-            return
+    try:
+        with toml_cache.document(path) as parsed_contents:
+            yield from parse_pyproject_contents(parsed_contents, source)
+    except TOMLDecodeError as e:
+        logger.error(f"Failed to parse {source}: {e}")
 
+
+def parse_pyproject_contents(
+    parsed_contents: TomlData, source: Location
+) -> Iterator[DeclaredDependency]:
+    """Extract dependencies from the already-parsed contents of a pyproject.toml."""
     skip = set()
 
     # Skip dependencies onto self (such as Pixi's "editable mode" hack)
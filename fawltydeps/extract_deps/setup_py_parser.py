@@ -7,7 +7,7 @@ from collections.abc import Iterable, Iterator
 from pathlib import Path
 from typing import Union
 
-from fawltydeps.limited_eval import CannotResolve, VariableTracker
+from fawltydeps.limited_eval import CannotResolve, VariableTracker, evaluate_until
 from fawltydeps.types import DeclaredDependency, Location
 
 from .requirements_parser import parse_one_req
@@ -33,10 +33,6 @@ def parse_setup_py(path: Path) -> Iterator[DeclaredDependency]:  # noqa: C901
     call.
     """
     source = Location(path)
-    # Attempt to keep track of simple variable assignments (name -> value)
-    # declared in the setup.py prior to the setup() call, so that we can
-    # resolve any variable references in the arguments to the setup() call.
-    tracked_vars = VariableTracker(source)
 
     def _extract_deps_from_value(
         value: Union[str, Iterable[str]],
@@ -51,7 +47,7 @@ def parse_setup_py(path: Path) -> Iterator[DeclaredDependency]:  # noqa: C901
             raise DependencyParsingError(node) from e
 
     def _extract_deps_from_setup_call(
-        node: ast.Call,
+        node: ast.Call, tracked_vars: VariableTracker
     ) -> Iterator[DeclaredDependency]:
         for keyword in node.keywords:
             try:
@@ -84,10 +80,12 @@ def parse_setup_py(path: Path) -> Iterator[DeclaredDependency]:  # noqa: C901
     except SyntaxError as e:
         logger.error(f"Could not parse {path}: {e}")
         return
-    for node in ast.walk(setup_contents):
-        tracked_vars.evaluate(node)
-        if _is_setup_function_call(node):
-            # Below line is not checked by mypy, but `_is_setup_function_call`
-            # makes sure that `node` is of a proper type.
-            yield from _extract_deps_from_setup_call(node.value)  # type: ignore[attr-defined]
-            break
+    # Evaluate the statements leading up to the first setup() call, keeping
+    # track of simple variable assignments (name -> value), so that we can
+    # resolve any variable references in the arguments to the setup() call.
+    found = evaluate_until(setup_contents, source, _is_setup_function_call)
+    if found is not None:
+        setup_call, tracked_vars = found
+        # Below line is not checked by mypy, but `_is_setup_function_call`
+        # makes sure that `setup_call` is of a proper type.
+        yield from _extract_deps_from_setup_call(setup_call.value, tracked_vars)  # type: ignore[attr-defined]
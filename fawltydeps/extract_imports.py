@@ -3,13 +3,19 @@
 import ast
 import json
 import logging
+import re
 import tokenize
-from collections.abc import Iterable, Iterator
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterable, Iterator
+from functools import cache, partial
 from pathlib import Path
-from typing import BinaryIO, Optional, Union
+from typing import BinaryIO, NamedTuple, Optional, Union
 
 import isort
+import isort.place
+import isort.utils
 
+from fawltydeps.json_reader import JsonReader
 from fawltydeps.types import (
     CodeSource,
     Location,
@@ -17,7 +23,7 @@ from fawltydeps.types import (
     PathOrSpecial,
     UnparseablePathError,
 )
-from fawltydeps.utils import dirs_between
+from fawltydeps.utils import LazyStr, dirs_between
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +44,17 @@ def make_isort_config(path: Path, src_paths: tuple[Path, ...] = ()) -> isort.Con
 ISORT_FALLBACK_CONFIG = make_isort_config(Path())
 
 
+def forget_module_locations() -> None:
+    """Make isort look again for first-party modules on the filesystem.
+
+    isort remembers which modules it found (and where) for the lifetime of the
+    process. Long-running processes must call this when modules may have been
+    added or removed since the previous parse.
+    """
+    isort.place.module_with_reason.cache_clear()
+    isort.utils.exists_case_sensitive.cache_clear()
+
+
 def parse_code(
     code: Union[str, bytes],
     *,
@@ -56,26 +73,69 @@ def parse_code(
     For more details about Python source file encodings, please see
     https://docs.python.org/3/reference/lexical_analysis.html#encoding-declarations.
     """
+    yield from _parse_code(code, source, external_import_checker(local_context))
+
+
+def external_import_checker(local_context: isort.Config) -> Callable[[str], bool]:
+    """Return a function that tells whether an import name is third-party.
 
+    The answers are remembered, as asking isort (even when it has cached the
+    answer itself) is relatively expensive.
+    """
+
+    @cache
     def is_external_import(name: str) -> bool:
         return isort.place_module(name, config=local_context) == "THIRDPARTY"
 
+    return is_external_import
+
+
+# The fields of statements (and of except handlers and match cases) that may
+# hold (lists of) statements. Imports are statements, and expressions never
+# contain statements.
+STATEMENT_FIELDS = {"body", "orelse", "finalbody", "handlers", "cases"}
+
+
+def _walk_statements(tree: ast.AST) -> Iterator[ast.AST]:
+    """Like ast.walk(), but without descending into expressions.
+
+    This is much faster, and yields the statements in the same order.
+    """
+    todo = deque([tree])
+    while todo:
+        node = todo.popleft()
+        for name in node._fields:
+            if name in STATEMENT_FIELDS:
+                children = getattr(node, name)
+                if isinstance(children, list):
+                    todo.extend(children)
+        yield node
+
+
+def _parse_code(
+    code: Union[str, bytes],
+    source: Location,
+    is_external_import: Callable[[str], bool],
+    line_offset: int = 0,
+) -> Iterator[ParsedImport]:
+    # line_offset is added to line numbers, for code found inside a bigger file
     try:
         parsed_code = ast.parse(code, filename=str(source.path))
     except SyntaxError as exc:
         logger.error(f"Could not parse code from {source}: {exc}")
         return
-    for node in ast.walk(parsed_code):
+    for node in _walk_statements(parsed_code):
         if isinstance(node, ast.Import):
-            logger.debug(ast.dump(node))
+            logger.debug("%s", LazyStr(partial(ast.dump, node)))
             for alias in node.names:
                 name = alias.name.split(".", 1)[0]
                 if is_external_import(name):
                     yield ParsedImport(
-                        name=name, source=source.supply(lineno=node.lineno)
+                        name=name,
+                        source=source.supply(lineno=node.lineno + line_offset),
                     )
         elif isinstance(node, ast.ImportFrom):
-            logger.debug(ast.dump(node))
+            logger.debug("%s", LazyStr(partial(ast.dump, node)))
             # Relative imports are always relative to the current package, and
             # will therefore not resolve to a third-party package.
             # They are therefore uninteresting to us.
@@ -83,10 +143,104 @@ def parse_code(
                 name = node.module.split(".", 1)[0]
                 if is_external_import(name):
                     yield ParsedImport(
-                        name=name, source=source.supply(lineno=node.lineno)
+                        name=name,
+                        source=source.supply(lineno=node.lineno + line_offset),
                     )
 
 
+def parse_cells(
+    cells: Iterable[tuple[Location, str]],
+    local_context: isort.Config = ISORT_FALLBACK_CONFIG,
+) -> Iterator[ParsedImport]:
+    """Extract import statements from the code cells of a notebook.
+
+    This is equivalent to calling parse_code() for each (source, code) pair,
+    except that the isort lookups are shared between all cells. Each cell is
+    still parsed separately, so that a syntax error in one cell does not
+    prevent us from finding the imports in the other cells.
+    """
+    is_external_import = external_import_checker(local_context)
+    for source, code in cells:
+        yield from _parse_code(code, source, is_external_import)
+
+
+# Notebooks bigger than this are streamed, rather than loaded into memory
+STREAM_NOTEBOOK_SIZE = 2**20
+
+
+def read_notebook(path: Path) -> Iterator[Union[tuple[int, dict[str, object]], str]]:
+    """Read the parts of a Jupyter notebook that we need, as they are found.
+
+    Yield (cellno, cell) for each cell (containing at least its "cell_type" and
+    "source" members), and yield the language name (or "" if not found) when
+    the notebook metadata is found.
+
+    Big notebooks are streamed: other cell members (notably "outputs" and
+    "attachments", which may contain big images and such) are skipped without
+    ever being loaded into memory. Smaller notebooks are faster to load in one
+    go.
+    """
+    if path.stat().st_size < STREAM_NOTEBOOK_SIZE:
+        with path.open("rb") as notebook:
+            notebook_content = json.load(notebook, strict=False)
+        yield from enumerate(notebook_content.get("cells", []), start=1)
+        metadata = notebook_content.get("metadata", {})
+        yield metadata.get("language_info", {}).get("name", "")
+        return
+
+    with path.open(encoding="utf-8-sig") as notebook:
+        yield from _stream_notebook(JsonReader(notebook))
+
+
+def _stream_notebook(
+    reader: JsonReader,
+) -> Iterator[Union[tuple[int, dict[str, object]], str]]:
+    """Stream the cells and language name from a notebook, cf. read_notebook()."""
+    for key in reader.iter_object():
+        if key == "cells":
+            for index in reader.iter_array():
+                cell: dict[str, object] = {}
+                for cell_key in reader.iter_object():
+                    if cell_key in {"cell_type", "source"}:
+                        cell[cell_key] = reader.read_value()
+                    else:
+                        reader.skip_value()
+                yield index + 1, cell
+        elif key == "metadata":
+            language_name = ""
+            for metadata_key in reader.iter_object():
+                if metadata_key != "language_info":
+                    reader.skip_value()
+                    continue
+                language_info = reader.read_value()
+                if isinstance(language_info, dict):
+                    language_name = str(language_info.get("name", ""))
+            yield language_name
+        else:
+            reader.skip_value()
+
+
+def filter_out_magic_commands(
+    lines: Iterable[str], source: Location, first_lineno: int = 1
+) -> Iterator[str]:
+    """Convert lines with magic notebook commands into empty lines."""
+    command_continues = False
+    for lineno, line in enumerate(lines, start=first_lineno):
+        if line.lstrip().startswith(("!", "%")):
+            logger.info(
+                "Found magic command %r at %s",
+                line,
+                LazyStr(partial(source.supply, lineno=lineno)),
+            )
+            command_continues = line.rstrip("\n").endswith("\\")
+            yield "\n"
+        elif command_continues:
+            command_continues = line.rstrip("\n").endswith("\\")
+            yield "\n"
+        else:
+            yield line
+
+
 def parse_notebook_file(  # noqa: C901
     path: Path, local_context: Optional[isort.Config] = None
 ) -> Iterator[ParsedImport]:
@@ -98,53 +252,53 @@ def parse_notebook_file(  # noqa: C901
     if not local_context:
         local_context = make_isort_config(Path(), (path.parent,))
 
-    def filter_out_magic_commands(
-        lines: Iterable[str], source: Location
-    ) -> Iterator[str]:
-        """Convert lines with magic notebook commands into empty lines."""
-        command_continues = False
-        for lineno, line in enumerate(lines, start=1):
-            if line.lstrip().startswith(("!", "%")):
-                logger.info(
-                    f"Found magic command {line!r} at {source.supply(lineno=lineno)}"
-                )
-                command_continues = line.rstrip("\n").endswith("\\")
-                yield "\n"
-            elif command_continues:
-                command_continues = line.rstrip("\n").endswith("\\")
-                yield "\n"
-            else:
-                yield line
-
-    with path.open("rb") as notebook:
-        try:
-            notebook_content = json.load(notebook, strict=False)
-        except json.decoder.JSONDecodeError as exc:
-            logger.error(f"Could not parse code from {path}: {exc}")
-            return
-
-    language_name = (
-        notebook_content.get("metadata", {}).get("language_info", {}).get("name", "")
-    )
-
-    if language_name.lower() == "python":
-        for cellno, cell in enumerate(notebook_content["cells"], start=1):
+    def code_cells(
+        cells: Iterable[tuple[int, dict[str, object]]],
+    ) -> Iterator[tuple[Location, str]]:
+        for cellno, cell in cells:
             source = Location(path, cellno)
             try:
                 if cell["cell_type"] == "code":
-                    lines = filter_out_magic_commands(cell["source"], source=source)
-                    yield from parse_code(
-                        "".join(lines), source=source, local_context=local_context
-                    )
+                    code = cell["source"]
+                    if isinstance(code, str):
+                        code = code.splitlines(keepends=True)
+                    assert isinstance(code, list)  # noqa: S101, sanity check
+                    lines = filter_out_magic_commands(code, source=source)
+                    yield source, "".join(lines)
             except KeyError as exc:
                 logger.error(f"Could not parse code from {source}: {exc}.")
 
-    elif not language_name:
+    # The metadata (with the language name) is usually found _after_ the
+    # cells, so we hold on to the cells until we know whether to parse them.
+    # If it comes first, cells are parsed as they are read.
+    language_names: list[str] = []
+
+    def python_cells() -> Iterator[tuple[int, dict[str, object]]]:
+        pending: list[tuple[int, dict[str, object]]] = []
+        for item in read_notebook(path):
+            if isinstance(item, str):
+                language_names.append(item)
+                if item.lower() == "python":
+                    yield from pending
+                pending.clear()
+            elif not language_names:
+                pending.append(item)
+            elif language_names[-1].lower() == "python":
+                yield item
+
+    try:
+        yield from parse_cells(code_cells(python_cells()), local_context)
+    except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+        logger.error(f"Could not parse code from {path}: {exc}")
+        return
+
+    language_name = language_names[-1] if language_names else ""
+    if not language_name:
         logger.info(
             f"Skipping the notebook on {path}. "
             "Could not find the programming language name in the notebook's metadata.",
         )
-    else:
+    elif language_name.lower() != "python":
         logger.info(
             "FawltyDeps supports parsing Python notebooks. "
             f"Found {language_name} in the notebook's metadata on {path}.",
@@ -167,6 +321,211 @@ def parse_python_file(
         )
 
 
+# The opening line of a fenced code block in Markdown, and its info string
+CODE_FENCE = re.compile(r" {0,3}(`{3,}|~{3,})(.*)")
+# Info strings of Python code blocks, e.g. ```python (Markdown), ```{python} or
+# ```{python echo=FALSE} (Quarto/R Markdown), ```{code-cell} ipython3 (MyST)
+PYTHON_INFO = re.compile(r"\s*\{?\s*(?:code-cell\s*\}?\s*)?i?python3?\b")
+
+
+def python_chunks(lines: Iterable[str]) -> Iterator[tuple[int, list[str]]]:
+    """Find the fenced Python code blocks in a Markdown-like document.
+
+    Yield (lineno, lines) for each Python code block, where lineno is the line
+    number of its first line of code. Other code blocks are skipped.
+    """
+    fence: Optional[str] = None
+    is_python = False
+    chunk: list[str] = []
+    start = 0
+    for lineno, line in enumerate(lines, start=1):
+        if fence is None:
+            match = CODE_FENCE.match(line)
+            if match is not None:
+                fence = match.group(1)
+                is_python = PYTHON_INFO.match(match.group(2)) is not None
+                start, chunk = lineno + 1, []
+            continue
+        stripped = line.strip()
+        if stripped.startswith(fence) and not stripped.strip(fence[0]):
+            if is_python:
+                yield start, chunk
+            fence = None
+        elif is_python:
+            chunk.append(line)
+    if fence is not None and is_python:  # closed by the end of the document
+        yield start, chunk
+
+
+def parse_markdown_file(
+    path: Path, local_context: Optional[isort.Config] = None
+) -> Iterator[ParsedImport]:
+    """Extract import statements from the Python code blocks in a Markdown file.
+
+    This covers Quarto (.qmd) and R Markdown (.Rmd) documents, as well as
+    Jupytext notebooks in (MyST) Markdown format. Generate (i.e. yield) the
+    module names that are imported in the order they appear in the file.
+    """
+    if not local_context:
+        local_context = make_isort_config(Path(), (path.parent,))
+    is_external_import = external_import_checker(local_context)
+    source = Location(path)
+    try:
+        with path.open(encoding="utf-8-sig") as document:
+            chunks = list(python_chunks(document))
+    except UnicodeDecodeError as exc:
+        logger.error(f"Could not parse code from {path}: {exc}")
+        return
+    for lineno, chunk in chunks:
+        code = "".join(filter_out_magic_commands(chunk, source, first_lineno=lineno))
+        yield from _parse_code(code, source, is_external_import, lineno - 1)
+
+
+def is_jupytext_markdown(path: Path) -> bool:
+    """Return True iff the given Markdown file is a Jupytext notebook.
+
+    Jupytext writes its metadata into a YAML header at the top of the file, so
+    only that header needs to be read (e.g. a README is rejected immediately).
+    """
+    try:
+        with path.open(encoding="utf-8-sig") as document:
+            if document.readline(16).rstrip() != "---":
+                return False
+            for line in document:
+                if line.rstrip() == "---":  # end of header
+                    return False
+                if line.lstrip().startswith("jupytext:"):
+                    return True
+    except (OSError, UnicodeDecodeError):
+        return False
+    return False
+
+
+class CodeParser(NamedTuple):
+    """How to parse one kind of code file, cf. extract_deps.ParsingStrategy.
+
+    Code files are recognized by their suffix. Where the suffix is also used by
+    files that are not code (e.g. .md), .applies_to_path sniffs the contents.
+    Files whose parser is not .by_default are only found while traversing
+    directories when enabled with settings.extra_code_formats.
+    """
+
+    description: str
+    execute: Callable[[Path, Optional[isort.Config]], Iterator[ParsedImport]]
+    applies_to_path: Optional[Callable[[Path], bool]] = None
+    by_default: bool = True
+
+
+CODE_PARSERS: dict[str, CodeParser] = {
+    ".py": CodeParser("Python file", parse_python_file),
+    ".pyi": CodeParser("Python stub file", parse_python_file, by_default=False),
+    ".ipynb": CodeParser("Notebook file", parse_notebook_file),
+    ".qmd": CodeParser("Quarto document", parse_markdown_file, by_default=False),
+    ".Rmd": CodeParser("R Markdown document", parse_markdown_file, by_default=False),
+    ".rmd": CodeParser("R Markdown document", parse_markdown_file, by_default=False),
+    ".md": CodeParser(
+        "Jupytext Markdown notebook",
+        parse_markdown_file,
+        is_jupytext_markdown,
+        by_default=False,
+    ),
+}
+
+# Suffixes of the code files we can parse
+CODE_SUFFIXES = frozenset(CODE_PARSERS)
+
+# Suffixes of the code files found while traversing directories by default
+DEFAULT_CODE_SUFFIXES = frozenset(
+    suffix for suffix, parser in CODE_PARSERS.items() if parser.by_default
+)
+
+
+class ParsedImportsCache:
+    """Remember the imports parsed from code files, for reuse in later runs.
+
+    This is meant for long-running processes (e.g. 'fawltydeps --daemon') that
+    parse the same files over and over. A cached result is reused only if the
+    file itself is unchanged (same mtime and size), and if the directories in
+    which isort looks for first-party modules are also unchanged (adding or
+    removing a module in one of these directories changes its mtime).
+
+    At most 'max_entries' files are remembered (the least recently used are
+    forgotten first), and .prune() forgets files that no longer exist.
+    """
+
+    def __init__(self, max_entries: int = 100_000) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.max_entries = max_entries
+        self._entries: OrderedDict[
+            Path, tuple[tuple[object, ...], list[ParsedImport]]
+        ] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(
+        self,
+        src: CodeSource,
+        first_party_dirs: tuple[Path, ...],
+        parse: Callable[[], Iterator[ParsedImport]],
+    ) -> Iterator[ParsedImport]:
+        """Return the imports in 'src', calling 'parse' if not cached."""
+        assert isinstance(src.path, Path)  # noqa: S101, sanity check
+        file_stat = src.path.stat()
+        fingerprint = (
+            src.path,  # as given, as this is what ParsedImport.source refers to
+            file_stat.st_mtime_ns,
+            file_stat.st_size,
+            *(d.absolute().stat().st_mtime_ns for d in first_party_dirs),
+        )
+        key = src.path.absolute()
+        try:
+            cached_fingerprint, imports = self._entries[key]
+        except KeyError:
+            pass
+        else:
+            if cached_fingerprint == fingerprint:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return iter(imports)
+        self.misses += 1
+        imports = list(parse())
+        self._entries[key] = (fingerprint, imports)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return iter(imports)
+
+    def prune(self) -> int:
+        """Forget the files that no longer exist, return how many."""
+        gone = [path for path in self._entries if not path.is_file()]
+        for path in gone:
+            del self._entries[path]
+        return len(gone)
+
+    def clear(self) -> None:
+        """Forget all cached imports."""
+        self._entries.clear()
+
+
+# Long-running processes may set this to enable caching of parsed imports.
+parsed_imports_cache: Optional[ParsedImportsCache] = None
+
+
+def first_party_dirs(src: CodeSource) -> tuple[Path, ...]:
+    """Return the directories where isort looks for first-party modules.
+
+    Adding or removing a module in any of these directories may change how
+    the imports in 'src' are classified (first- vs. third-party).
+    """
+    assert isinstance(src.path, Path)  # noqa: S101, sanity check
+    if src.base_dir is not None:
+        return (src.base_dir, *dirs_between(src.base_dir, src.path.parent))
+    # parse_*_file() will use make_isort_config(Path(), (path.parent,))
+    return (Path(), src.path.parent)
+
+
 def parse_source(
     src: CodeSource, stdin: Optional[BinaryIO] = None
 ) -> Iterator[ParsedImport]:
@@ -174,8 +533,9 @@ def parse_source(
 
     These cases are handled:
       - src.path == "<stdin>": Read code from stdin and call parse_code()
-      - src.path is a *.py file: Call parse_python_file()
-      - src.path is a *.ipynb file: Call parse_notebook_file()
+      - Otherwise: Call the parser registered for the suffix of src.path in
+        CODE_PARSERS, e.g. parse_python_file() for *.py files, or
+        parse_notebook_file() for *.ipynb files.
     """
     if src.path == "<stdin>":
         if stdin is None:
@@ -187,19 +547,23 @@ def parse_source(
         return parse_code(stdin.read(), source=Location(src.path))
 
     assert isinstance(src.path, Path)  # noqa: S101, sanity check / silence mypy
+    path = src.path
 
     local_context = None
     if src.base_dir is not None:
-        src_paths = tuple(dirs_between(src.base_dir, src.path.parent))
+        src_paths = first_party_dirs(src)[1:]
         local_context = make_isort_config(path=src.base_dir, src_paths=src_paths)
 
-    if src.path.suffix == ".py":
-        logger.info("Parsing Python file %s", src.path)
-        return parse_python_file(src.path, local_context)
-    if src.path.suffix == ".ipynb":
-        logger.info("Parsing Notebook file %s", src.path)
-        return parse_notebook_file(src.path, local_context)
-    raise RuntimeError("MISMATCH BETWEEN CODE PATH AND CODE PARSERS!")
+    def parse() -> Iterator[ParsedImport]:
+        parser = CODE_PARSERS.get(path.suffix)
+        if parser is None:
+            raise RuntimeError("MISMATCH BETWEEN CODE PATH AND CODE PARSERS!")
+        logger.info("Parsing %s %s", parser.description, path)
+        return parser.execute(path, local_context)
+
+    if parsed_imports_cache is not None:
+        return parsed_imports_cache.lookup(src, first_party_dirs(src), parse)
+    return parse()
 
 
 def parse_sources(
@@ -210,13 +574,31 @@ def parse_sources(
         yield from parse_source(source, stdin)
 
 
+def aggregate_imports(
+    imports: Iterable[ParsedImport], max_references: int = 3
+) -> dict[str, tuple[int, list[ParsedImport]]]:
+    """Reduce the given imports to a map: name -> (count, first few imports).
+
+    Only the first 'max_references' imports of each name are kept, so that the
+    memory used is proportional to the number of unique import names, rather
+    than the number of import statements.
+    """
+    ret: dict[str, tuple[int, list[ParsedImport]]] = {}
+    for imp in imports:
+        count, first = ret.get(imp.name, (0, []))
+        if count < max_references:
+            first.append(imp)
+        ret[imp.name] = (count + 1, first)
+    return ret
+
+
 def validate_code_source(
     path: PathOrSpecial, base_dir: Optional[Path] = None
 ) -> Optional[CodeSource]:
     """Check if the given file path is a valid source for parsing imports.
 
-    - Return the given path as a CodeSource object iff it is a .py or .ipynb
-      file (or the "<stdin>" special case).
+    - Return the given path as a CodeSource object iff it is a file that one
+      of the CODE_PARSERS can parse (or the "<stdin>" special case).
     - Return None if this is a directory that must be traversed further to find
       parseable files within.
     - Raise UnparseablePathError if the given path cannot be parsed.
@@ -227,4 +609,14 @@ def validate_code_source(
     if path.is_dir():
         logger.info("Finding Python files under %s", path)
         return None
-    return CodeSource(path, base_dir)
+    parser = CODE_PARSERS.get(path.suffix)
+    if parser is None and path.is_file():
+        formats = ", ".join(sorted(CODE_SUFFIXES, key=lambda s: (s.lower(), s)))
+        raise UnparseablePathError(
+            ctx=f"Supported formats are {formats}; Cannot parse code", path=path
+        )
+    if parser and parser.applies_to_path and not parser.applies_to_path(path):
+        raise UnparseablePathError(
+            ctx=f"Not a {parser.description}; Cannot parse code", path=path
+        )
+    return CodeSource(path, base_dir)  # raises if path is not a file
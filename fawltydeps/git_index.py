@@ -0,0 +1,361 @@
+"""Find the files in a git checkout by reading the git index directly.
+
+In a git checkout, the index (.git/index) lists all tracked files. Reading it
+is much cheaper than walking the whole directory tree, which often contains
+large untracked (and typically .gitignore'd) directories with build artifacts,
+data files, caches, etc.
+
+walk() below is a replacement for os.walk() (and is used in its place by
+DirectoryTraversal) that only yields tracked files, and only descends into
+directories that contain tracked files. Optionally, it also yields untracked
+files that are not ignored by .gitignore rules, in which case it must also
+descend into untracked directories, but still not into ignored directories.
+
+The git index format is documented here:
+https://git-scm.com/docs/index-format
+"""
+
+import logging
+import os
+import re
+import struct
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from fawltydeps.gitignore_parser import Rule, match_rules, parse_gitignore
+from fawltydeps.utils import dirs_between
+
+logger = logging.getLogger(__name__)
+
+GITLINK_MODE = 0o160000  # submodule
+DIR_MODE = 0o040000  # sparse directory entry (in a sparse index)
+
+# Header: signature, version, number of entries
+HEADER = struct.Struct(">4sLL")
+# Entry: ctime s/ns, mtime s/ns, dev, ino, mode, uid, gid, size
+ENTRY_STAT = struct.Struct(">10L")
+EXTENDED_FLAG = 0x4000
+SKIP_WORKTREE_FLAG = 0x4000  # in the extended flags (index v3+)
+
+
+class GitIndexError(ValueError):
+    """The git index could not be parsed."""
+
+
+@dataclass
+class TrackedDir:
+    """The tracked files and subdirectories within one directory."""
+
+    files: set[str] = field(default_factory=set)
+    subdirs: dict[str, "TrackedDir"] = field(default_factory=dict)
+    submodules: set[str] = field(default_factory=set)
+
+    def add(self, rel_path: str, *, submodule: bool = False) -> None:
+        """Add a file (or submodule) given by its '/'-separated relative path."""
+        *dirs, name = rel_path.split("/")
+        node = self
+        for dir_name in dirs:
+            node = node.subdirs.setdefault(dir_name, TrackedDir())
+        if submodule:
+            node.submodules.add(name)
+            node.subdirs.setdefault(name, TrackedDir())
+        else:
+            node.files.add(name)
+
+    def lookup(self, rel_path: str) -> Optional["TrackedDir"]:
+        """Find the TrackedDir for the given relative dir path, if tracked."""
+        node: Optional[TrackedDir] = self
+        for dir_name in filter(None, rel_path.split("/")):
+            if dir_name == ".":
+                continue
+            assert node is not None  # noqa: S101, sanity check
+            node = node.subdirs.get(dir_name)
+            if node is None:
+                return None
+        return node
+
+
+def find_git_dir(worktree: Path) -> Optional[Path]:
+    """Return the git dir of the given worktree, if it is the root of one.
+
+    The worktree either contains a .git directory, or a .git file pointing to
+    the actual git dir (for submodules and linked worktrees).
+    """
+    dot_git = worktree / ".git"
+    if dot_git.is_dir():
+        return dot_git
+    if dot_git.is_file():
+        content = dot_git.read_text(encoding="utf-8").strip()
+        if content.startswith("gitdir:"):
+            return (worktree / content[len("gitdir:") :].strip()).resolve()
+    return None
+
+
+def find_worktree(path: Path) -> Optional[tuple[Path, Path]]:
+    """Find the git worktree containing the given (absolute) directory.
+
+    Return the worktree root and its git dir, or None if not inside a git
+    checkout.
+    """
+    for candidate in [path, *path.parents]:
+        git_dir = find_git_dir(candidate)
+        if git_dir is not None:
+            return candidate, git_dir
+    return None
+
+
+def hash_size(git_dir: Path) -> int:
+    """Return the size of object names in this repo (SHA-1 or SHA-256)."""
+    common_dir = git_dir
+    if (git_dir / "commondir").is_file():  # linked worktree
+        common_dir = git_dir / (git_dir / "commondir").read_text().strip()
+    try:
+        config = (common_dir / "config").read_text(encoding="utf-8")
+    except OSError:
+        return 20
+    if re.search(
+        r"^\s*objectformat\s*=\s*sha256\s*$", config, re.IGNORECASE | re.MULTILINE
+    ):
+        return 32
+    return 20
+
+
+def parse_index(data: bytes, hash_len: int = 20) -> Iterator[tuple[str, int]]:
+    """Yield the (path, mode) of each entry in the given git index data.
+
+    Entries in merge stages > 0 (i.e. unresolved conflicts) are yielded once
+    per stage. Entries with the skip-worktree flag (i.e. not checked out in a
+    sparse checkout) are skipped.
+    """
+    try:
+        signature, version, count = HEADER.unpack_from(data)
+    except struct.error as exc:
+        raise GitIndexError(f"Truncated git index: {exc}") from exc
+    if signature != b"DIRC":
+        raise GitIndexError(f"Not a git index: signature {signature!r}")
+    if version not in {2, 3, 4}:
+        raise GitIndexError(f"Unsupported git index version {version}")
+
+    offset = HEADER.size
+    prev_path = b""
+    for _ in range(count):
+        try:
+            path, mode, skip_worktree, offset = _parse_entry(
+                data, offset, version, hash_len, prev_path
+            )
+        except (struct.error, IndexError, ValueError) as exc:
+            raise GitIndexError(f"Truncated git index: {exc}") from exc
+        prev_path = path
+        if not skip_worktree:
+            yield os.fsdecode(path), mode
+
+
+def _parse_entry(
+    data: bytes, offset: int, version: int, hash_len: int, prev_path: bytes
+) -> tuple[bytes, int, bool, int]:
+    """Parse one index entry at 'offset'.
+
+    Return its path, mode, skip-worktree flag, and the offset of the next entry.
+    """
+    entry_start = offset
+    mode = ENTRY_STAT.unpack_from(data, offset)[6]
+    offset += ENTRY_STAT.size + hash_len
+    (flags,) = struct.unpack_from(">H", data, offset)
+    offset += 2
+    skip_worktree = False
+    if flags & EXTENDED_FLAG and version >= 3:  # noqa: PLR2004
+        (extended_flags,) = struct.unpack_from(">H", data, offset)
+        offset += 2
+        skip_worktree = bool(extended_flags & SKIP_WORKTREE_FLAG)
+
+    if version == 4:  # noqa: PLR2004
+        # Path is prefix-compressed: strip N bytes from the previous path,
+        # then append the following NUL-terminated suffix. N is encoded as
+        # git's variable-length integer (see varint.c in git's sources).
+        byte = data[offset]
+        offset += 1
+        strip = byte & 0x7F
+        while byte & 0x80:
+            byte = data[offset]
+            offset += 1
+            strip = ((strip + 1) << 7) | (byte & 0x7F)
+        end = data.index(b"\0", offset)
+        path = prev_path[: len(prev_path) - strip] + data[offset:end]
+        return path, mode, skip_worktree, end + 1
+
+    # Path is NUL-terminated, and the entry is NUL-padded to a multiple of 8
+    # bytes (with at least one NUL).
+    end = data.index(b"\0", offset)
+    next_offset = entry_start + ((end - entry_start) // 8 + 1) * 8
+    return data[offset:end], mode, skip_worktree, next_offset
+
+
+@lru_cache(maxsize=8)
+def _tracked_tree(index_path: Path, mtime_ns: int, size: int) -> TrackedDir:  # noqa: ARG001
+    """Read the given index file into a TrackedDir tree (cached by mtime/size)."""
+    tree = TrackedDir()
+    data = index_path.read_bytes()
+    for path, mode in parse_index(data, hash_size(index_path.parent)):
+        if mode == DIR_MODE:
+            continue  # sparse directory: nothing checked out below here
+        tree.add(path, submodule=mode == GITLINK_MODE)
+    return tree
+
+
+def tracked_tree(git_dir: Path) -> TrackedDir:
+    """Return the tracked files in the given git dir, as a TrackedDir tree."""
+    index_path = git_dir / "index"
+    try:
+        index_stat = index_path.stat()
+    except FileNotFoundError:  # no index yet, e.g. nothing added to a new repo
+        return TrackedDir()
+    return _tracked_tree(index_path, index_stat.st_mtime_ns, index_stat.st_size)
+
+
+def _scandir(path: Path) -> tuple[list[str], list[str]]:
+    """Return the names of subdirectories and files in the given directory."""
+    dirs: list[str] = []
+    files: list[str] = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()  # follows symlinks, like os.walk()
+                except OSError:
+                    is_dir = False
+                (dirs if is_dir else files).append(entry.name)
+    except OSError as exc:
+        logger.warning("Cannot list directory %s: %s", path, exc)
+    return dirs, files
+
+
+def walk(
+    top: Path, *, include_untracked: bool = False
+) -> Iterator[tuple[str, list[str], list[str]]]:
+    """Walk the tracked parts of the git checkout that contains 'top'.
+
+    This has the same interface as os.walk(top) (top-down, and the caller may
+    prune the returned list of subdirectories to avoid descending into them),
+    but only returns the files that are tracked by git (and with
+    'include_untracked', also the untracked files that are not ignored).
+
+    All subdirectories are returned (so that e.g. Python environments can be
+    detected in untracked subdirectories), but we only descend into those that
+    contain tracked files (or, with 'include_untracked', those that are not
+    ignored).
+
+    If 'top' is not inside a git checkout, fall back to os.walk().
+    """
+    found = find_worktree(top.absolute())
+    if found is None:
+        logger.info("%s is not in a git checkout, walking the filesystem", top)
+        yield from os.walk(top, followlinks=True)
+        return
+    worktree, git_dir = found
+    try:
+        tree = tracked_tree(git_dir)
+    except (OSError, GitIndexError) as exc:
+        logger.warning(
+            "Cannot read git index in %s (%s), walking instead", git_dir, exc
+        )
+        yield from os.walk(top, followlinks=True)
+        return
+
+    rules: Optional[list[Rule]] = None
+    if include_untracked:
+        rules = gitignore_rules(git_dir / "info" / "exclude", worktree)
+        # .gitignore files in the parents of 'top' also apply
+        for parent in reversed(list(dirs_between(worktree, top.absolute().parent))):
+            rules.extend(gitignore_rules(parent / ".gitignore", parent))
+
+    rel_top = top.absolute().relative_to(worktree).as_posix()
+    yield from _walk(top, tree.lookup(rel_top), rules)
+
+
+def read_paths(
+    tops: Iterable[Path], walked_dirs: Iterable[Path], *, include_untracked: bool
+) -> list[Path]:
+    """Return the files that walk() reads, besides listing the walked dirs.
+
+    'tops' are the directories passed to walk(), and 'walked_dirs' all the
+    directories it yielded. Changes to the returned files (e.g. 'git add'
+    updating the index, or editing a .gitignore file) affect what walk()
+    returns, without changing the mtime of any walked directory.
+    """
+    ret: dict[Path, None] = {}  # ordered set
+    for top in tops:
+        found = find_worktree(top.absolute())
+        if found is None:
+            continue
+        worktree, git_dir = found
+        ret[git_dir / "index"] = None
+        if include_untracked:
+            ret[git_dir / "info" / "exclude"] = None
+            for parent in dirs_between(worktree, top.absolute()):
+                ret[parent / ".gitignore"] = None
+    for path in walked_dirs:
+        sub_git_dir = find_git_dir(path)  # e.g. a submodule, with its own index
+        if sub_git_dir is not None:
+            ret[sub_git_dir / "index"] = None
+            if include_untracked:
+                ret[sub_git_dir / "info" / "exclude"] = None
+        if include_untracked:
+            ret[path / ".gitignore"] = None
+    return list(ret)
+
+
+def gitignore_rules(path: Path, base_dir: Path) -> list[Rule]:
+    """Read ignore rules from the given file, if it exists."""
+    if not path.is_file():
+        return []
+    try:
+        return list(parse_gitignore(path, base_dir))
+    except (OSError, ValueError) as exc:
+        logger.warning("Cannot read ignore rules from %s: %s", path, exc)
+        return []
+
+
+def _walk(
+    cur: Path, tracked: Optional[TrackedDir], rules: Optional[list[Rule]]
+) -> Iterator[tuple[str, list[str], list[str]]]:
+    """Recursive helper for walk().
+
+    'tracked' is the tree of tracked files at 'cur' (None if nothing in 'cur'
+    is tracked). 'rules' are the accumulated .gitignore rules, or None if we
+    are not interested in untracked files.
+    """
+    subdirs, files = _scandir(cur)
+    if rules is not None:
+        rules = rules + gitignore_rules(cur / ".gitignore", cur)
+
+    tracked_files = tracked.files if tracked is not None else set()
+    tracked_subdirs = tracked.subdirs if tracked is not None else {}
+    wanted_files = [
+        name
+        for name in files
+        if name in tracked_files
+        or (rules is not None and not match_rules(rules, cur / name, is_dir=False))
+    ]
+    yield str(cur), subdirs, wanted_files
+
+    # The caller may have pruned 'subdirs' in place
+    for name in subdirs:
+        path = cur / name
+        if tracked is not None and name in tracked.submodules:
+            # Submodules have their own index (and their own .gitignore rules)
+            sub_git_dir = find_git_dir(path)
+            try:
+                sub_tree = tracked_tree(sub_git_dir) if sub_git_dir else None
+            except (OSError, GitIndexError) as exc:
+                logger.warning("Cannot read git index in %s: %s", sub_git_dir, exc)
+                sub_tree = None
+            yield from _walk(path, sub_tree, [] if rules is not None else None)
+        elif name in tracked_subdirs:
+            yield from _walk(path, tracked_subdirs[name], rules)
+        elif rules is not None and name != ".git" and name not in tracked_files:
+            # (A tracked symlink to a directory is a file as far as git knows)
+            if not match_rules(rules, path, is_dir=True):
+                yield from _walk(path, None, rules)
@@ -5,7 +5,8 @@ from __future__ import annotations
 import logging
 import os
 import re
-from collections.abc import Callable, Iterable, Iterator
+from collections.abc import Callable, Collection, Iterable, Iterator
+from enum import Enum
 from pathlib import Path
 from typing import NamedTuple, Optional
 
@@ -70,15 +71,104 @@ def parse_gitignore_lines(
             yield Rule.from_pattern(line, base_dir, source)
         except RuleMissing as exc:
             # Blank lines and comments are ok when parsing multiple lines
-            logger.debug(str(exc))
+            logger.debug("%s", exc)
 
 
 def match_rules(rules: list[Rule], path: Path, *, is_dir: bool) -> bool:
     """Match the given path against the given list of rules."""
+    rule = last_matching_rule(rules, path, is_dir=is_dir)
+    return rule is not None and not rule.negated
+
+
+def last_matching_rule(
+    rules: list[Rule], path: Path, *, is_dir: bool
+) -> Optional[Rule]:
+    """Return the last of the given rules that matches the given path, if any.
+
+    This is the rule that decides whether the path is ignored (or not).
+    """
     for rule in reversed(rules):
         if rule.match(path, is_dir=is_dir):
-            return not rule.negated
-    return False
+            return rule
+    return None
+
+
+def match_rules_in_dir(
+    rules: list[Rule], dir_path: Path, names: Collection[str], *, is_dir: bool
+) -> dict[str, Rule]:
+    """Return the last matching rule for each of the given entries in dir_path.
+
+    This is equivalent to calling last_matching_rule() for each of the paths
+    'dir_path / name', but faster when matching many entries: The location of
+    dir_path relative to each base_dir is only figured out once, and most rules
+    are matched against the entry names without running a regex (see RuleKind).
+
+    Entries that are not matched by any rule are left out of the result.
+    """
+    found: dict[str, Rule] = {}
+    prefixes: dict[Optional[Path], Optional[str]] = {}
+    for rule in rules:  # later matches override earlier matches
+        if rule.base_dir not in prefixes:
+            prefixes[rule.base_dir] = _rel_prefix(dir_path, rule.base_dir)
+        prefix = prefixes[rule.base_dir]
+        if prefix is not None:
+            for name in rule.match_names(prefix, names, is_dir=is_dir):
+                found[name] = rule
+        elif (  # dir_path is outside base_dir, but base_dir may be an entry
+            rule.base_dir is not None
+            and rule.base_dir.parent == dir_path
+            and rule.base_dir.name in names
+            and rule.match(rule.base_dir, is_dir=is_dir)
+        ):
+            found[rule.base_dir.name] = rule
+    return found
+
+
+def _rel_prefix(dir_path: Path, base_dir: Optional[Path]) -> Optional[str]:
+    """Return what Rule.match() puts in front of entry names in dir_path.
+
+    Return None if entries in dir_path are not relative to base_dir.
+    """
+    if base_dir is None:
+        prefix = str(dir_path)
+        if prefix == ".":
+            return ""
+        return prefix if prefix.endswith(os.sep) else prefix + os.sep
+    try:
+        prefix = dir_path.relative_to(base_dir).as_posix()
+    except ValueError:  # dir_path not relative to base_dir
+        return None
+    return "" if prefix == "." else prefix + "/"
+
+
+class RuleKind(Enum):
+    """How a Rule is matched against paths.
+
+    Most patterns are plain names (e.g. "build/") or simple globs (e.g.
+    "*.egg-info"), which can be matched against the last component of the path
+    with a string comparison, instead of running the regex.
+    """
+
+    EXACT = "exact name"  # name == text
+    SUFFIX = "name suffix"  # name.endswith(text)
+    PREFIX = "name prefix"  # name.startswith(text)
+    REGEX = "regex"  # regex.search(rel_path)
+
+    @classmethod
+    def classify(cls, pattern: str, *, anchored: bool) -> tuple[RuleKind, str]:
+        """Return the kind of (unescaped) pattern, and the text to match."""
+        if anchored or "/" in pattern or "\\" in pattern:
+            return cls.REGEX, pattern
+        literal = pattern.strip("*")
+        if not literal or any(char in literal for char in "*?["):
+            return cls.REGEX, pattern
+        if pattern == literal:
+            return cls.EXACT, literal
+        if pattern == "*" + literal:
+            return cls.SUFFIX, literal
+        if pattern == literal + "*":
+            return cls.PREFIX, literal
+        return cls.REGEX, pattern
 
 
 class Rule(NamedTuple):
@@ -93,6 +183,9 @@ class Rule(NamedTuple):
     anchored: bool  # Rule shall only match relative to .base_dir
     base_dir: Optional[Path]  # meaningful for gitignore-style behavior
     source: Optional[Location]  # Location where this rule is defined
+    # How to match this rule, see RuleKind
+    kind: RuleKind = RuleKind.REGEX
+    text: str = ""
 
     def __str__(self) -> str:
         return self.pattern
@@ -168,6 +261,7 @@ class Rule(NamedTuple):
         if anchored and base_dir is None:
             raise RuleError("Anchored pattern without base_dir", pattern, source)
 
+        kind, text = RuleKind.classify(pattern, anchored=anchored)
         return cls(
             pattern=orig_pattern,
             regex=fnmatch_pathname_to_regex(pattern, anchored=anchored),
@@ -176,6 +270,8 @@ class Rule(NamedTuple):
             anchored=anchored,
             base_dir=base_dir,
             source=source,
+            kind=kind,
+            text=text,
         )
 
     def match(self, path: Path, *, is_dir: bool) -> bool:
@@ -187,6 +283,47 @@ class Rule(NamedTuple):
                 return False
         else:
             rel_path = str(path)
+        if self.kind is not RuleKind.REGEX:
+            name = "." if rel_path == "." else path.name
+            return self._match_name(name, is_dir=is_dir)
+        return self._match_rel_path(rel_path, is_dir=is_dir)
+
+    def match_names(
+        self, prefix: str, names: Collection[str], *, is_dir: bool
+    ) -> Iterator[str]:
+        """Yield the given entry names (of the same directory) that match.
+
+        The 'prefix' is the relative path of the directory, as it is put in
+        front of each name when matching the regex (see match_rules_in_dir()).
+        """
+        if self.kind is RuleKind.EXACT:
+            if self.text in names and self._match_name(self.text, is_dir=is_dir):
+                yield self.text
+        elif self.kind is not RuleKind.REGEX:
+            yield from (name for name in names if self._match_name(name, is_dir=is_dir))
+        else:
+            for name in names:
+                if self._match_rel_path(prefix + name, is_dir=is_dir):
+                    yield name
+
+    def _match_name(self, name: str, *, is_dir: bool) -> bool:
+        """Match the last path component, for rules that are not RuleKind.REGEX.
+
+        This gives the same result as ._match_rel_path(), without the regex.
+        """
+        # A trailing slash is added for directory-only negation (see below),
+        # and our patterns never match a name that ends with a slash.
+        if self.negated and is_dir:
+            return False
+        if self.dir_only and not is_dir:
+            return False
+        if self.kind is RuleKind.EXACT:
+            return name == self.text
+        if self.kind is RuleKind.SUFFIX:
+            return name.endswith(self.text)
+        return name.startswith(self.text)
+
+    def _match_rel_path(self, rel_path: str, *, is_dir: bool) -> bool:
         # Path() strips the trailing slash, so we need to preserve it
         # in case of directory-only negation
         if self.negated and is_dir:
@@ -0,0 +1,292 @@
+"""Parse code in worker processes, with a time and memory budget for each file.
+
+A single pathological file can otherwise hang or crash the whole run: deeply
+nested code may make ast.parse() raise RecursionError (or even overflow the C
+stack), and an enormous file may simply take forever to parse.
+
+In isolated mode, code files are parsed by a pool of worker processes, one file
+at a time per worker. A file whose parsing raises an exception, takes longer
+than the timeout, or kills its worker (e.g. by exceeding the memory limit) is
+reported as a FailedSource, and the analysis continues without it. Workers
+that are killed (on timeout), die, or run out of memory are replaced as needed.
+
+The timeout applies to each file, but the memory limit applies to each worker
+process as a whole (including the memory used by the interpreter itself).
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import time
+from collections.abc import Callable, Iterable, Iterator
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+from typing import BinaryIO, NamedTuple, Optional, Union
+
+from fawltydeps import extract_imports
+from fawltydeps.types import CodeSource, FailedSource, ParsedImport
+
+logger = logging.getLogger(__name__)
+
+# How long a new worker may take to start up (i.e. until it is ready to parse)
+STARTUP_TIMEOUT = 30.0  # seconds
+
+
+class Failure(NamedTuple):
+    """Why a worker could not parse a source.
+
+    With 'retire', the worker exits after sending this (see serve()).
+    """
+
+    reason: str
+    retire: bool = False
+
+
+# What a worker sends back for each source: its imports, or why it failed
+Result = Union[list[ParsedImport], Failure]
+
+
+def limit_memory(memory_limit: Optional[int]) -> None:
+    """Limit the address space of this process (in bytes), where supported."""
+    if memory_limit is None:
+        return
+    if sys.platform.startswith("win"):
+        logger.warning("Cannot limit the memory used for parsing on Windows")
+        return
+    import resource  # noqa: PLC0415, not available on Windows
+
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def serve(
+    conn: Connection[Optional[Result], Optional[CodeSource]],
+    memory_limit: Optional[int],
+) -> None:
+    """Parse the CodeSources received on 'conn', and send back the Results.
+
+    This runs in the worker process. Send None once we are ready (i.e. done
+    starting up), and then serve until we receive None. (We cannot wait for
+    the other end of 'conn' to be closed: forked workers inherit copies of
+    it.)
+
+    The memory limit applies to this process as a whole, and memory that was
+    allocated while parsing one source is not necessarily returned before the
+    next. Therefore, after a MemoryError we exit instead of parsing more.
+    """
+    limit_memory(memory_limit)
+    conn.send(None)
+    while True:
+        src = conn.recv()
+        if src is None:
+            return
+        result: Result
+        try:
+            result = list(extract_imports.parse_source(src))
+        except Exception as exc:  # noqa: BLE001, reported as a FailedSource
+            reason = f"{type(exc).__name__}: {exc}" if str(exc) else type(exc).__name__
+            result = Failure(reason, retire=isinstance(exc, MemoryError))
+        conn.send(result)
+        if isinstance(result, Failure) and result.retire:
+            return
+
+
+class Worker:
+    """A worker process that parses one CodeSource at a time.
+
+    The time budget of each source starts when the worker is ready to parse
+    it, so that starting the worker process (which may involve starting a new
+    interpreter and importing FawltyDeps) is not counted against the first
+    source's budget. Until then, the deadline is STARTUP_TIMEOUT after the
+    worker was started.
+    """
+
+    def __init__(self, timeout: Optional[float], memory_limit: Optional[int]) -> None:
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=serve,
+            args=(child_conn, memory_limit),
+            name="fawltydeps-parser",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.timeout = timeout
+        self.ready = False  # until serve() tells us otherwise
+        self.src: Optional[CodeSource] = None
+        self.deadline = time.monotonic() + STARTUP_TIMEOUT
+
+    def _start_clock(self) -> None:
+        if self.timeout is not None:
+            self.deadline = time.monotonic() + self.timeout
+
+    def submit(self, src: CodeSource) -> None:
+        """Start parsing the given source, within our time budget."""
+        self.src = src
+        if self.ready:
+            self.deadline = math.inf
+            self._start_clock()
+        self.conn.send(src)
+
+    def receive(self) -> Optional[Result]:
+        """Receive the result for the current source, or None if not yet done.
+
+        Raise EOFError if the worker died.
+        """
+        result: Optional[Result] = self.conn.recv()
+        if result is None:  # worker is ready, and now parsing the source
+            self.ready = True
+            self.deadline = math.inf
+            self._start_clock()
+            if self.conn.poll():  # result arrived right behind it
+                result = self.conn.recv()
+        return result
+
+    def stop(self, *, kill: bool = False) -> None:
+        """Stop this worker, killing it if it is still busy."""
+        if kill:
+            self.process.kill()
+        elif self.process.is_alive():
+            self.conn.send(None)
+        self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """Parse code in up to 'size' workers, each within the given budget.
+
+    Sources that fail to parse within 'timeout' (in seconds, per source) and
+    'memory_limit' (in bytes, per worker process) are passed to 'on_failure'
+    as FailedSources. So are the sources given to workers that die, or fail
+    to start up within STARTUP_TIMEOUT. Workers that are killed (on timeout),
+    die, or run out of memory are replaced as needed.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float],
+        memory_limit: Optional[int],
+        on_failure: Callable[[FailedSource], None],
+        size: int,
+    ) -> None:
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.on_failure = on_failure
+        self.size = size
+        self.idle: list[Worker] = []
+        self.busy: list[Worker] = []
+
+    def _fail(self, worker: Worker, reason: str) -> None:
+        assert worker.src is not None  # noqa: S101, sanity check
+        assert isinstance(worker.src.path, Path)  # noqa: S101, sanity check
+        logger.error("Could not parse code from %s: %s", worker.src.path, reason)
+        self.on_failure(FailedSource(worker.src.path, reason))
+
+    def _submit(
+        self, todo: Iterator[CodeSource], stdin: Optional[BinaryIO]
+    ) -> Iterator[ParsedImport]:
+        """Pass sources from 'todo' to workers, until all workers are busy."""
+        while len(self.busy) < self.size:
+            src = next(todo, None)
+            if src is None:
+                return
+            if src.path == "<stdin>":  # cannot be read by a worker
+                yield from extract_imports.parse_source(src, stdin)
+                continue
+            if self.idle:
+                worker = self.idle.pop()
+            else:
+                worker = Worker(self.timeout, self.memory_limit)
+            worker.submit(src)
+            self.busy.append(worker)
+
+    def _collect(self) -> Iterator[ParsedImport]:
+        """Wait for results from busy workers, until the first deadline.
+
+        Also wait for the worker processes themselves, as a worker that dies
+        does not necessarily close its connection: forked workers inherit
+        copies of each other's connections.
+        """
+        deadline = min(worker.deadline for worker in self.busy)
+        ready = wait(
+            [worker.conn for worker in self.busy]
+            + [worker.process.sentinel for worker in self.busy],
+            None if deadline == math.inf else max(0, deadline - time.monotonic()),
+        )
+        for worker in [
+            worker
+            for worker in self.busy
+            if worker.conn in ready or worker.process.sentinel in ready
+        ]:
+            try:
+                if worker.conn not in ready and not worker.conn.poll():
+                    # died without sending anything
+                    raise EOFError
+                result = worker.receive()
+            except EOFError:  # the worker died, e.g. when out of memory
+                self.busy.remove(worker)
+                worker.stop()
+                self._fail(worker, f"Parser died (exit code {worker.process.exitcode})")
+                continue
+            if result is None:  # worker just became ready, still parsing
+                continue
+            self.busy.remove(worker)
+            if isinstance(result, Failure):
+                if result.retire:
+                    worker.stop()
+                else:
+                    self.idle.append(worker)
+                self._fail(worker, result.reason)
+            else:
+                self.idle.append(worker)
+                yield from result
+
+        now = time.monotonic()
+        for worker in [worker for worker in self.busy if worker.deadline <= now]:
+            self.busy.remove(worker)
+            worker.stop(kill=True)
+            if worker.ready:
+                self._fail(worker, f"Parsing took more than {self.timeout} seconds")
+            else:
+                self._fail(
+                    worker, f"Parser did not start within {STARTUP_TIMEOUT} seconds"
+                )
+
+    def parse(
+        self, sources: Iterable[CodeSource], stdin: Optional[BinaryIO] = None
+    ) -> Iterator[ParsedImport]:
+        """Parse import statements from the given sources."""
+        todo = iter(sources)
+        try:
+            while True:
+                yield from self._submit(todo, stdin)
+                if not self.busy:
+                    break
+                yield from self._collect()
+        finally:
+            for worker in self.idle:
+                worker.stop()
+            for worker in self.busy:
+                worker.stop(kill=True)
+            self.idle.clear()
+            self.busy.clear()
+
+
+def parse_sources(
+    sources: Iterable[CodeSource],
+    stdin: Optional[BinaryIO] = None,
+    *,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    on_failure: Callable[[FailedSource], None],
+) -> Iterator[ParsedImport]:
+    """Parse import statements from the given sources, in isolated workers.
+
+    Use one worker per CPU. Code read from stdin is parsed in this process
+    (without limits). See WorkerPool for details.
+    """
+    pool = WorkerPool(timeout, memory_limit, on_failure, os.cpu_count() or 1)
+    return pool.parse(sources, stdin)
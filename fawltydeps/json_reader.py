@@ -0,0 +1,203 @@
+"""Read big JSON documents incrementally, skipping the parts we don't need.
+
+Rather than loading the entire JSON document into memory (like json.load()
+does), a JsonReader walks through the document one object member (or array
+item) at a time. The caller decides, for each value, whether to read it (into
+the corresponding Python object), or to skip it. Skipped values are never
+materialized, and only a small buffer of the document is kept in memory at
+any time, no matter how big the skipped values are.
+
+This is meant for documents like Jupyter notebooks, where we only need a small
+part (the code cells) of what can be a very big document (embedded images and
+other outputs).
+"""
+
+import json
+import re
+from collections.abc import Iterator
+from typing import Optional, TextIO
+
+# Strict=False allows control characters in strings, like json.load() in the
+# past, and creating the decoder once saves time when reading many values.
+DECODER = json.JSONDecoder(strict=False)
+
+# The next non-whitespace character
+NON_WHITESPACE = re.compile(r"\S")
+# A string without escape sequences (e.g. a key), which needs no decoding
+PLAIN_STRING = re.compile(r'"([^"\\]*)"')
+# Everything up to the next bracket inside a container (including any complete
+# strings, which may contain brackets), or up to an incomplete string
+CONTAINER_BODY = re.compile(r'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*')
+# The rest of a number, or of true/false/null
+SCALAR = re.compile(r"[^\s,\]}]*")
+
+
+class JsonReader:
+    """Walk through a JSON document, reading only the values we ask for.
+
+    The document is consumed strictly from start to end: After a key is
+    yielded from .iter_object() (or an item from .iter_array()), the caller
+    must consume the corresponding value with exactly one call to
+    .read_value(), .skip_value(), .iter_object() or .iter_array(), before
+    continuing the iteration.
+
+    Skipped values are not validated beyond what is needed to find their end.
+    Syntax errors are reported with json.JSONDecodeError.
+    """
+
+    def __init__(self, stream: TextIO, chunk_size: int = 2**16) -> None:
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0  # current position in ._buf
+        self._offset = 0  # position of ._buf in the document
+        self._mark: Optional[int] = None  # start of value being read (in ._buf)
+
+    def _fill(self) -> bool:
+        """Read more of the document, return False at the end of the document.
+
+        Only the part of the buffer that is still needed is kept.
+        """
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            return False
+        keep = self._pos if self._mark is None else self._mark
+        self._buf = self._buf[keep:] + chunk
+        self._offset += keep
+        self._pos -= keep
+        if self._mark is not None:
+            self._mark = 0
+        return True
+
+    def _error(self, msg: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(msg, "", self._offset + self._pos)
+
+    def _peek(self) -> str:
+        """Skip whitespace, and return the next character ("" at the end)."""
+        if self._pos < len(self._buf) and not self._buf[self._pos].isspace():
+            return self._buf[self._pos]  # fast path
+        while True:
+            match = NON_WHITESPACE.search(self._buf, self._pos)
+            if match is not None:
+                self._pos = match.start()
+                return self._buf[self._pos]
+            self._pos = len(self._buf)
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars: str) -> str:
+        """Consume the next character, which must be one of 'chars'."""
+        char = self._peek()
+        if not char or char not in chars:
+            raise self._error(f"Expecting one of {chars!r}")
+        self._pos += 1
+        return char
+
+    def _skip_string(self) -> None:
+        # str.find() is much faster than a regex for skipping (long) strings
+        self._pos += 1  # opening quote
+        while True:
+            end = self._buf.find('"', self._pos)
+            if end == -1:  # Keep any trailing backslashes for the next round
+                end = len(self._buf)
+                while end > self._pos and self._buf[end - 1] == "\\":
+                    end -= 1
+                self._pos = end
+                if not self._fill():
+                    raise self._error("Unterminated string")
+                continue
+            backslashes = end
+            while backslashes > self._pos and self._buf[backslashes - 1] == "\\":
+                backslashes -= 1
+            self._pos = end + 1
+            if (end - backslashes) % 2 == 0:  # not an escaped quote
+                return
+
+    def _skip_container(self) -> None:
+        depth = 0
+        while True:
+            self._pos = CONTAINER_BODY.match(self._buf, self._pos).end()  # type: ignore[union-attr]
+            if self._pos == len(self._buf):
+                if not self._fill():
+                    raise self._error("Unterminated array or object")
+                continue
+            char = self._buf[self._pos]
+            if char == '"':  # a string that continues beyond the buffer
+                self._skip_string()
+                continue
+            self._pos += 1
+            depth += 1 if char in "[{" else -1
+            if depth == 0:
+                return
+
+    def _skip_scalar(self) -> None:
+        while True:
+            end = SCALAR.match(self._buf, self._pos).end()  # type: ignore[union-attr]
+            if end < len(self._buf) or not self._fill():
+                break
+        if end == self._pos:
+            raise self._error("Expecting value")
+        self._pos = end
+
+    def skip_value(self) -> None:
+        """Skip the next value, without materializing it."""
+        char = self._peek()
+        if char == '"':
+            self._skip_string()
+        elif char in {"[", "{"}:
+            self._skip_container()
+        else:
+            self._skip_scalar()
+
+    def read_value(self) -> object:
+        """Read the next value, and return it as a Python object."""
+        if self._peek() == '"':  # fast path for plain strings
+            match = PLAIN_STRING.match(self._buf, self._pos)
+            if match is not None:
+                self._pos = match.end()
+                return match.group(1)
+        self._mark = self._pos
+        try:
+            self.skip_value()
+            text = self._buf[self._mark : self._pos]
+        finally:
+            self._mark = None
+        try:
+            return DECODER.decode(text)
+        except json.JSONDecodeError as exc:
+            raise self._error(f"Invalid value: {exc.msg}") from exc
+
+    def iter_object(self) -> Iterator[str]:
+        """Walk through the next value, which must be an object.
+
+        Yield each key, and let the caller consume the corresponding value.
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            if self._peek() != '"':
+                raise self._error("Expecting property name enclosed in double quotes")
+            key = self.read_value()
+            assert isinstance(key, str)  # noqa: S101, sanity check
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+
+    def iter_array(self) -> Iterator[int]:
+        """Walk through the next value, which must be an array.
+
+        Yield the index of each item, and let the caller consume the item.
+        """
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self._expect(",]") == "]":
+                return
@@ -0,0 +1,124 @@
+"""Write FawltyDeps' JSON output incrementally.
+
+Rather than building the entire JSON document in memory before writing it,
+the top-level members (and the items of list/set members) are encoded and
+written one at a time. The output is identical to what json.dump() would
+produce for the same document.
+"""
+
+import json
+from collections.abc import Callable, Iterable
+from functools import partial
+from pathlib import PurePath
+from typing import Optional, TextIO, Union
+
+try:  # import from Pydantic V2
+    from pydantic.v1.json import custom_pydantic_encoder
+except ModuleNotFoundError:
+    from pydantic.json import custom_pydantic_encoder  # type: ignore[no-redef]
+
+from fawltydeps.packages import BasePackageResolver
+from fawltydeps.types import DeclaredDependency, Location, ParsedImport, Source
+
+# The default pydantic_encoder uses list() to serialize set objects.
+# We need a stable serialization to JSON, so let's use sorted() instead.
+# However, not all elements that we store in a set are automatically
+# orderable (e.g. PathOrSpecial don't know how to order SpecialPath vs
+# Path), so order by string representation instead:
+CUSTOM_TYPE_ENCODERS: dict[type, Callable[[type], Union[list[str], str]]] = {
+    frozenset: partial(sorted, key=str),
+    set: partial(sorted, key=str),
+    type(BasePackageResolver): lambda klass: klass.__name__,
+    type(Source): lambda klass: klass.__name__,
+}
+
+
+def encode(obj: object) -> object:
+    """Convert objects that are not natively JSON-serializable.
+
+    This is passed as the 'default' argument to the json module.
+    """
+    # Fast paths for the objects that typically dominate our output:
+    if isinstance(obj, (ParsedImport, DeclaredDependency)):
+        return {"name": obj.name, "source": obj.source}
+    if isinstance(obj, Location):
+        # Location is not a dataclass (for performance reasons), so we must
+        # serialize it ourselves
+        return obj.to_dict()
+    if isinstance(obj, PurePath):
+        return str(obj)
+    return custom_pydantic_encoder(CUSTOM_TYPE_ENCODERS, obj)
+
+
+def write_ndjson_record(out: TextIO, kind: str, obj: object, **extra: object) -> None:
+    """Write one record as a single line of JSON (a.k.a. NDJSON or JSON Lines).
+
+    The record is the JSON object representing 'obj', with an extra "record"
+    member (added first) that identifies the kind of record. Any 'extra'
+    members are added before that.
+    """
+    members = encode(obj)
+    assert isinstance(members, dict)  # noqa: S101, sanity check
+    line = json.dumps(
+        {**extra, "record": kind, **members}, separators=(",", ":"), default=encode
+    )
+    out.write(line + "\n")
+
+
+class JsonWriter:
+    """Write a JSON object to 'out', one member at a time.
+
+    With indent=None, the output is compact (no whitespace at all), otherwise
+    it is pretty-printed with the given indentation.
+    """
+
+    def __init__(self, out: TextIO, *, indent: Optional[int] = 2) -> None:
+        self.out = out
+        self.indent = indent
+        self.separators = (",", ": ") if indent is not None else (",", ":")
+
+    def _newline(self, level: int) -> str:
+        """Return the whitespace that starts a line at the given nesting level."""
+        if self.indent is None:
+            return ""
+        return "\n" + " " * (self.indent * level)
+
+    def dumps(self, obj: object, level: int) -> str:
+        """Encode the given object as JSON, at the given nesting level."""
+        text = json.dumps(
+            obj, indent=self.indent, separators=self.separators, default=encode
+        )
+        if self.indent:  # JSON strings never contain literal newlines
+            text = text.replace("\n", self._newline(level))
+        return text
+
+    def _write_items(self, items: Iterable[object], level: int) -> None:
+        """Write a JSON array, one item at a time."""
+        write = self.out.write
+        first = True
+        for item in items:
+            write(("[" if first else ",") + self._newline(level + 1))
+            write(self.dumps(item, level + 1))
+            first = False
+        write("[]" if first else self._newline(level) + "]")
+
+    def write_object(self, members: Iterable[tuple[str, object]]) -> None:
+        """Write a JSON object with the given (key, value) members.
+
+        Lists, tuples and sets are written one item at a time (sets are first
+        sorted by the string representation of their items). Other values are
+        written as a whole.
+        """
+        write = self.out.write
+        first = True
+        for key, value in members:
+            write(("{" if first else ",") + self._newline(1))
+            write(json.dumps(key) + self.separators[1])
+            if isinstance(value, (set, frozenset)):
+                self._write_items(sorted(value, key=str), level=1)
+            elif isinstance(value, (list, tuple)):
+                self._write_items(value, level=1)
+            else:
+                write(self.dumps(value, level=1))
+            first = False
+        write("{}" if first else self._newline(0) + "}")
@@ -2,9 +2,14 @@
 
 import ast
 import logging
-from typing import Union
+import sys
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from functools import partial
+from typing import Optional, Union
 
 from fawltydeps.types import Location
+from fawltydeps.utils import LazyStr
 
 logger = logging.getLogger(__name__)
 
@@ -28,11 +33,31 @@ class VariableTracker:
     This is about evaluating just enough of a setup.py file to correctly
     interpret some common patterns for declaring dependencies, but _without_
     actually executing the setup.py file (with potential security implications).
+
+    Each instance tracks the assignments in one scope (e.g. the module level,
+    or the body of a function). Variables that are not found in this scope are
+    looked up in the enclosing scope (if any).
     """
 
-    def __init__(self, source: Location) -> None:
+    def __init__(
+        self, source: Location, parent: Optional["VariableTracker"] = None
+    ) -> None:
         self.vars: dict[str, TrackedValue] = {}
         self.source: Location = source
+        self.parent = parent
+
+    def child(self) -> "VariableTracker":
+        """Return a tracker for a new scope nested within this one."""
+        return self.__class__(self.source, parent=self)
+
+    def lookup(self, name: str) -> Optional[TrackedValue]:
+        """Return the value of the given variable, or None if not tracked."""
+        tracker: Optional[VariableTracker] = self
+        while tracker is not None:
+            if name in tracker.vars:
+                return tracker.vars[name]
+            tracker = tracker.parent
+        return None
 
     def _show(self, node: ast.AST) -> str:
         """Human-readable representation of this node, mostly for debug logs."""
@@ -51,19 +76,26 @@ class VariableTracker:
         the entire setup.py.
         """
         if isinstance(node, ast.Assign):
-            logger.debug(f"Got {self._dump(node)}")
+            logger.debug("Got %s", LazyStr(partial(self._dump, node)))
             for target in node.targets:
                 if isinstance(target, ast.Name) and isinstance(target.ctx, ast.Store):
                     try:
                         self.vars[target.id] = self.resolve(node.value)
                     except CannotResolve as exc:
                         logger.warning(
-                            f"Failed to parse assignment of {target.id!r}: {self._dump(exc.node)}",
+                            "Failed to parse assignment of %r: %s",
+                            target.id,
+                            LazyStr(partial(self._dump, exc.node)),
                         )
                 else:
-                    logger.warning(f"Don't known how to parse {self._dump(node)}")
+                    logger.warning(
+                        "Don't known how to parse %s",
+                        LazyStr(partial(self._dump, node)),
+                    )
         elif isinstance(node, (ast.AnnAssign, ast.AugAssign)):
-            logger.warning(f"Don't know how to parse {self._dump(node)}!")
+            logger.warning(
+                "Don't know how to parse %s!", LazyStr(partial(self._dump, node))
+            )
 
     def resolve(self, node: ast.AST) -> TrackedValue:
         """Convert a literal or a variable reference to the ultimate value.
@@ -75,7 +107,7 @@ class VariableTracker:
             - Anything that is not a literal or a variable reference, e.g. the
               result of a function call.
         """
-        logger.debug(f"Resolving {self._dump(node)}")
+        logger.debug("Resolving %s", LazyStr(partial(self._dump, node)))
         if isinstance(node, ast.Constant):
             return str(ast.literal_eval(node))
         if isinstance(node, ast.List):
@@ -86,12 +118,73 @@ class VariableTracker:
                 for key, val in zip(node.keys, node.values)
                 if isinstance(key, ast.AST)
             }
-        if (
-            isinstance(node, ast.Name)
-            and isinstance(node.ctx, ast.Load)
-            and node.id in self.vars
-        ):
-            return self.vars[node.id]
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            value = self.lookup(node.id)
+            if value is not None:
+                return value
 
-        logger.warning(f"Unable to resolve {self._dump(node)}")
+        logger.warning("Unable to resolve %s", LazyStr(partial(self._dump, node)))
         raise CannotResolve(node, self.source.supply(lineno=node.lineno))  # type: ignore[attr-defined]
+
+
+def iter_statements(body: Iterable[ast.stmt]) -> Iterator[ast.stmt]:
+    """Yield the statements in 'body' in the order they appear.
+
+    Descend into compound statements (if/for/while/with/try/match) whose
+    blocks are executed in the same scope, and yield the statements within
+    them. Function definitions are yielded as-is, without descending into
+    their bodies. Class definitions are skipped entirely.
+    """
+    for stmt in body:
+        if isinstance(stmt, ast.ClassDef):
+            continue
+        if isinstance(
+            stmt, (ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith)
+        ):
+            yield from iter_statements(stmt.body)
+            yield from iter_statements(getattr(stmt, "orelse", []))
+        elif isinstance(stmt, ast.Try) or (
+            sys.version_info >= (3, 11) and isinstance(stmt, ast.TryStar)
+        ):
+            yield from iter_statements(stmt.body)
+            for handler in stmt.handlers:
+                yield from iter_statements(handler.body)
+            yield from iter_statements(stmt.orelse)
+            yield from iter_statements(stmt.finalbody)
+        elif sys.version_info >= (3, 10) and isinstance(stmt, ast.Match):
+            for case in stmt.cases:
+                yield from iter_statements(case.body)
+        else:
+            yield stmt
+
+
+def evaluate_until(
+    module: ast.Module,
+    source: Location,
+    is_target: Callable[[ast.stmt], bool],
+) -> Optional[tuple[ast.stmt, VariableTracker]]:
+    """Evaluate the given module statement-by-statement until 'is_target'.
+
+    Track assignments (see VariableTracker) in the order the statements appear,
+    and stop at the first statement for which 'is_target' returns True. Return
+    that statement together with the VariableTracker that holds the variables
+    in scope at that point. Return None if no such statement is found.
+
+    The module level is evaluated first. Function bodies are only evaluated
+    afterwards (and those of nested functions after that again), each in their
+    own scope nested within their enclosing scope. This way, assignments in
+    functions that do not contain the target are never made visible to it.
+    """
+    scopes: deque[tuple[list[ast.stmt], VariableTracker]] = deque(
+        [(module.body, VariableTracker(source))]
+    )
+    while scopes:
+        body, tracker = scopes.popleft()
+        for stmt in iter_statements(body):
+            if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                scopes.append((stmt.body, tracker.child()))
+            elif is_target(stmt):
+                return stmt, tracker
+            else:
+                tracker.evaluate(stmt)
+    return None
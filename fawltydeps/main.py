@@ -1,44 +1,46 @@
 """Find undeclared and/or unused 3rd-party dependencies in your Python project.
 
-Supports finding 3rd-party imports in Python scripts (*.py) and Jupyter
-notebooks (*.ipynb).
+Supports finding 3rd-party imports in Python scripts (*.py), Jupyter notebooks
+(*.ipynb), and the Python code blocks of Quarto (*.qmd), R Markdown (*.Rmd) and
+Jupytext Markdown (*.md) documents.
 
 Supports finding dependency declarations in a wide variety of file formats.
 """
 
 from __future__ import annotations
 
-import json
 import logging
 import sys
-from collections.abc import Callable, Iterator
+from collections.abc import Callable, Iterable, Iterator
 from functools import cached_property, partial
 from operator import attrgetter
-from typing import BinaryIO, Optional, TextIO, Union
+from typing import BinaryIO, Optional, TextIO, TypeVar
 
-try:  # import from Pydantic V2
-    from pydantic.v1.json import custom_pydantic_encoder
-except ModuleNotFoundError:
-    from pydantic.json import custom_pydantic_encoder  # type: ignore[no-redef]
-
-from fawltydeps import extract_deps, extract_imports
+from fawltydeps import extract_deps, extract_imports, isolated_parsing, timings
 from fawltydeps.check import calculate_undeclared, calculate_unused
 from fawltydeps.cli_parser import build_parser
+from fawltydeps.daemon import serve
 from fawltydeps.gitignore_parser import RuleError as ExcludeRuleError
+from fawltydeps.json_writer import JsonWriter, write_ndjson_record
 from fawltydeps.packages import (
     BasePackageResolver,
+    InstalledEnvsCache,
     Package,
     resolve_dependencies,
     setup_resolvers,
 )
 from fawltydeps.settings import Action, OutputFormat, Settings, print_toml_config
-from fawltydeps.traverse_project import find_sources
+from fawltydeps.timings import timed
+from fawltydeps.toml_cache import toml_cache
+from fawltydeps.traverse_project import SourcesCache, find_sources
 from fawltydeps.types import (
     CodeSource,
     DeclaredDependency,
     DepsSource,
+    FailedSource,
     ParsedImport,
     PyEnvSource,
+    SkippedSource,
     Source,
     UndeclaredDependency,
     UnparseablePathError,
@@ -49,9 +51,16 @@ from fawltydeps.utils import version
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Called with the kind of record (e.g. "import") and the record itself
+RecordCallback = Callable[[str, object], None]
+
 VERBOSE_PROMPT = "For a more verbose report re-run with the `--detailed` option."
 UNDECLARED_DEPS_OUTPUT_PREFIX = "These imports appear to be undeclared dependencies"
 UNUSED_DEPS_OUTPUT_PREFIX = "These dependencies appear to be unused (i.e. not imported)"
+SKIPPED_SOURCES_OUTPUT_PREFIX = "These files were skipped, as they exceed the limits"
+FAILED_SOURCES_OUTPUT_PREFIX = "These files could not be parsed"
 
 
 class Analysis:
@@ -65,7 +74,8 @@ class Analysis:
 
     The implicit sequence/dependency between the members is as follows:
     - .sources (a set of CodeSource, DepsSource and/or PyEnvSource objects)
-        reflect the result of traversing the project structure.
+        reflect the result of traversing the project structure. Files that
+        exceed the configured limits are represented by SkippedSources.
     - .imports contains the imports found by parsing the CodeSources.
     - .declared_deps contains the declared dependencies found by parsing the
         DepsSources.
@@ -79,16 +89,92 @@ class Analysis:
         .imports).
     """
 
-    def __init__(self, settings: Settings, stdin: Optional[BinaryIO] = None):
+    # Where the resolvers cache the packages found in Python environments,
+    # and where .sources are cached. These may be set to share them between
+    # analyses.
+    envs_cache: Optional[InstalledEnvsCache] = None
+    sources_cache: Optional[SourcesCache] = None
+
+    def __init__(
+        self,
+        settings: Settings,
+        stdin: Optional[BinaryIO] = None,
+        on_record: Optional[RecordCallback] = None,
+        *,
+        aggregate_imports: bool = False,
+    ):
         self.settings = settings
         self.stdin = stdin
+        self.on_record = on_record
+        # Only keep the first few imports of each name in .imports. This is
+        # enough for the summary output, which only shows unique import names,
+        # and saves us from keeping every import statement in memory.
+        self.aggregate_imports = aggregate_imports
         self.version = version()
+        # Code sources that failed to parse with .isolated_parsing
+        self.failed_sources: list[FailedSource] = []
 
     def is_enabled(self, *args: Action) -> bool:
         """Return True if any of the given actions are in self.settings."""
         return len(self.settings.actions.intersection(args)) > 0
 
+    def _records(self, kind: str, items: Iterable[T]) -> Iterator[T]:
+        """Pass each item to self.on_record (if set) as it is produced."""
+        if self.on_record is None:
+            yield from items
+        else:
+            for item in items:
+                self.on_record(kind, item)
+                yield item
+
+    @property
+    def isolated_parsing(self) -> bool:
+        """Return True if code is parsed in isolated worker processes.
+
+        This is enabled by giving a time or memory budget for parsing each file.
+        """
+        return (
+            self.settings.parse_timeout is not None
+            or self.settings.parse_memory_limit is not None
+        )
+
+    def _record_failure(self, src: FailedSource) -> None:
+        """Record a code source that failed to parse with .isolated_parsing."""
+        self.failed_sources.append(src)
+        if self.on_record is not None:
+            self.on_record("failed_source", src)
+
+    def parse_code(self, code_sources: Iterable[CodeSource]) -> Iterator[ParsedImport]:
+        """Parse the imports from the given code sources.
+
+        With .isolated_parsing, parse them in worker processes, and record the
+        sources that fail to parse in .failed_sources.
+        """
+        if not self.isolated_parsing:
+            return extract_imports.parse_sources(code_sources, self.stdin)
+        return isolated_parsing.parse_sources(
+            code_sources,
+            self.stdin,
+            timeout=self.settings.parse_timeout,
+            memory_limit=self.settings.parse_memory_limit,
+            on_failure=self._record_failure,
+        )
+
+    def _collect_imports(self, imports: Iterable[ParsedImport]) -> list[ParsedImport]:
+        """Collect the given imports into .imports (aggregated, if possible)."""
+        imports = self._records("import", imports)
+        if not self.aggregate_imports:
+            return list(imports)
+        aggregated = extract_imports.aggregate_imports(imports)
+        logger.debug(
+            "Aggregated %d imports of %d unique names",
+            sum(count for count, _ in aggregated.values()),
+            len(aggregated),
+        )
+        return [imp for _, first in aggregated.values() for imp in first]
+
     @cached_property
+    @timed("traversal")
     def sources(self) -> set[Source]:
         """The input sources (code, deps, pyenv) found in this project."""
         # What Source types are needed for which action?
@@ -100,32 +186,44 @@ class Analysis:
             Action.REPORT_UNUSED: {CodeSource, DepsSource, PyEnvSource},
         }
         return set(
-            find_sources(
-                self.settings,
-                set.union(*[source_types[action] for action in self.settings.actions]),
+            self._records(
+                "source",
+                find_sources(
+                    self.settings,
+                    set.union(
+                        *[source_types[action] for action in self.settings.actions]
+                    ),
+                    self.sources_cache,
+                ),
             )
         )
 
     @cached_property
+    @timed("parse code")
     def imports(self) -> list[ParsedImport]:
-        """The list of 3rd-party imports parsed from this project."""
-        return list(
-            extract_imports.parse_sources(
-                (src for src in self.sources if isinstance(src, CodeSource)),
-                self.stdin,
-            )
-        )
+        """The list of 3rd-party imports parsed from this project.
+
+        With .aggregate_imports, only the first few imports of each name are
+        kept here (but all imports are still passed to .on_record).
+        """
+        code_sources = (src for src in self.sources if isinstance(src, CodeSource))
+        return self._collect_imports(self.parse_code(code_sources))
 
     @cached_property
+    @timed("parse deps")
     def declared_deps(self) -> list[DeclaredDependency]:
         """The list of declared dependencies parsed from this project."""
         return list(
-            extract_deps.parse_sources(
-                src for src in self.sources if isinstance(src, DepsSource)
+            self._records(
+                "declared_dep",
+                extract_deps.parse_sources(
+                    src for src in self.sources if isinstance(src, DepsSource)
+                ),
             )
         )
 
     @cached_property
+    @timed("setup resolvers")
     def resolvers(self) -> list[BasePackageResolver]:
         """The resolvers used to find dependency name -> import name mappings."""
         pyenv_srcs = {src for src in self.sources if isinstance(src, PyEnvSource)}
@@ -136,10 +234,12 @@ class Analysis:
                 pyenv_srcs=pyenv_srcs,
                 use_current_env=True,
                 install_deps=self.settings.install_deps,
+                envs_cache=self.envs_cache,
             )
         )
 
     @cached_property
+    @timed("resolution")
     def resolved_deps(self) -> dict[str, Package]:
         """The resolved mapping of dependency names to provided import names."""
         return resolve_dependencies(
@@ -147,66 +247,90 @@ class Analysis:
         )
 
     @cached_property
+    @timed("undeclared deps")
     def undeclared_deps(self) -> list[UndeclaredDependency]:
         """The import statements for which no declared dependency is found."""
-        return calculate_undeclared(
-            self.imports, self.resolved_deps, self.resolvers, self.settings
+        return list(
+            self._records(
+                "undeclared_dep",
+                calculate_undeclared(
+                    self.imports, self.resolved_deps, self.resolvers, self.settings
+                ),
+            )
         )
 
     @cached_property
+    @timed("unused deps")
     def unused_deps(self) -> list[UnusedDependency]:
         """The declared dependencies that appear to not be in use."""
-        return calculate_unused(
-            self.imports, self.declared_deps, self.resolved_deps, self.settings
+        return list(
+            self._records(
+                "unused_dep",
+                calculate_unused(
+                    self.imports, self.declared_deps, self.resolved_deps, self.settings
+                ),
+            )
         )
 
     @classmethod
-    def create(cls, settings: Settings, stdin: Optional[BinaryIO] = None) -> Analysis:
+    def create(
+        cls,
+        settings: Settings,
+        stdin: Optional[BinaryIO] = None,
+        on_record: Optional[RecordCallback] = None,
+        *,
+        aggregate_imports: bool = False,
+    ) -> Analysis:
         """Exercise FawltyDeps' core logic according to the given settings.
 
         Perform the actions specified in 'settings.actions' and apply the other
         options in the 'settings' object.
 
+        If 'on_record' is given, it is called with each source, import,
+        declared dependency, undeclared dependency and unused dependency as
+        soon as it is found, together with a string identifying the kind of
+        record ("source", "import", "declared_dep", "undeclared_dep" or
+        "unused_dep").
+
+        If 'aggregate_imports' is True, only the first few imports of each
+        name are kept in .imports (and thus referenced by .undeclared_deps).
+
         This is a high-level interface to the services offered by FawltyDeps.
         Although the main caller is the command-line interface defined below,
         this can also be called from other Python contexts without having to go
         via the command-line.
         """
-        ret = cls(settings, stdin)
-
-        # Compute only the properties needed to satisfy settings.actions:
-        if ret.is_enabled(Action.LIST_SOURCES):
-            ret.sources  # noqa: B018
-        if ret.is_enabled(Action.LIST_IMPORTS):
-            ret.imports  # noqa: B018
-        if ret.is_enabled(Action.LIST_DEPS):
-            ret.declared_deps  # noqa: B018
-        if ret.is_enabled(Action.REPORT_UNDECLARED):
-            ret.undeclared_deps  # noqa: B018
-        if ret.is_enabled(Action.REPORT_UNUSED):
-            ret.unused_deps  # noqa: B018
-
+        ret = cls(settings, stdin, on_record, aggregate_imports=aggregate_imports)
+        try:
+            ret.compute()
+        finally:
+            toml_cache.clear()  # parsed TOML is only shared within one run
         return ret
 
-    def print_json(self, out: TextIO) -> None:
-        """Print the JSON representation of this analysis to 'out'."""
-        # The default pydantic_encoder uses list() to serialize set objects.
-        # We need a stable serialization to JSON, so let's use sorted() instead.
-        # However, not all elements that we store in a set are automatically
-        # orderable (e.g. PathOrSpecial don't know how to order SpecialPath vs
-        # Path), so order by string representation instead:
-        custom_type_encoders: dict[type, Callable[[type], Union[list[str], str]]] = {
-            frozenset: partial(sorted, key=str),
-            set: partial(sorted, key=str),
-            type(BasePackageResolver): lambda klass: klass.__name__,
-            type(Source): lambda klass: klass.__name__,
-        }
-        encoder = partial(custom_pydantic_encoder, custom_type_encoders)
-        json_dict = {
+    def compute(self) -> None:
+        """Compute only the properties needed to satisfy settings.actions."""
+        if self.is_enabled(Action.LIST_SOURCES):
+            self.sources  # noqa: B018
+        if self.is_enabled(Action.LIST_IMPORTS):
+            self.imports  # noqa: B018
+        if self.is_enabled(Action.LIST_DEPS):
+            self.declared_deps  # noqa: B018
+        if self.is_enabled(Action.REPORT_UNDECLARED):
+            self.undeclared_deps  # noqa: B018
+        if self.is_enabled(Action.REPORT_UNUSED):
+            self.unused_deps  # noqa: B018
+
+    def print_json(self, out: TextIO, *, compact: bool = False) -> None:
+        """Print the JSON representation of this analysis to 'out'.
+
+        The output is written incrementally, one member (or list item) at a
+        time, to avoid holding the entire document in memory.
+        """
+        members = [
             # Using direct .__dict__ lookup does not trigger computation of
             # cached properties. They are populated only if the computations
             # were already required by settings.actions.
-            field: self.__dict__.get(field)
+            (field, self.__dict__.get(field))
             for field in [
                 "settings",
                 "sources",
@@ -217,13 +341,23 @@ class Analysis:
                 "unused_deps",
                 "version",
             ]
-        }
-        json.dump(json_dict, out, indent=2, default=encoder)
-
-    def print_human_readable(  # noqa: C901
+        ]
+        if self.isolated_parsing:
+            members.append(("failed_sources", self.failed_sources))
+        if timings.active is not None:  # only the stages finished so far
+            members.append(("timings", list(timings.active.stages.values())))
+        JsonWriter(out, indent=None if compact else 2).write_object(members)
+
+    def print_human_readable(  # noqa: C901, PLR0915
         self, out: TextIO, *, detailed: bool = True
     ) -> None:
         """Print a human-readable rendering of this analysis to 'out'."""
+        # Using direct .__dict__ lookup does not trigger traversal, see print_json()
+        skipped = [
+            src
+            for src in self.__dict__.get("sources", ())
+            if isinstance(src, SkippedSource)
+        ]
 
         def render_sources() -> Iterator[str]:
             if detailed:
@@ -232,6 +366,7 @@ class Analysis:
                     (CodeSource, "Sources of Python code:"),
                     (DepsSource, "Sources of declared dependencies:"),
                     (PyEnvSource, "Python environments:"),
+                    (SkippedSource, "Skipped sources:"),
                 ]
                 for source_type, heading in source_types:
                     filtered = {s for s in self.sources if s.source_type is source_type}
@@ -240,8 +375,14 @@ class Analysis:
                         yield from sorted(
                             [f"  {src.render(detailed=True)}" for src in filtered]
                         )
-            else:
-                yield from sorted({src.render(detailed=False) for src in self.sources})
+            else:  # skipped sources are listed by render_skipped() below
+                yield from sorted(
+                    {
+                        src.render(detailed=False)
+                        for src in self.sources
+                        if not isinstance(src, SkippedSource)
+                    }
+                )
 
         def render_imports() -> Iterator[str]:
             if detailed:
@@ -271,6 +412,16 @@ class Analysis:
             for unused in sorted(self.unused_deps, key=lambda d: d.name):
                 yield f"- {unused.render(detailed=detailed)}"
 
+        def render_failed() -> Iterator[str]:
+            yield f"\n{FAILED_SOURCES_OUTPUT_PREFIX}:"
+            yield from sorted(
+                f"- {src.render(detailed=True)}" for src in self.failed_sources
+            )
+
+        def render_skipped() -> Iterator[str]:
+            yield f"\n{SKIPPED_SOURCES_OUTPUT_PREFIX}:"
+            yield from sorted(f"- {src.render(detailed=True)}" for src in skipped)
+
         def output(lines: Iterator[str]) -> None:
             for line in lines:
                 print(line, file=out)
@@ -285,6 +436,10 @@ class Analysis:
             output(render_undeclared())
         if self.is_enabled(Action.REPORT_UNUSED) and self.unused_deps:
             output(render_unused())
+        if skipped and not (detailed and self.is_enabled(Action.LIST_SOURCES)):
+            output(render_skipped())
+        if self.failed_sources:
+            output(render_failed())
 
     @staticmethod
     def success_message(*, check_undeclared: bool, check_unused: bool) -> Optional[str]:
@@ -331,6 +486,13 @@ def print_output(
 
     if analysis.settings.output_format == OutputFormat.JSON:
         analysis.print_json(stdout)
+    elif analysis.settings.output_format == OutputFormat.JSON_COMPACT:
+        analysis.print_json(stdout, compact=True)
+    elif analysis.settings.output_format == OutputFormat.NDJSON:
+        # Other records were already written while running the analysis
+        if timings.active is not None:  # only the stages finished so far
+            for stage in timings.active.stages.values():
+                write_ndjson_record(stdout, "timing", stage)
     elif analysis.settings.output_format == OutputFormat.HUMAN_DETAILED:
         analysis.print_human_readable(stdout, detailed=True)
         if exit_code == 0 and success_message:
@@ -345,7 +507,7 @@ def print_output(
         raise NotImplementedError
 
 
-def main(
+def main(  # noqa: C901, PLR0911, PLR0912
     cmdline_args: Optional[list[str]] = None,  # defaults to sys.argv[1:]
     stdin: BinaryIO = sys.stdin.buffer,
     stdout: TextIO = sys.stdout,
@@ -361,23 +523,64 @@ def main(
         print_toml_config(settings, stdout)
         return 0
 
-    try:
-        analysis = Analysis.create(settings, stdin)
-    except UnparseablePathError as exc:
-        return parser.error(exc.msg)  # exit code 2
-    except ExcludeRuleError as exc:
-        return parser.error(f"Error while parsing exclude pattern: {exc}")
-    except UnresolvedDependenciesError as exc:
-        logger.error(
-            "%s\nFawltyDeps is unable to find the above packages with the "
-            "configured package resolvers. Consider using --pyenv if these "
-            "packages are already installed somewhere, or --custom-mapping-file "
-            "to take full control of the package-to-import-names mapping.",
-            str(exc.msg),
-        )
-        return 5
+    if args.daemon is not None:
+        return serve(args.daemon)
+
+    on_record: Optional[RecordCallback] = None
+    if settings.output_format == OutputFormat.NDJSON:
+        on_record = partial(write_ndjson_record, stdout)
+
+    if args.changed is not None and args.baseline is None:
+        return parser.error("--changed requires --baseline")
+    if args.changed is not None and "-" in args.changed and "<stdin>" in settings.code:
+        return parser.error("Cannot read both --changed and --code from stdin")
+    if args.watch and "<stdin>" in settings.code:
+        return parser.error("Cannot watch code read from stdin (--code -)")
+
+    # The summary output only shows unique import names
+    aggregate_imports = settings.output_format == OutputFormat.HUMAN_SUMMARY
+
+    with timings.instrumented(timings=args.timings, profile=args.profile):
+        try:
+            if args.watch:
+                from fawltydeps.watch import watch  # noqa: PLC0415, circular import
+
+                return watch(settings, stdout)
+            if args.batch:
+                from fawltydeps.batch import run_batch  # noqa: PLC0415, circular import
+
+                return run_batch(settings, stdout, args.jobs, args)
+            if args.baseline is not None:
+                from fawltydeps import baseline  # noqa: PLC0415, circular import
+
+                analysis: Analysis = baseline.create_analysis(
+                    settings,
+                    baseline.load_baseline(args.baseline),
+                    baseline.read_changed_paths(args.changed or [], stdin),
+                    stdin,
+                    on_record,
+                    aggregate_imports=aggregate_imports,
+                )
+            else:
+                analysis = Analysis.create(
+                    settings, stdin, on_record, aggregate_imports=aggregate_imports
+                )
+        except UnparseablePathError as exc:
+            return parser.error(exc.msg)  # exit code 2
+        except ExcludeRuleError as exc:
+            return parser.error(f"Error while parsing exclude pattern: {exc}")
+        except UnresolvedDependenciesError as exc:
+            logger.error(
+                "%s\nFawltyDeps is unable to find the above packages with the "
+                "configured package resolvers. Consider using --pyenv if these "
+                "packages are already installed somewhere, or --custom-mapping-file "
+                "to take full control of the package-to-import-names mapping.",
+                str(exc.msg),
+            )
+            return 5
 
-    exit_code = assign_exit_code(analysis=analysis)
-    print_output(analysis=analysis, exit_code=exit_code, stdout=stdout)
+        exit_code = assign_exit_code(analysis=analysis)
+        with timings.measure("output"):
+            print_output(analysis=analysis, exit_code=exit_code, stdout=stdout)
 
     return exit_code
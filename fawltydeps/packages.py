@@ -9,7 +9,8 @@ import sys
 import tempfile
 import venv
 from abc import ABC, abstractmethod
-from collections.abc import Iterable, Iterator
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
 from collections.abc import Set as AbstractSet
 from contextlib import contextmanager, suppress
 from dataclasses import dataclass, replace
@@ -29,18 +30,15 @@ from importlib_metadata import (
     _top_level_inferred,
 )
 
+from fawltydeps import timings
+from fawltydeps.toml_cache import toml_cache
 from fawltydeps.types import (
     CustomMapping,
     PyEnvSource,
     UnparseablePathError,
     UnresolvedDependenciesError,
 )
-from fawltydeps.utils import site_packages
-
-if sys.version_info >= (3, 11):
-    import tomllib
-else:
-    import tomli as tomllib
+from fawltydeps.utils import LazyStr, site_packages
 
 PackageDebugInfo = Union[None, str, dict[str, set[str]]]
 
@@ -216,9 +214,9 @@ class UserDefinedMapping(BasePackageResolver):
 
             if self.mapping_paths is not None:
                 for path in self.mapping_paths:
-                    logger.debug(f"Loading user-defined mapping from {path}")
-                    with Path(path).open("rb") as mapping_file:
-                        yield tomllib.load(mapping_file), str(path)
+                    logger.debug("Loading user-defined mapping from %s", path)
+                    with toml_cache.document(path) as custom_mapping:
+                        yield custom_mapping, str(path)
 
         return accumulate_mappings(self.__class__, _custom_mappings())
 
@@ -235,21 +233,115 @@ class UserDefinedMapping(BasePackageResolver):
         return (p for p in self.packages.values() if import_name in p.import_names)
 
 
+class InstalledEnvsCache:
+    """Remember the packages found in Python environments, for reuse later.
+
+    This is meant for long-running processes (e.g. 'fawltydeps --daemon') that
+    would otherwise enumerate the packages in the same Python environments
+    over and over. A cached result is reused as long as none of the given
+    directories have been modified: installing or removing a package adds or
+    removes entries in the site-packages directory, which changes its mtime.
+
+    At most 'max_entries' sets of environments are remembered (the least
+    recently used are forgotten first), and .prune() forgets environments that
+    no longer exist.
+    """
+
+    def __init__(self, max_entries: int = 64) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.max_entries = max_entries
+        self._entries: OrderedDict[
+            tuple[str, ...],
+            tuple[tuple[Optional[int], ...], list[tuple[CustomMapping, str]]],
+        ] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _fingerprint(env_paths: Iterable[str]) -> tuple[Optional[int], ...]:
+        def mtime_ns(path: str) -> Optional[int]:
+            try:
+                return Path(path).stat().st_mtime_ns
+            except OSError:  # e.g. nonexistent entries in sys.path
+                return None
+
+        return tuple(mtime_ns(path) for path in env_paths)
+
+    def lookup(
+        self,
+        env_paths: list[str],
+        read: Callable[[list[str]], Iterator[tuple[CustomMapping, str]]],
+    ) -> Iterator[tuple[CustomMapping, str]]:
+        """Return the packages found in 'env_paths', calling 'read' if needed."""
+        key = tuple(env_paths)
+        fingerprint = self._fingerprint(key)
+        cached = self._entries.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return iter(cached[1])
+        self.misses += 1
+        found = list(read(env_paths))
+        self._entries[key] = (fingerprint, found)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return iter(found)
+
+    def prune(self) -> int:
+        """Forget environments that are out of date, e.g. have been deleted.
+
+        Such entries would never be reused. Return how many were forgotten.
+        """
+        stale = [
+            key
+            for key, (fingerprint, _) in self._entries.items()
+            if self._fingerprint(key) != fingerprint
+        ]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        """Forget all cached environments."""
+        self._entries.clear()
+
+
+# Long-running processes may set this to enable caching of Python environments
+# in all resolvers that are not given a cache of their own.
+installed_envs_cache: Optional[InstalledEnvsCache] = None
+
+
 class InstalledPackageResolver(BasePackageResolver):
     """Lookup imports exposed by packages installed in a Python environment."""
 
-    def __init__(self) -> None:
+    def __init__(self, envs_cache: Optional[InstalledEnvsCache] = None) -> None:
         """Lookup packages installed in some Python environments.
 
         Uses importlib_metadata to look up the mapping between packages and
-        their provided import names.
+        their provided import names. Packages found in each environment are
+        cached in 'envs_cache', or in the installed_envs_cache if not given.
         """
+        self.envs_cache = installed_envs_cache if envs_cache is None else envs_cache
 
     def _from_one_env(
         self, env_paths: list[str]
     ) -> Iterator[tuple[CustomMapping, str]]:
         """Return package-name-to-import-names mapping from one Python env.
 
+        See ._read_one_env() for details. Use our .envs_cache if set.
+        """
+        if self.envs_cache is None:
+            return self._read_one_env(env_paths)
+        return self.envs_cache.lookup(env_paths, self._read_one_env)
+
+    def _read_one_env(
+        self, env_paths: list[str]
+    ) -> Iterator[tuple[CustomMapping, str]]:
+        """Read package-name-to-import-names mapping from one Python env.
+
         This is roughly equivalent to calling importlib_metadata's
         packages_distributions(), except that instead of implicitly querying
         sys.path, we query the given env_paths instead.
@@ -270,10 +362,20 @@ class InstalledPackageResolver(BasePackageResolver):
                 # env_paths. Assume that the earlier package is what Python's
                 # import machinery will choose, and that this later package is
                 # not interesting.
-                logger.debug(f"Skip {dist.name} {dist.version} under {parent_dir}")
+                logger.debug(
+                    "Skip %s %s under %s",
+                    dist.name,
+                    LazyStr(partial(getattr, dist, "version")),  # reads metadata
+                    parent_dir,
+                )
                 continue
 
-            logger.debug(f"Found {dist.name} {dist.version} under {parent_dir}")
+            logger.debug(
+                "Found %s %s under %s",
+                dist.name,
+                LazyStr(partial(getattr, dist, "version")),  # reads package metadata
+                parent_dir,
+            )
             seen.add(normalized_name)
             imports = list(
                 _top_level_declared(dist)  # type: ignore[no-untyped-call]
@@ -339,13 +441,17 @@ class SysPathPackageResolver(InstalledPackageResolver):
 class LocalPackageResolver(InstalledPackageResolver):
     """Lookup imports packages installed in the given Python environments."""
 
-    def __init__(self, srcs: AbstractSet[PyEnvSource] = frozenset()) -> None:
+    def __init__(
+        self,
+        srcs: AbstractSet[PyEnvSource] = frozenset(),
+        envs_cache: Optional[InstalledEnvsCache] = None,
+    ) -> None:
         """Lookup packages installed in the given Python environments.
 
         Use importlib_metadata to look up the mapping between packages and their
         provided import names.
         """
-        super().__init__()
+        super().__init__(envs_cache)
         self.package_dirs: set[Path] = {src.path for src in srcs}
 
     @classmethod
@@ -430,7 +536,7 @@ def pyenv_sources(*pyenv_paths: Path) -> set[PyEnvSource]:
     for path in pyenv_paths:
         package_dirs = set(LocalPackageResolver.find_package_dirs(path))
         if not package_dirs:
-            logger.debug(f"Could not find a Python env at {path}!")
+            logger.debug("Could not find a Python env at %s!", path)
         ret.update(PyEnvSource(d) for d in package_dirs)
     if pyenv_paths and not ret:
         raise ValueError(f"Could not find any Python env in {pyenv_paths}!")
@@ -608,27 +714,29 @@ class IdentityMapping(BasePackageResolver):
         return {name: self.lookup_package(name) for name in package_names}
 
 
-def setup_resolvers(
+def setup_resolvers(  # noqa: PLR0913
     *,
     custom_mapping_files: Optional[set[Path]] = None,
     custom_mapping: Optional[CustomMapping] = None,
     pyenv_srcs: AbstractSet[PyEnvSource] = frozenset(),
     use_current_env: bool = False,
     install_deps: bool = False,
+    envs_cache: Optional[InstalledEnvsCache] = None,
 ) -> Iterator[BasePackageResolver]:
     """Configure a sequence of resolvers according to the given arguments.
 
     This defines the sequence of resolvers that we will use to map dependencies
-    into provided import names.
+    into provided import names. The packages found in Python environments are
+    cached in 'envs_cache', if given.
     """
     yield UserDefinedMapping(
         mapping_paths=custom_mapping_files or set(), custom_mapping=custom_mapping
     )
 
-    yield LocalPackageResolver(pyenv_srcs)
+    yield LocalPackageResolver(pyenv_srcs, envs_cache)
 
     if use_current_env:
-        yield SysPathPackageResolver()
+        yield SysPathPackageResolver(envs_cache)
 
     if install_deps:
         yield TemporaryAutoInstallResolver()
@@ -654,9 +762,12 @@ def resolve_dependencies(
         if not unresolved:  # no unresolved deps left
             logger.debug("No dependencies left to resolve!")
             break
-        logger.debug(f"Trying to resolve {unresolved!r} with {resolver}")
-        resolved = resolver.lookup_packages(unresolved)
-        logger.debug(f"  Resolved {resolved!r} with {resolver}")
+        logger.debug("Trying to resolve %r with %s", unresolved, resolver)
+        with timings.measure(f"resolver: {resolver.__class__.__name__}") as stage:
+            resolved = resolver.lookup_packages(unresolved)
+            if stage is not None:
+                stage.count = len(resolved)
+        logger.debug("  Resolved %r with %s", resolved, resolver)
         ret.update(resolved)
 
     unresolved = deps - ret.keys()
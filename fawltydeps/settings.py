@@ -12,21 +12,21 @@ from pathlib import Path
 from typing import ClassVar, Optional, TextIO, Union
 
 try:  # import from Pydantic V2
-    from pydantic.v1 import BaseSettings
+    from pydantic.v1 import BaseSettings, NonNegativeFloat, NonNegativeInt
     from pydantic.v1.env_settings import SettingsSourceCallable
     from pydantic.v1.json import custom_pydantic_encoder
 except ModuleNotFoundError:
-    from pydantic import BaseSettings  # type: ignore[no-redef]
+    from pydantic import (  # type: ignore[no-redef]
+        BaseSettings,
+        NonNegativeFloat,
+        NonNegativeInt,
+    )
     from pydantic.env_settings import SettingsSourceCallable  # type: ignore[no-redef]
     from pydantic.json import custom_pydantic_encoder  # type: ignore[no-redef]
 
+from fawltydeps.toml_cache import toml_cache
 from fawltydeps.types import CustomMapping, ParserChoice, PathOrSpecial, TomlData
 
-if sys.version_info >= (3, 11):
-    import tomllib
-else:
-    import tomli as tomllib
-
 logger = logging.getLogger(__name__)
 
 
@@ -49,9 +49,8 @@ class PyprojectTomlSettingsSource:
             return {}
 
         try:
-            with self.path.open("rb") as config_file:
-                toml_data = tomllib.load(config_file)
-            return self.get_section(toml_data)
+            with toml_cache.document(self.path) as toml_data:
+                return self.get_section(toml_data)
         except (KeyError, FileNotFoundError) as exc:
             logger.info(f"Failed to load configuration file: {exc}")
         return {}
@@ -84,6 +83,19 @@ class OutputFormat(OrderedEnum):
     HUMAN_SUMMARY = "human_summary"
     HUMAN_DETAILED = "human_detailed"
     JSON = "json"
+    JSON_COMPACT = "json_compact"
+    NDJSON = "ndjson"
+
+
+class SourceDiscovery(OrderedEnum):
+    """How to find the files in the project that may be sources."""
+
+    WALK = "walk"  # walk the filesystem
+    GIT = "git"  # tracked + untracked-but-not-ignored files in a git checkout
+    GIT_TRACKED = "git_tracked"  # only files tracked in a git checkout
+
+    def __str__(self) -> str:
+        return self.value
 
 
 def read_parser_choice(filename: str) -> ParserChoice:
@@ -168,9 +180,18 @@ class Settings(BaseSettings):
     install_deps: bool = False
     exclude: set[str] = {".*"}
     exclude_from: set[Path] = set()
+    use_gitignore: bool = False
     verbosity: int = 0
     custom_mapping_file: set[Path] = set()
     base_dir: Optional[Path] = None
+    source_discovery: SourceDiscovery = SourceDiscovery.WALK
+    extra_code_formats: set[str] = set()
+    traversal_threads: NonNegativeInt = 0
+    max_file_size: Optional[NonNegativeInt] = None
+    max_files_per_dir: Optional[NonNegativeInt] = None
+    max_files: Optional[NonNegativeInt] = None
+    parse_timeout: Optional[NonNegativeFloat] = None
+    parse_memory_limit: Optional[NonNegativeInt] = None
 
     # Class vars: these can not be overridden in the same way as above, only by
     # passing keyword args to Settings.config(). This is because they change the
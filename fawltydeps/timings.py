@@ -0,0 +1,164 @@
+"""Measure where time (and memory) goes in a FawltyDeps run.
+
+Enable this by setting 'active' to a Timings object (e.g. via the instrumented()
+context manager, which is what 'fawltydeps --timings' does). The various
+stages of the analysis are then measured with measure() or @timed. When
+'active' is None (the default), measuring is a no-op.
+
+Stages may be nested (e.g. calculating undeclared dependencies triggers
+parsing of the code, which triggers traversal of the project). The time spent
+in a nested stage is only counted for that stage, and _not_ for the enclosing
+stage, so that the times of all stages add up to the total time.
+"""
+
+import cProfile
+import logging
+import sys
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import wraps
+from pathlib import Path
+from typing import Optional, TextIO, TypeVar
+
+logger = logging.getLogger(__name__)
+
+A = TypeVar("A")
+R = TypeVar("R")
+
+
+def peak_rss() -> Optional[int]:
+    """Return the peak resident set size of this process (in bytes), if known."""
+    if sys.platform.startswith("win"):
+        return None  # no resource module on Windows
+    import resource  # noqa: PLC0415, not available on Windows
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in kilobytes elsewhere
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+@dataclass
+class Stage:
+    """The time spent in one stage, excluding time spent in nested stages.
+
+    .count is the number of items produced by this stage (if applicable), and
+    .peak_rss is the peak memory usage of the process at the end of this stage.
+    """
+
+    name: str
+    wall: float = 0.0
+    cpu: float = 0.0
+    count: Optional[int] = None
+    peak_rss: Optional[int] = None
+
+
+class Timings:
+    """Collect the Stages of a FawltyDeps run, in the order they finish."""
+
+    def __init__(self) -> None:
+        self.stages: dict[str, Stage] = {}
+        # Wall and CPU time spent in nested stages, per running stage
+        self._nested: list[list[float]] = []
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[Stage]:
+        """Measure the code in this context as (part of) the named stage."""
+        stage = self.stages.get(name, Stage(name))
+        self._nested.append([0.0, 0.0])
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield stage
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            nested_wall, nested_cpu = self._nested.pop()
+            if self._nested:  # don't count this for the enclosing stage
+                self._nested[-1][0] += wall
+                self._nested[-1][1] += cpu
+            stage.wall += wall - nested_wall
+            stage.cpu += cpu - nested_cpu
+            stage.peak_rss = peak_rss()
+            self.stages.setdefault(name, stage)
+
+    def report(self, out: TextIO) -> None:
+        """Print a table of all stages, and their totals, to 'out'."""
+
+        def row(name: str, wall: str, cpu: str, count: str, rss: str) -> str:
+            return f"{name:<40} {wall:>9} {cpu:>9} {count:>8} {rss:>14}\n"
+
+        def mib(rss: Optional[int]) -> str:
+            return "" if rss is None else f"{rss / 2**20:.1f}"
+
+        out.write(row("Stage", "Wall [s]", "CPU [s]", "Items", "Peak RSS [MiB]"))
+        for stage in self.stages.values():
+            count = "" if stage.count is None else str(stage.count)
+            wall, cpu = f"{stage.wall:.3f}", f"{stage.cpu:.3f}"
+            out.write(row(stage.name, wall, cpu, count, mib(stage.peak_rss)))
+        total_wall = sum(stage.wall for stage in self.stages.values())
+        total_cpu = sum(stage.cpu for stage in self.stages.values())
+        out.write(row("Total", f"{total_wall:.3f}", f"{total_cpu:.3f}", "", ""))
+
+
+# Set this to measure the stages of a FawltyDeps run.
+active: Optional[Timings] = None
+
+
+@contextmanager
+def measure(name: str) -> Iterator[Optional[Stage]]:
+    """Measure the code in this context as the named stage, if 'active'."""
+    if active is None:
+        yield None
+    else:
+        with active.measure(name) as stage:
+            yield stage
+
+
+def timed(name: str) -> Callable[[Callable[[A], R]], Callable[[A], R]]:
+    """Measure calls to the decorated method as the named stage.
+
+    The number of items returned by the method is recorded as the stage count.
+    """
+
+    def decorator(method: Callable[[A], R]) -> Callable[[A], R]:
+        @wraps(method)
+        def wrapper(self: A) -> R:
+            with measure(name) as stage:
+                ret = method(self)
+                if stage is not None and hasattr(ret, "__len__"):
+                    stage.count = len(ret)
+                return ret
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def instrumented(
+    *, timings: bool, profile: Optional[Path], out: Optional[TextIO] = None
+) -> Iterator[None]:
+    """Optionally collect Timings and/or run cProfile for the code in this context.
+
+    At the end, the timings are reported to 'out' (default: stderr), and the profile is written
+    to the given file in pstats format (e.g. for 'python -m pstats FILE' or
+    other tools that read pstats files).
+    """
+    global active  # noqa: PLW0603
+    if timings:
+        active = Timings()
+    profiler = cProfile.Profile() if profile is not None else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            assert profile is not None  # noqa: S101, sanity check
+            profiler.dump_stats(profile)
+            logger.info("Wrote profile to %s", profile)
+        if active is not None:
+            active.report(out or sys.stderr)
+            active = None
@@ -0,0 +1,138 @@
+"""Share parsed TOML documents between the consumers in a FawltyDeps run.
+
+The same TOML file is often read by more than one part of FawltyDeps: e.g.
+pyproject.toml is read both for our own configuration ([tool.fawltydeps]) and
+for declared dependencies. Rather than having each consumer read and parse the
+file separately, they all go through the cache in this module.
+
+The cache is only meant to be shared within one run, and is cleared when the
+run ends (see e.g. Analysis.create()), so that long-lived processes (e.g.
+--daemon, --watch or API users) do not keep parsed documents alive.
+"""
+
+import logging
+import sys
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple
+
+from fawltydeps.types import TomlData
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+TOMLDecodeError = tomllib.TOMLDecodeError
+
+logger = logging.getLogger(__name__)
+
+
+class TomlCacheKey(NamedTuple):
+    """Identify one version of a TOML file on disk."""
+
+    path: Path  # absolute path
+    mtime_ns: int
+    size: int
+
+    @classmethod
+    def from_path(cls, path: Path) -> "TomlCacheKey":
+        """Construct a cache key from the current state of the given file."""
+        stat = path.stat()  # FileNotFoundError is propagated to the caller
+        return cls(path.absolute(), stat.st_mtime_ns, stat.st_size)
+
+
+class TomlCache:
+    """A memory-bounded cache of parsed TOML documents.
+
+    Documents are keyed by (path, mtime, size), so a file that is modified
+    between two lookups will be read and parsed again.
+
+    Consumers borrow a document with the .document() context manager, and must
+    treat the returned data as read-only, as it is shared with other consumers.
+
+    Memory use is bounded in two ways, both measured by the size of the TOML
+    files on disk:
+    - Documents larger than 'large_file_size' are evicted as soon as their
+      last concurrent consumer is done with them.
+    - The total size of the remaining (small) documents is kept below
+      'max_total_size' by evicting the least recently used documents first.
+    """
+
+    def __init__(
+        self, max_total_size: int = 4 * 1024 * 1024, large_file_size: int = 256 * 1024
+    ) -> None:
+        self.max_total_size = max_total_size
+        self.large_file_size = large_file_size
+        self.hits = 0
+        self.misses = 0
+        self._docs: OrderedDict[TomlCacheKey, TomlData] = OrderedDict()
+        self._users: dict[TomlCacheKey, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @property
+    def total_size(self) -> int:
+        """The total file size of the documents currently in this cache."""
+        return sum(key.size for key in self._docs)
+
+    def _load(self, key: TomlCacheKey) -> TomlData:
+        """Return the parsed document for 'key', reading it if not cached."""
+        try:
+            toml_data = self._docs[key]
+        except KeyError:
+            self.misses += 1
+            logger.debug("Reading and parsing TOML from %s", key.path)
+            with key.path.open("rb") as toml_file:
+                toml_data = tomllib.load(toml_file)  # errors are propagated
+            # Forget older versions of the same file
+            for stale in [k for k in self._docs if k.path == key.path]:
+                del self._docs[stale]
+            self._docs[key] = toml_data
+        else:
+            self.hits += 1
+            self._docs.move_to_end(key)
+        return toml_data
+
+    def _release(self, key: TomlCacheKey) -> None:
+        """Evict documents according to the policies described above."""
+        self._users[key] -= 1
+        if self._users[key] == 0:
+            del self._users[key]
+            if key.size > self.large_file_size:
+                self._docs.pop(key, None)
+        total_size = self.total_size
+        for victim in list(self._docs):
+            if total_size <= self.max_total_size:
+                break
+            if victim in self._users:  # still in use
+                continue
+            del self._docs[victim]
+            total_size -= victim.size
+
+    @contextmanager
+    def document(self, path: Path) -> Iterator[TomlData]:
+        """Provide the parsed contents of the given TOML file.
+
+        Errors from reading or parsing the file (e.g. FileNotFoundError or
+        TOMLDecodeError) are propagated to the caller, and nothing is cached.
+        """
+        key = TomlCacheKey.from_path(path)
+        toml_data = self._load(key)
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            yield toml_data
+        finally:
+            self._release(key)
+
+    def clear(self) -> None:
+        """Forget all cached documents that are not currently in use."""
+        for key in [k for k in self._docs if k not in self._users]:
+            del self._docs[key]
+
+
+# The cache shared by all TOML consumers in the current run.
+toml_cache = TomlCache()
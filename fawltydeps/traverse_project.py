@@ -2,27 +2,33 @@
 
 import logging
 import sys
-from collections.abc import Iterator
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
 from collections.abc import Set as AbstractSet
+from functools import partial
 from pathlib import Path
-from typing import Optional, Union
+from typing import Optional, TypeVar, Union
 
+from fawltydeps import git_index
 from fawltydeps.dir_traversal import DirectoryTraversal
 from fawltydeps.extract_deps import validate_deps_source
-from fawltydeps.extract_imports import validate_code_source
+from fawltydeps.extract_imports import DEFAULT_CODE_SUFFIXES, validate_code_source
 from fawltydeps.gitignore_parser import RuleError as ExcludeRuleError
 from fawltydeps.packages import validate_pyenv_source
-from fawltydeps.settings import Settings
+from fawltydeps.settings import Settings, SourceDiscovery
 from fawltydeps.types import (
     CodeSource,
     DepsSource,
     PyEnvSource,
+    SkippedSource,
     Source,
     UnparseablePathError,
 )
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 # When setting up the traversal, we .add() directories to be traversed and we
 # attach information about what we're looking for during the traversal.
@@ -34,11 +40,253 @@ AttachedData = Union[
 ]
 
 
-def find_sources(  # noqa: C901, PLR0912, PLR0915
+# The (mtime, size) of a number of paths, or None for paths that don't exist
+PathsFingerprint = tuple[tuple[Path, Optional[tuple[int, int]]], ...]
+
+
+class SourcesCache:
+    """Remember the sources found by find_sources(), for reuse in later runs.
+
+    This is meant for long-running processes (e.g. 'fawltydeps --daemon') that
+    would otherwise traverse the same project over and over. A cached result is
+    reused when find_sources() is called with the same settings (from the same
+    working directory), and none of the traversed directories (or the files
+    named by the settings, or the git ignore files read with use_gitignore,
+    or the files whose size was checked against max_file_size, or the git
+    index and ignore files read with source_discovery) have been modified
+    since. Adding, removing or renaming entries in a directory
+    changes its mtime, but editing a file in place does not.
+
+    At most 'max_entries' results are remembered (the least recently used are
+    forgotten first), and .prune() forgets results for projects that no
+    longer exist.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.max_entries = max_entries
+        self._entries: OrderedDict[
+            tuple[object, ...], tuple[PathsFingerprint, list[Source]]
+        ] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _fingerprint(paths: Iterable[Path]) -> PathsFingerprint:
+        def stat_info(path: Path) -> Optional[tuple[int, int]]:
+            try:
+                path_stat = path.stat()
+            except OSError:
+                return None
+            return (path_stat.st_mtime_ns, path_stat.st_size)
+
+        # Absolute paths, so that .prune() can run from another directory
+        return tuple((path.absolute(), stat_info(path)) for path in paths)
+
+    def lookup(
+        self,
+        settings: Settings,
+        source_types: AbstractSet[type[Source]],
+        find: Callable[[list[Path]], Iterator[Source]],
+    ) -> Iterator[Source]:
+        """Return the sources for these settings, calling 'find' if needed.
+
+        The 'find' callable must append the directories it traverses (and any
+        other paths its result depends on) to the list that is passed to it.
+        """
+        key = (
+            Path.cwd(),
+            frozenset(source_types),
+            frozenset(settings.code),
+            frozenset(settings.deps),
+            frozenset(settings.pyenvs),
+            frozenset(settings.exclude),
+            frozenset(settings.exclude_from),
+            settings.use_gitignore,
+            settings.base_dir,
+            settings.deps_parser_choice,
+            settings.source_discovery,
+            frozenset(settings.extra_code_formats),
+            settings.max_file_size,
+            settings.max_files_per_dir,
+            settings.max_files,
+        )
+        given_paths = sorted(
+            {
+                path
+                for path in settings.code | settings.deps | settings.pyenvs
+                if isinstance(path, Path)
+            }
+            | settings.exclude_from
+        )
+        cached = self._entries.get(key)
+        if cached is not None:
+            fingerprint, sources = cached
+            paths = [path for path, _ in fingerprint]
+            if self._fingerprint(paths) == fingerprint:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return iter(sources)
+        self.misses += 1
+        traversed_dirs: list[Path] = []
+        before = self._fingerprint(given_paths)
+        sources = list(find(traversed_dirs))
+        # Directories are stat()ed _after_ being traversed. This might miss a
+        # modification that happens during the traversal, but the files named
+        # by the settings are stat()ed before, which should cover most cases.
+        self._entries[key] = (before + self._fingerprint(traversed_dirs), sources)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return iter(sources)
+
+    def prune(self) -> int:
+        """Forget results that are out of date, e.g. for deleted projects.
+
+        Such results would never be reused. Return how many were forgotten.
+        """
+        stale = [
+            key
+            for key, (fingerprint, _) in self._entries.items()
+            if self._fingerprint(path for path, _ in fingerprint) != fingerprint
+        ]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        """Forget all cached sources."""
+        self._entries.clear()
+
+
+# Long-running processes may set this to enable caching of found sources in
+# all calls to find_sources() that are not given a cache of their own.
+sources_cache: Optional[SourcesCache] = None
+
+
+class SourceLimits:
+    """Skip pathological code/deps files found while traversing directories.
+
+    Parsing e.g. a vendored .py file of hundreds of MB, or thousands of
+    generated files, can stall a run for minutes. Enforce the limits given by
+    settings.max_file_size, .max_files_per_dir and .max_files on the files
+    found in each traversed directory, and replace the files that exceed them
+    with SkippedSources. (Files passed directly in the settings are never
+    skipped.)
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.max_file_size = settings.max_file_size
+        self.max_files_per_dir = settings.max_files_per_dir
+        self.max_files = settings.max_files
+        self.files = 0  # number of files accepted so far
+        self.sized_files: list[Path] = []  # files checked against max_file_size
+
+    def apply(
+        self, dir_path: Path, sources: list[Union[CodeSource, DepsSource]]
+    ) -> Iterator[Source]:
+        """Yield the given sources found in dir_path, or the SkippedSources.
+
+        A file may be both a CodeSource and a DepsSource (e.g. setup.py), but
+        is only counted once, and skipped as a whole.
+        """
+        paths = sorted({src.path for src in sources if isinstance(src.path, Path)})
+        if self.max_files_per_dir is not None and len(paths) > self.max_files_per_dir:
+            yield SkippedSource(
+                dir_path,
+                f"{len(paths)} files to parse, more than max_files_per_dir"
+                f" = {self.max_files_per_dir}",
+            )
+            return
+
+        skipped: set[Path] = set()
+        beyond_max_files = 0
+        for path in paths:
+            if self.max_files is not None and self.files >= self.max_files:
+                skipped.add(path)
+                beyond_max_files += 1
+                continue
+            if self.max_file_size is not None:
+                self.sized_files.append(path)
+                try:
+                    size = path.stat().st_size
+                except OSError:  # e.g. removed since listing; don't abort walk
+                    skipped.add(path)
+                    continue
+                if size > self.max_file_size:
+                    skipped.add(path)
+                    yield SkippedSource(
+                        path,
+                        f"{size} bytes, more than max_file_size = {self.max_file_size}",
+                    )
+                    continue
+            self.files += 1
+        yield from (src for src in sources if src.path not in skipped)
+        if beyond_max_files:
+            yield SkippedSource(
+                dir_path,
+                f"{beyond_max_files} files to parse, after reaching max_files"
+                f" = {self.max_files}",
+            )
+
+
+def make_traversal(
+    settings: Settings, requested_paths: Iterable[Path]
+) -> DirectoryTraversal[T]:
+    """Set up a DirectoryTraversal according to the given settings.
+
+    Configure how files are discovered, and which paths are excluded. Exclude
+    patterns that are anchored apply relative to each of 'requested_paths'.
+    """
+    traversal: DirectoryTraversal[T] = DirectoryTraversal(
+        threads=settings.traversal_threads, use_gitignore=settings.use_gitignore
+    )
+    if settings.source_discovery != SourceDiscovery.WALK:
+        include_untracked = settings.source_discovery == SourceDiscovery.GIT
+        traversal.walk = partial(git_index.walk, include_untracked=include_untracked)
+    for pattern in settings.exclude:
+        try:
+            traversal.exclude(pattern)
+        except ExcludeRuleError:  # Anchored pattern needs a base_dir
+            for path in requested_paths:
+                if path.is_dir():
+                    traversal.exclude(pattern, base_dir=path)
+
+    for file_with_exclude_patterns in settings.exclude_from:
+        if file_with_exclude_patterns.is_file():
+            traversal.exclude_from(file_with_exclude_patterns)
+        else:
+            logger.warning(f"Cannot find {file_with_exclude_patterns}, skipping")
+    return traversal
+
+
+def find_sources(
     settings: Settings,
     source_types: AbstractSet[type[Source]] = frozenset(
         [CodeSource, DepsSource, PyEnvSource]
     ),
+    cache: Optional[SourcesCache] = None,
+) -> Iterator[Source]:
+    """Traverse files and directories and yield Sources to be parsed.
+
+    See _find_sources() for details. Use the given cache, or else the
+    sources_cache, if set.
+    """
+    if cache is None:
+        cache = sources_cache
+    if cache is None:
+        return _find_sources(settings, source_types)
+    return cache.lookup(
+        settings, source_types, partial(_find_sources, settings, source_types)
+    )
+
+
+def _find_sources(  # noqa: C901, PLR0912, PLR0915
+    settings: Settings,
+    source_types: AbstractSet[type[Source]],
+    traversed_dirs: Optional[list[Path]] = None,
 ) -> Iterator[Source]:
     """Traverse files and directories and yield Sources to be parsed.
 
@@ -62,11 +310,11 @@ def find_sources(  # noqa: C901, PLR0912, PLR0915
       caused by symlinks. (This is handled by DirectoryTraversal)
     """
     logger.debug("find_sources() Looking for sources under:")
-    logger.debug(f"    code:         {settings.code}")
-    logger.debug(f"    deps:         {settings.deps}")
-    logger.debug(f"    pyenvs:       {settings.pyenvs}")
-    logger.debug(f"    exclude:      {settings.exclude}")
-    logger.debug(f"    exclude_from: {settings.exclude_from}")
+    logger.debug("    code:         %s", settings.code)
+    logger.debug("    deps:         %s", settings.deps)
+    logger.debug("    pyenvs:       %s", settings.pyenvs)
+    logger.debug("    exclude:      %s", settings.exclude)
+    logger.debug("    exclude_from: %s", settings.exclude_from)
 
     requested_paths = {
         path
@@ -74,20 +322,9 @@ def find_sources(  # noqa: C901, PLR0912, PLR0915
         if isinstance(path, Path)
     }
 
-    traversal: DirectoryTraversal[AttachedData] = DirectoryTraversal()
-    for pattern in settings.exclude:
-        try:
-            traversal.exclude(pattern)
-        except ExcludeRuleError:  # Anchored pattern needs a base_dir
-            for path in requested_paths:
-                if path.is_dir():
-                    traversal.exclude(pattern, base_dir=path)
-
-    for file_with_exclude_patterns in settings.exclude_from:
-        if file_with_exclude_patterns.is_file():
-            traversal.exclude_from(file_with_exclude_patterns)
-        else:
-            logger.warning(f"Cannot find {file_with_exclude_patterns}, skipping")
+    traversal: DirectoryTraversal[AttachedData] = make_traversal(
+        settings, requested_paths
+    )
 
     defaults = Settings.config(config_file=None)()
     default_paths = defaults.code | defaults.code | defaults.pyenvs
@@ -109,7 +346,7 @@ def find_sources(  # noqa: C901, PLR0912, PLR0915
             path_or_special, settings.base_dir
         )
         if validated is not None:  # parse-able file given directly
-            logger.debug(f"find_sources() Found {validated}")
+            logger.debug("find_sources() Found %s", validated)
             yield validated
         else:  # must traverse directory
             # sanity check: convince mypy that SpecialPath is already handled
@@ -124,7 +361,7 @@ def find_sources(  # noqa: C901, PLR0912, PLR0915
             path, settings.deps_parser_choice, filter_by_parser=False
         )
         if validated is not None:  # parse-able file given directly
-            logger.debug(f"find_sources() Found {validated}")
+            logger.debug("find_sources() Found %s", validated)
             yield validated
         else:  # must traverse directory
             traversal.add(path, DepsSource)
@@ -133,7 +370,7 @@ def find_sources(  # noqa: C901, PLR0912, PLR0915
         # exceptions raised by validate_pyenv_source() are propagated here
         package_dirs: Optional[set[PyEnvSource]] = validate_pyenv_source(path)
         if package_dirs is not None:  # Python environment dir given directly
-            logger.debug(f"find_sources() Found {package_dirs}")
+            logger.debug("find_sources() Found %s", package_dirs)
             yield from package_dirs
             if path in (settings.code | settings.deps):
                 # We are also searching this dir for code/deps, hence we should
@@ -150,7 +387,11 @@ def find_sources(  # noqa: C901, PLR0912, PLR0915
         else:  # must traverse directory to find Python environments
             traversal.add(path, PyEnvSource)
 
+    limits = SourceLimits(settings)
+    code_suffixes = DEFAULT_CODE_SUFFIXES | settings.extra_code_formats
     for step in traversal.traverse():
+        if traversed_dirs is not None:
+            traversed_dirs.append(step.dir)
         # Extract the Source types we're looking for in this directory.
         # Sanity checks:
         #   - We should not traverse into a directory unless we're looking for
@@ -167,16 +408,20 @@ def find_sources(  # noqa: C901, PLR0912, PLR0915
                 if package_dirs is not None:  # pyenvs found here
                     yield from package_dirs
                     traversal.skip_dir(path)  # don't recurse into Python environment
+        # Code/deps files found in this directory, subject to our limits
+        found: list[Union[CodeSource, DepsSource]] = []
         if CodeSource in types:
             # Retrieve base_dir from closest ancestor, i.e. last CodeSource in .attached:
             base_dir = next(
                 t[1] for t in reversed(step.attached) if isinstance(t, tuple)
             )
             for path in step.files:
+                if path.suffix not in code_suffixes:
+                    continue  # not code, or a format that is not enabled
                 try:  # catch all exceptions while traversing dirs
                     validated = validate_code_source(path, base_dir)
-                    assert validated is not None  # noqa: S101, sanity check
-                    yield validated
+                    assert isinstance(validated, CodeSource)  # noqa: S101, sanity check
+                    found.append(validated)
                 except UnparseablePathError:  # don't abort directory walk for this
                     pass
         if DepsSource in types:
@@ -185,7 +430,58 @@ def find_sources(  # noqa: C901, PLR0912, PLR0915
                     validated = validate_deps_source(
                         path, settings.deps_parser_choice, filter_by_parser=True
                     )
-                    assert validated is not None  # noqa: S101, sanity check
-                    yield validated
+                    assert isinstance(validated, DepsSource)  # noqa: S101, sanity check
+                    found.append(validated)
                 except UnparseablePathError:  # don't abort directory walk for this
                     pass
+        yield from limits.apply(step.dir, found)
+
+    if traversed_dirs is not None:  # modifying these affects the traversal
+        walked_dirs = list(traversed_dirs)
+        traversed_dirs.extend(traversal.ignore_files)
+        # Editing a file changes its size, but not its directory's mtime
+        traversed_dirs.extend(limits.sized_files)
+        # Neither does e.g. 'git add' (which only updates the git index)
+        if settings.source_discovery != SourceDiscovery.WALK:
+            traversed_dirs.extend(
+                git_index.read_paths(
+                    {path for path in requested_paths if path.is_dir()},
+                    walked_dirs,
+                    include_untracked=settings.source_discovery == SourceDiscovery.GIT,
+                )
+            )
+
+
+def find_projects(
+    settings: Settings, project_files: AbstractSet[str]
+) -> tuple[list[Path], set[PyEnvSource]]:
+    """Find project roots and Python environments in a single traversal.
+
+    Traverse the directories configured by the given Settings object, and
+    return the directories that contain any of 'project_files', as well as
+    the Python environments found along the way. Python environments are not
+    traversed further.
+    """
+    roots = {
+        path
+        for path in settings.code | settings.deps | settings.pyenvs
+        if isinstance(path, Path) and path.is_dir()
+    }
+    projects = []
+    pyenvs = set()
+    traversal: DirectoryTraversal[None] = make_traversal(settings, roots)
+    for root in roots:
+        package_dirs = validate_pyenv_source(root)
+        if package_dirs is not None:  # Python environment given directly
+            pyenvs.update(package_dirs)
+        else:
+            traversal.add(root)
+    for step in traversal.traverse():
+        for path in step.subdirs | step.excluded_subdirs:
+            package_dirs = validate_pyenv_source(path)
+            if package_dirs is not None:  # don't look for projects in here
+                pyenvs.update(package_dirs)
+                traversal.skip_dir(path)
+        if any(path.name in project_files for path in step.files):
+            projects.append(step.dir)
+    return sorted(projects), pyenvs
@@ -3,15 +3,15 @@
 from __future__ import annotations
 
 import sys
+import threading
+import weakref
 from abc import ABC, abstractmethod
-from dataclasses import asdict, dataclass, field, replace
+from dataclasses import FrozenInstanceError, dataclass, field
 from enum import Enum
-from functools import cached_property, total_ordering
+from functools import partial, total_ordering
 from pathlib import Path
 from typing import Any, Literal, Optional, Union
 
-from fawltydeps.utils import hide_dataclass_fields
-
 SpecialPath = Literal["<stdin>"]
 PathOrSpecial = Union[SpecialPath, Path]
 TomlData = dict[str, Any]  # type: ignore[explicit-any]
@@ -68,7 +68,8 @@ class Source(ABC):
 class CodeSource(Source):
     """A Python code source to be parsed for import statements.
 
-    .path points to the .py or .ipynb file containing Python code, alternatively
+    .path points to a file containing Python code (a .py or .ipynb file, or
+        any other format in extract_imports.CODE_PARSERS), alternatively
         it points to the "<stdin>" special case which means Python code will be
         read from standard input.
     .base_dir is an optional directory that contains modules/packages that
@@ -82,6 +83,7 @@ class CodeSource(Source):
 
     def __post_init__(self) -> None:
         super().__post_init__()
+        object.__setattr__(self, "path", path_table.intern(self.path).path)
         if self.path != "<stdin>":
             assert isinstance(self.path, Path)  # noqa: S101, sanity check
             if not self.path.is_file():
@@ -89,11 +91,6 @@ class CodeSource(Source):
                     ctx="Code path to parse is neither dir nor file",
                     path=self.path,
                 )
-            if self.path.suffix not in {".py", ".ipynb"}:
-                raise UnparseablePathError(
-                    ctx="Supported formats are .py and .ipynb; Cannot parse code",
-                    path=self.path,
-                )
 
     def render(self, *, detailed: bool) -> str:
         """Return a human-readable string representation of this source."""
@@ -122,6 +119,7 @@ class DepsSource(Source):
 
     def __post_init__(self) -> None:
         super().__post_init__()
+        object.__setattr__(self, "path", path_table.intern(self.path).path)
         assert self.path.is_file()  # noqa: S101, sanity check
 
     def render(self, *, detailed: bool) -> str:
@@ -147,6 +145,7 @@ class PyEnvSource(Source):
 
     def __post_init__(self) -> None:
         super().__post_init__()
+        object.__setattr__(self, "path", path_table.intern(self.path).path)
         assert self.path.is_dir()  # noqa: S101, sanity check
 
         # Support virtualenvs and system-wide installs on Windows
@@ -177,8 +176,124 @@ class PyEnvSource(Source):
         return f"{self.path}"
 
 
+@dataclass(frozen=True, eq=True, order=True)
+class SkippedSource(Source):
+    """A source that was found, but will not be parsed, as it exceeds a limit.
+
+    .path points to the skipped file, or to a directory whose files were all
+        skipped (e.g. when it contains more files than allowed).
+    .reason describes which limit was exceeded (see Settings.max_file_size,
+        .max_files_per_dir and .max_files).
+    """
+
+    path: Path
+    reason: str
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        object.__setattr__(self, "path", path_table.intern(self.path).path)
+
+    def render(self, *, detailed: bool) -> str:
+        """Return a human-readable string representation of this source."""
+        if detailed:
+            return f"{self.path} ({self.reason})"
+        return f"{self.path}"
+
+
+@dataclass(frozen=True, eq=True, order=True)
+class FailedSource(Source):
+    """A code source that could not be parsed in an isolated worker process.
+
+    .path points to the file that failed to parse.
+    .reason describes the failure, e.g. the exception raised by the parser,
+        or that parsing exceeded its time or memory budget (see
+        Settings.parse_timeout and .parse_memory_limit).
+    """
+
+    path: Path
+    reason: str
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        object.__setattr__(self, "path", path_table.intern(self.path).path)
+
+    def render(self, *, detailed: bool) -> str:
+        """Return a human-readable string representation of this source."""
+        if detailed:
+            return f"{self.path} ({self.reason})"
+        return f"{self.path}"
+
+
+class PathEntry:
+    """One interned path in a PathTable."""
+
+    __slots__ = ("__weakref__", "id", "path", "sort_key")
+
+    def __init__(self, id_: int, path: PathOrSpecial) -> None:
+        self.id = id_
+        self.path = path
+        self.sort_key = repr(path)  # used to sort Locations alphabetically by path
+
+
+class PathTable:
+    """Intern the paths that are referred to by Sources and Locations.
+
+    We create a Location for every import statement and dependency declaration
+    that we find, and most of them refer to the same (relatively few) paths.
+    Interning these paths lets all Locations that refer to the same file share
+    one entry (the path object, a small integer ID, and a precomputed sort
+    key), which saves memory, and makes comparing and hashing Locations cheap.
+
+    The table only holds weak references to its entries: Locations hold on to
+    their entry, and an entry is removed once no Location refers to it. This
+    keeps long-lived processes (e.g. --daemon or --watch) from accumulating
+    every path they have ever seen. Equality between Locations stays sound, as
+    two equal paths always map to the _same_ entry while it is in use.
+
+    Paths may be interned from several threads (e.g. --traversal-threads), so
+    adding and removing entries is serialized by a lock. This is reentrant, as
+    garbage collection may remove a dead entry (via its weakref callback) in
+    the middle of adding another entry.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[PathOrSpecial, weakref.ref[PathEntry]] = {}
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, path: PathOrSpecial, ref: weakref.ref[PathEntry]) -> None:
+        # Only remove the entry that died, not a newer entry for the same path
+        with self._lock:
+            if self._entries.get(path) is ref:
+                del self._entries[path]
+
+    def intern(self, path: PathOrSpecial) -> PathEntry:
+        """Return the entry for the given path, adding it if not yet present."""
+        ref = self._entries.get(path)  # fast path: a live entry needs no lock
+        entry = None if ref is None else ref()
+        if entry is not None:
+            return entry
+        with self._lock:
+            ref = self._entries.get(path)
+            entry = None if ref is None else ref()
+            if entry is None:  # add a new entry, or replace a dead one
+                entry = PathEntry(self._next_id, path)
+                self._next_id += 1
+                self._entries[path] = weakref.ref(entry, partial(self._remove, path))
+            return entry
+
+
+# The path table shared by all Sources and Locations in this process. This is
+# deliberately not per run: Locations outlive runs in the caches of --daemon
+# and --watch, and they are only equal if their paths share a table. Unused
+# entries are removed (see above), so the table does not grow across runs.
+path_table = PathTable()
+
+
 @total_ordering
-@dataclass(frozen=True)
 class Location:
     """Reference to a source location, e.g. a file, a line within a file, etc.
 
@@ -196,39 +311,84 @@ class Location:
 
     Instances have a string representation that reflect the level of detail
     provided, and they are sortable.
+
+    We create one of these for every import statement we find, so this is
+    deliberately _not_ a dataclass: a plain class with __slots__ is both
+    smaller and much cheaper to construct. Instances are immutable.
+
+    The path is interned in the global path_table, which makes comparing and
+    hashing Locations cheap (see PathTable for details). Each Location keeps
+    its path table entry alive.
     """
 
-    path: PathOrSpecial
-    cellno: Optional[int] = None
-    lineno: Optional[int] = None
+    __slots__ = ("_entry", "cellno", "lineno")
 
-    def __post_init__(self) -> None:
-        """Do magic to hide unset/None members from JSON representation."""
-        unset = [attr for attr, value in asdict(self).items() if value is None]
-        hide_dataclass_fields(self, *unset)
-
-    # It would be ideal to use the automatic __eq__, __lt__, etc. methods that
-    # @dataclass can provide for us, thus making Location objects automatically
-    # orderable/sortable. However, the automatic implementations end up directly
-    # comparing tuples of our members, which fails when some of those members
-    # are None, with errors like e.g.: TypeError: '<' not supported between
-    # instances of 'PosixPath' and 'NoneType'.
-    # Instead, we must implement our own. Do so based on a comparable/sortable
-    # tuple created on demand and cached inside the instance:
-
-    @cached_property
-    def _sort_key(self) -> tuple[str, int, int]:
-        """Return a sortable key that uniquely reflects this instance.
-
-        This is used to compare Location objects, and determine how they sort
-        relative to each other. The following must hold:
-        - All instance details are captured: equal sort key => equal instance
-        - Member order matters: sort by path, then cellno, then lineno
-        - Unspecified members sort together, and separate from specified members
-        - Paths sort alphabetically, the other members sort numerically
+    _entry: PathEntry
+    cellno: Optional[int]
+    lineno: Optional[int]
+
+    def __init__(
+        self,
+        path: PathOrSpecial,
+        cellno: Optional[int] = None,
+        lineno: Optional[int] = None,
+    ) -> None:
+        object.__setattr__(self, "_entry", path_table.intern(path))
+        object.__setattr__(self, "cellno", cellno)
+        object.__setattr__(self, "lineno", lineno)
+
+    @property
+    def path(self) -> PathOrSpecial:
+        """The path to the file (or "<stdin>") that this location refers to."""
+        return self._entry.path
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise FrozenInstanceError(f"cannot assign to field {name!r}")
+
+    def __delattr__(self, name: str) -> None:
+        raise FrozenInstanceError(f"cannot delete field {name!r}")
+
+    def __reduce__(self) -> tuple[type[Location], tuple[object, ...]]:
+        # Our path table is per-process, so re-intern the path when unpickling
+        return (self.__class__, (self.path, self.cellno, self.lineno))
+
+    def __copy__(self) -> Location:
+        return self  # immutable
+
+    def __deepcopy__(self, memo: object) -> Location:
+        return self  # immutable
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(path={self.path!r}, "
+            f"cellno={self.cellno!r}, lineno={self.lineno!r})"
+        )
+
+    def to_dict(self) -> dict[str, Union[PathOrSpecial, int]]:
+        """Return the members of this instance that are set (i.e. not None).
+
+        This is the representation of this object in our JSON output.
         """
+        ret: dict[str, Union[PathOrSpecial, int]] = {"path": self.path}
+        if self.cellno is not None:
+            ret["cellno"] = self.cellno
+        if self.lineno is not None:
+            ret["lineno"] = self.lineno
+        return ret
+
+    # It would be ideal to simply compare tuples of our members to make
+    # Location objects orderable/sortable. However, that ends up failing when
+    # some of those members are None, with errors like e.g.: TypeError: '<' not
+    # supported between instances of 'PosixPath' and 'NoneType'.
+    # Instead, we must implement our own. The following must hold:
+    # - All instance details are captured: equal members <=> equal instances
+    # - Member order matters: sort by path, then cellno, then lineno
+    # - Unspecified members sort together, and before specified members
+    # - Paths sort alphabetically, the other members sort numerically
+
+    def _numbers(self) -> tuple[int, int]:
+        """Return (cellno, lineno) with unspecified members replaced by -1."""
         return (
-            repr(self.path),
             -1 if self.cellno is None else self.cellno,
             -1 if self.lineno is None else self.lineno,
         )
@@ -236,15 +396,21 @@ class Location:
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, Location):
             return NotImplemented
-        return self._sort_key == other._sort_key
+        return (
+            self._entry is other._entry
+            and self.cellno == other.cellno
+            and self.lineno == other.lineno
+        )
 
     def __lt__(self, other: object) -> bool:
         if not isinstance(other, Location):
             return NotImplemented
-        return self._sort_key < other._sort_key
+        if self._entry is not other._entry:
+            return self._entry.sort_key < other._entry.sort_key
+        return self._numbers() < other._numbers()
 
     def __hash__(self) -> int:
-        return hash(self._sort_key)
+        return hash((self._entry.id, self.cellno, self.lineno))
 
     def __str__(self) -> str:
         ret = str(self.path)
@@ -258,29 +424,38 @@ class Location:
         self, *, lineno: Optional[int] = None, cellno: Optional[int] = None
     ) -> Location:
         """Create a new Location that contains additional information."""
-        changes = {
-            attr: value
-            for attr, value in locals().items()
-            if attr != "self" and value is not None
-        }
-        return replace(self, **changes)
+        ret = object.__new__(self.__class__)
+        object.__setattr__(ret, "_entry", self._entry)  # already interned
+        object.__setattr__(ret, "cellno", self.cellno if cellno is None else cellno)
+        object.__setattr__(ret, "lineno", self.lineno if lineno is None else lineno)
+        return ret
 
 
 @dataclass(eq=True, frozen=True, order=True)
 class ParsedImport:
     """Import parsed from the source code."""
 
+    __slots__ = ("name", "source")
+
     name: str
     source: Location
 
+    def __reduce__(self) -> tuple[type[ParsedImport], tuple[str, Location]]:
+        return (self.__class__, (self.name, self.source))
+
 
 @dataclass(eq=True, frozen=True, order=True)
 class DeclaredDependency:
     """Declared dependencies parsed from configuration-containing files."""
 
+    __slots__ = ("name", "source")
+
     name: str
     source: Location
 
+    def __reduce__(self) -> tuple[type[DeclaredDependency], tuple[str, Location]]:
+        return (self.__class__, (self.name, self.source))
+
 
 @dataclass
 class UndeclaredDependency:
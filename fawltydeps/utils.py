@@ -2,8 +2,7 @@
 
 import logging
 import sys
-from collections.abc import Iterator
-from dataclasses import is_dataclass
+from collections.abc import Callable, Iterator
 from itertools import takewhile
 from pathlib import Path
 from typing import TypeVar
@@ -29,19 +28,29 @@ def dirs_between(parent: Path, child: Path) -> Iterator[Path]:
     return takewhile(lambda p: p.is_relative_to(parent), [child, *child.parents])
 
 
-def hide_dataclass_fields(instance: object, *field_names: str) -> None:
-    """Make a dataclass field invisible to asdict() and astuple().
+class LazyStr:
+    """Defer an expensive string conversion until it is actually needed.
 
-    This also affects e.g. when serializing this dataclass instance to JSON.
+    Use this to pass expensive-to-format arguments to logger calls that use
+    %-style formatting, e.g.:
+
+        logger.debug("Found %s", LazyStr(partial(ast.dump, node)))
+
+    The logging module only converts its arguments to strings when the message
+    is actually emitted, so ast.dump() is never called when debug logging is
+    disabled.
     """
-    if not is_dataclass(instance) or isinstance(instance, type):
-        raise TypeError(f"{instance!r} is not a dataclass instance")
-    remaining_fields = {
-        name: value
-        for name, value in instance.__dataclass_fields__.items()
-        if name not in field_names
-    }
-    object.__setattr__(instance, "__dataclass_fields__", remaining_fields)
+
+    __slots__ = ("func",)
+
+    def __init__(self, func: Callable[[], object]) -> None:
+        self.func = func
+
+    def __str__(self) -> str:
+        return str(self.func())
+
+    def __repr__(self) -> str:
+        return repr(self.func())
 
 
 def site_packages(venv_dir: Path = Path()) -> Path:
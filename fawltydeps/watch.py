@@ -0,0 +1,488 @@
+"""Watch the project for changes, and incrementally update the analysis.
+
+With 'fawltydeps --watch', we keep the results of the analysis between runs,
+and after each change to the project we re-parse only the files that changed.
+The undeclared/unused dependencies are then recalculated from per-name
+reference counts (which import names are imported/declared, and where),
+rather than from a rescan of all imports and declared dependencies.
+
+Changes are detected by comparing the mtime/size of each source with the
+previous round. The project is only traversed again (to find new or removed
+sources) when any of the traversed directories changed, cf. SourcesCache.
+Editing files in place does not change their directories, so this is rare.
+
+To find out _when_ to look for changes, we use inotify (on Linux) to wait for
+changes in the directories containing our sources, and fall back to polling
+at a fixed interval elsewhere.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import sys
+import time
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Optional, TextIO, TypeVar, Union
+
+from fawltydeps import extract_deps, extract_imports
+from fawltydeps.check import is_ignored
+from fawltydeps.json_writer import write_ndjson_record
+from fawltydeps.main import Analysis, assign_exit_code, print_output
+from fawltydeps.packages import BasePackageResolver, Package, suggest_packages
+from fawltydeps.settings import Action, OutputFormat, Settings
+from fawltydeps.toml_cache import toml_cache
+from fawltydeps.traverse_project import SourcesCache
+from fawltydeps.types import (
+    CodeSource,
+    DeclaredDependency,
+    DepsSource,
+    FailedSource,
+    ParsedImport,
+    PathOrSpecial,
+    PyEnvSource,
+    SkippedSource,
+    Source,
+    UndeclaredDependency,
+    UnresolvedDependenciesError,
+    UnusedDependency,
+)
+
+logger = logging.getLogger(__name__)
+
+# How often to look for changes when we have no better way to be notified
+POLL_INTERVAL = 1.0  # seconds
+# How often to look for changes anyway when we rely on inotify, to catch the
+# changes in directories that we are not watching (e.g. new subdirectories).
+RESCAN_INTERVAL = 10.0  # seconds
+
+S = TypeVar("S", bound=Source)
+
+# Kinds of NDJSON records, and the corresponding Analysis members
+NDJSON_RECORDS = [
+    ("source", "sources"),
+    ("import", "imports"),
+    ("declared_dep", "declared_deps"),
+    ("undeclared_dep", "undeclared_deps"),
+    ("unused_dep", "unused_deps"),
+]
+
+# Identify the state of a source (mtimes and sizes); None if it is missing
+Stamp = Optional[tuple[int, ...]]
+
+
+class IncrementalAnalysis:
+    """Maintain the results of an analysis across changes to the project.
+
+    Call .update() to find the changed sources and re-parse them, and then
+    .analysis() to get an Analysis object reflecting the current results.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self.sources: set[Source] = set()
+        self.stamps: dict[Source, Stamp] = {}
+        # The sources found in the previous round, reused until the project's
+        # directories change
+        self.sources_cache = SourcesCache(max_entries=1)
+        self.imports: dict[CodeSource, list[ParsedImport]] = {}
+        self.declared_deps: dict[DepsSource, list[DeclaredDependency]] = {}
+        # Code sources that failed to parse (with isolated parsing)
+        self.failed_sources: dict[CodeSource, FailedSource] = {}
+        # Reference counts: name -> number of imports/declarations per source
+        self.importers: defaultdict[str, Counter[CodeSource]] = defaultdict(Counter)
+        self.declarers: defaultdict[str, Counter[DepsSource]] = defaultdict(Counter)
+        # Dependency resolution is redone only when its inputs change
+        self.resolvers: Optional[list[BasePackageResolver]] = None
+        self.resolved_deps: dict[str, Package] = {}
+        self.declared_import_names: set[str] = set()
+        self._candidates: dict[str, set[str]] = {}
+
+    def is_enabled(self, *args: Action) -> bool:
+        """Return True if any of the given actions are in self.settings."""
+        return len(self.settings.actions.intersection(args)) > 0
+
+    @staticmethod
+    def _stamp(src: Source, dir_mtimes: dict[Path, int]) -> Stamp:
+        """Return the current stamp of the given source."""
+
+        def dir_mtime(path: Path) -> int:
+            if path not in dir_mtimes:
+                dir_mtimes[path] = path.absolute().stat().st_mtime_ns
+            return dir_mtimes[path]
+
+        try:
+            if isinstance(src, PyEnvSource):  # installing packages changes mtime
+                return (dir_mtime(src.path),)
+            if isinstance(src, CodeSource):  # see ParsedImportsCache
+                assert isinstance(src.path, Path)  # noqa: S101, sanity check
+                file_stat = src.path.stat()
+                return (
+                    file_stat.st_mtime_ns,
+                    file_stat.st_size,
+                    *(dir_mtime(d) for d in extract_imports.first_party_dirs(src)),
+                )
+            assert isinstance(src, (DepsSource, SkippedSource))  # noqa: S101, sanity check
+            file_stat = src.path.stat()
+        except OSError:
+            return None
+        return (file_stat.st_mtime_ns, file_stat.st_size)
+
+    def _forget(self, src: Source) -> None:
+        """Remove the contributions of the given source from our results."""
+        if isinstance(src, CodeSource):
+            for imp in self.imports.pop(src, []):
+                self._decref(self.importers, imp.name, src)
+            self.failed_sources.pop(src, None)
+        elif isinstance(src, DepsSource):
+            for dep in self.declared_deps.pop(src, []):
+                self._decref(self.declarers, dep.name, src)
+
+    def _learn(self, srcs: Iterable[Source]) -> None:
+        """Parse the given sources, and add their contributions to our results.
+
+        Code is parsed like in a full analysis, e.g. in isolated workers.
+        """
+        code_sources: dict[PathOrSpecial, CodeSource] = {}
+        for src in srcs:
+            if isinstance(src, CodeSource):
+                code_sources[src.path] = src
+                self.imports[src] = []
+            elif isinstance(src, DepsSource):
+                self.declared_deps[src] = list(extract_deps.parse_source(src))
+                for dep in self.declared_deps[src]:
+                    self.declarers[dep.name][src] += 1
+        if not code_sources:
+            return
+        parser = Analysis(self.settings)
+        for imp in parser.parse_code(code_sources.values()):
+            src = code_sources[imp.source.path]
+            self.imports[src].append(imp)
+            self.importers[imp.name][src] += 1
+        for failed in parser.failed_sources:
+            self.failed_sources[code_sources[failed.path]] = failed
+
+    @staticmethod
+    def _decref(refs: defaultdict[str, Counter[S]], name: str, src: S) -> None:
+        refs[name][src] -= 1
+        if refs[name][src] <= 0:
+            del refs[name][src]
+            if not refs[name]:
+                del refs[name]
+
+    def update(self) -> set[Source]:
+        """Look for changes in the project, and update our results.
+
+        Return the sources that were added, removed or modified since the
+        previous update. Only these sources are (re-)parsed.
+        """
+        finder = Analysis(self.settings)
+        finder.sources_cache = self.sources_cache
+        sources = finder.sources
+        extract_imports.forget_module_locations()
+        declared_names = set(self.declarers)
+        dir_mtimes: dict[Path, int] = {}
+        changed = set()
+        todo = []
+        for src in self.sources - sources:
+            self._forget(src)
+            del self.stamps[src]
+            changed.add(src)
+        for src in sources:
+            stamp = self._stamp(src, dir_mtimes)
+            if src in self.stamps and self.stamps[src] == stamp:
+                continue
+            self._forget(src)
+            if stamp is not None:  # otherwise: removed since find_sources()
+                todo.append(src)
+            self.stamps[src] = stamp
+            changed.add(src)
+        self._learn(todo)
+        self.sources = sources
+
+        # Redo dependency resolution only if the declared names or the Python
+        # environments changed, otherwise the results would be the same.
+        if set(self.declarers) != declared_names or any(
+            isinstance(src, PyEnvSource) for src in changed
+        ):
+            self.resolvers = None
+        return changed
+
+    def _resolve(self, analysis: Analysis) -> None:
+        """Resolve declared dependencies, reusing results when possible."""
+        if self.resolvers is None:
+            # Let the Analysis object do the resolution from scratch
+            self.resolved_deps = analysis.resolved_deps
+            self.resolvers = analysis.resolvers
+            self.declared_import_names = {
+                name for p in self.resolved_deps.values() for name in p.import_names
+            }
+            self._candidates.clear()
+        else:
+            analysis.__dict__["resolvers"] = self.resolvers
+            analysis.__dict__["resolved_deps"] = self.resolved_deps
+
+    def _candidates_for(self, name: str) -> set[str]:
+        """Return the names of packages that may provide the given import."""
+        if name not in self._candidates:
+            assert self.resolvers is not None  # noqa: S101, sanity check
+            self._candidates[name] = {
+                p.package_name for p in suggest_packages(name, self.resolvers)
+            }
+        return self._candidates[name]
+
+    def undeclared_deps(self) -> list[UndeclaredDependency]:
+        """Calculate undeclared dependencies from the import reference counts.
+
+        Equivalent to check.calculate_undeclared(), but only looks at each
+        unique import name, and at the imports of a name that is undeclared.
+        """
+        ret = []
+        for name in sorted(self.importers):
+            if name in self.declared_import_names or is_ignored(
+                name, self.settings.ignore_undeclared
+            ):
+                continue
+            references = [
+                imp.source
+                for src in self.importers[name]
+                for imp in self.imports[src]
+                if imp.name == name
+            ]
+            ret.append(
+                UndeclaredDependency(name, references, self._candidates_for(name))
+            )
+        return ret
+
+    def unused_deps(self) -> list[UnusedDependency]:
+        """Calculate unused dependencies from the declaration reference counts.
+
+        Equivalent to check.calculate_unused(), but only looks at each unique
+        dependency name, and at the declarations of a name that is unused.
+        """
+        imported_names = self.importers.keys()
+        ret = []
+        for name in sorted(self.declarers):
+            if is_ignored(name, self.settings.ignore_unused) or self.resolved_deps[
+                name
+            ].is_used(imported_names):
+                continue
+            references = [
+                dep.source
+                for src in self.declarers[name]
+                for dep in self.declared_deps[src]
+                if dep.name == name
+            ]
+            ret.append(UnusedDependency(name, references))
+        return ret
+
+    def analysis(self) -> Analysis:
+        """Return an Analysis object that reflects our current results."""
+        ret = Analysis(self.settings)
+        # Populate the cached properties of Analysis directly, cf. create()
+        ret.__dict__["sources"] = self.sources
+        ret.failed_sources = list(self.failed_sources.values())
+        if self.is_enabled(
+            Action.LIST_IMPORTS, Action.REPORT_UNDECLARED, Action.REPORT_UNUSED
+        ):
+            ret.__dict__["imports"] = [
+                imp for imports in self.imports.values() for imp in imports
+            ]
+        if self.is_enabled(
+            Action.LIST_DEPS, Action.REPORT_UNDECLARED, Action.REPORT_UNUSED
+        ):
+            ret.__dict__["declared_deps"] = [
+                dep for deps in self.declared_deps.values() for dep in deps
+            ]
+        if self.is_enabled(Action.REPORT_UNDECLARED, Action.REPORT_UNUSED):
+            self._resolve(ret)
+        if self.is_enabled(Action.REPORT_UNDECLARED):
+            ret.__dict__["undeclared_deps"] = self.undeclared_deps()
+        if self.is_enabled(Action.REPORT_UNUSED):
+            ret.__dict__["unused_deps"] = self.unused_deps()
+        return ret
+
+    def watched_dirs(self) -> set[Path]:
+        """Return the directories in which changes may affect our results."""
+        ret = {path for path in self.settings.code if isinstance(path, Path)}
+        ret.update(self.settings.deps, self.settings.pyenvs)
+        for src in self.sources:
+            if isinstance(src, PyEnvSource):
+                ret.add(src.path)
+            elif isinstance(src, (CodeSource, DepsSource)) and isinstance(
+                src.path, Path
+            ):
+                ret.add(src.path.parent)
+        return {path for path in ret if path.is_dir()}
+
+
+class PollingWaiter:
+    """Wait for changes by simply sleeping for a fixed interval."""
+
+    interval = POLL_INTERVAL
+
+    def watch(self, dirs: Iterable[Path]) -> None:
+        """Nothing to set up when polling."""
+
+    def wait(self) -> None:
+        """Wait until it is time to look for changes again."""
+        time.sleep(self.interval)
+
+
+class InotifyWaiter:
+    """Wait for changes in the given directories with Linux' inotify API.
+
+    This is only used to find out _when_ to look for changes (as soon as
+    something happens in one of the watched directories). What has changed is
+    still determined by IncrementalAnalysis.update().
+    """
+
+    interval = RESCAN_INTERVAL
+    # Wait this long after an event for more events to arrive (e.g. when an
+    # editor saves a file via several operations)
+    settle_time = 0.05  # seconds
+
+    # From <sys/inotify.h>
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+    EVENTS = (
+        IN_MODIFY
+        | IN_ATTRIB
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+        | IN_DELETE_SELF
+        | IN_MOVE_SELF
+    )
+
+    def __init__(self) -> None:
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or libc_name is None:
+            raise OSError("inotify is not available on this platform")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1() failed")
+        self.watched: set[Path] = set()
+
+    def close(self) -> None:
+        """Release the inotify file descriptor."""
+        os.close(self.fd)
+
+    def watch(self, dirs: Iterable[Path]) -> None:
+        """Add watches for the given directories (if not already watched).
+
+        Watches are removed automatically when the directory is deleted.
+        """
+        for path in set(dirs) - self.watched:
+            wd = self.libc.inotify_add_watch(
+                self.fd, os.fsencode(path.absolute()), self.EVENTS
+            )
+            if wd < 0:
+                logger.info(
+                    "Cannot watch %s: %s", path, os.strerror(ctypes.get_errno())
+                )
+                continue
+            self.watched.add(path)
+
+    def _drain(self) -> bool:
+        """Consume all pending events. Return True iff there were any."""
+        ret = False
+        while True:
+            try:
+                if not os.read(self.fd, 64 * 1024):
+                    return ret
+            except BlockingIOError:
+                return ret
+            ret = True
+
+    def wait(self) -> None:
+        """Wait until there are changes, or until it's time to rescan anyway."""
+        readable, _, _ = select.select([self.fd], [], [], self.interval)
+        if readable:
+            self._drain()
+            while select.select([self.fd], [], [], self.settle_time)[0]:
+                self._drain()
+            # Forget deleted directories, so that we watch them if recreated
+            self.watched = {path for path in self.watched if path.is_dir()}
+
+
+def make_waiter() -> Union[InotifyWaiter, PollingWaiter]:
+    """Return the best available way to wait for changes."""
+    try:
+        return InotifyWaiter()
+    except (OSError, AttributeError) as exc:  # AttributeError: no inotify_*()
+        logger.info("Falling back to polling for changes: %s", exc)
+        return PollingWaiter()
+
+
+def print_analysis(analysis: Analysis, exit_code: int, stdout: TextIO) -> None:
+    """Print the output of an analysis, as soon as it is ready."""
+    if analysis.settings.output_format == OutputFormat.NDJSON:
+        # We did not pass on_record to Analysis: write all records now
+        for kind, member in NDJSON_RECORDS:
+            for record in analysis.__dict__.get(member, []):
+                write_ndjson_record(stdout, kind, record)
+    else:
+        print_output(analysis, exit_code, stdout)
+    stdout.flush()
+
+
+def watch(
+    settings: Settings,
+    stdout: TextIO = sys.stdout,
+    *,
+    max_rounds: Optional[int] = None,
+) -> int:
+    """Run the analysis, and re-run it incrementally whenever files change.
+
+    The output is printed anew after every change. Stop on KeyboardInterrupt
+    (or after 'max_rounds' updates, for testing), and return the exit code of
+    the latest analysis.
+
+    Errors in the first round (e.g. invalid paths) are propagated to the
+    caller. In later rounds, unresolved dependencies are logged, and we keep
+    watching, as the user is likely in the middle of editing their project.
+    """
+    state = IncrementalAnalysis(settings)
+    waiter = make_waiter()
+    exit_code = 0
+    rounds = 0
+    try:
+        while True:
+            changed = state.update()
+            if changed or rounds == 0:
+                if rounds > 0:
+                    logger.warning("Changes detected in %d source(s)", len(changed))
+                try:
+                    analysis = state.analysis()
+                    exit_code = assign_exit_code(analysis)
+                except UnresolvedDependenciesError as exc:
+                    if rounds == 0:
+                        raise
+                    logger.error("%s", exc.msg)
+                else:
+                    print_analysis(analysis, exit_code, stdout)
+                logger.warning("Watching for changes... (press Ctrl+C to stop)")
+            toml_cache.clear()  # parsed TOML is only shared within one round
+            rounds += 1
+            if max_rounds is not None and rounds >= max_rounds:
+                break
+            waiter.watch(state.watched_dirs())
+            waiter.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if isinstance(waiter, InotifyWaiter):
+            waiter.close()
+    return exit_code
@@ -108,6 +108,12 @@ def integration_tests(session):
     session.run("pytest", "-x", "-m", "integration", "--durations=10", *session.posargs)
 
 
+@nox.session
+def benchmarks(session):
+    install_groups(session, include=["test"])
+    session.run("pytest", "-m", "benchmark", "-s", *session.posargs)
+
+
 @nox.session(python=python_versions)
 def self_test(session):
     # Install all optional dependency groups for a self test
@@ -1,5 +1,6 @@
 """Fixtures for tests."""
 
+import multiprocessing
 import venv
 from collections.abc import Callable
 from pathlib import Path
@@ -9,12 +10,21 @@ from typing import Optional, Union
 
 import pytest
 
+from fawltydeps import extract_imports
 from fawltydeps.types import TomlData
 from fawltydeps.utils import site_packages
 
 from .project_helpers import TarballPackage
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmark-results",
+        metavar="FILE",
+        help="Write the results of benchmarks (-m benchmark) to FILE as JSON",
+    )
+
+
 @pytest.fixture
 def inside_tmp_path(monkeypatch, tmp_path):
     """Convenience fixture to run a test with CWD set to tmp_path.
@@ -59,6 +69,28 @@ def local_pypi(request, monkeypatch):
         Path(tmp_uv_config.name).unlink()
 
 
+@pytest.fixture
+def fail_parsing(monkeypatch):
+    """Make the parser raise an exception for files with the given name.
+
+    This only reaches isolated parsing workers that are forked.
+    """
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("monkeypatching only reaches workers that are forked")
+
+    def setup(name: str) -> None:
+        parse_source = extract_imports.parse_source
+
+        def parse_or_fail(src, *args, **kwargs):
+            if src.path.name == name:
+                raise RecursionError("maximum recursion depth exceeded")
+            return parse_source(src, *args, **kwargs)
+
+        monkeypatch.setattr(extract_imports, "parse_source", parse_or_fail)
+
+    return setup
+
+
 @pytest.fixture
 def write_tmp_files(tmp_path: Path):
     def _inner(file_contents: dict[str, Union[str, bytes]]) -> Path:
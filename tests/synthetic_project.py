@@ -0,0 +1,134 @@
+"""Generate synthetic projects of configurable size, e.g. for benchmarking.
+
+Unlike tests/sample_projects and tests/real_projects, these projects are not
+meant to test any particular behavior of FawltyDeps, but to be big enough (in
+the ways we care about) for performance measurements. The generated projects
+are deterministic: the same parameters always produce the same project.
+"""
+
+import json
+import random
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from fawltydeps.utils import site_packages
+
+# A few stdlib modules to mix in with the 3rd-party imports
+STDLIB_IMPORTS = ["os", "sys", "json", "logging", "pathlib", "re", "typing"]
+
+
+@dataclass(frozen=True)
+class SyntheticProject:
+    """Parameters for a synthetic project.
+
+    - files: Number of code files (.py files and notebooks).
+    - imports_per_file: Number of import statements in each code file.
+    - notebook_ratio: Fraction of the code files that are Jupyter notebooks.
+    - deps_files: Number of requirements files that declare dependencies.
+    - exclude_rules: Number of exclude patterns (see .exclude_patterns()).
+    - installed_packages: Number of packages installed in the project's venv.
+      The code imports from these packages, and the deps files declare them.
+    - files_per_dir: Number of code files in each (nested) directory.
+    - seed: Seed for the random choices made while generating the project.
+    """
+
+    files: int = 100
+    imports_per_file: int = 10
+    notebook_ratio: float = 0.1
+    deps_files: int = 1
+    exclude_rules: int = 0
+    installed_packages: int = 50
+    files_per_dir: int = 20
+    seed: int = 0
+
+    def params(self) -> dict[str, object]:
+        """Return the parameters of this project, e.g. for reporting results."""
+        return asdict(self)
+
+    def describe(self) -> str:
+        """Describe this project by the parameters that differ from the defaults."""
+        defaults = SyntheticProject().params()
+        changed = {k: v for k, v in self.params().items() if v != defaults[k]}
+        return ", ".join(f"{k}={v}" for k, v in changed.items()) or "defaults"
+
+    def package_names(self) -> list[str]:
+        """Return the names of the packages installed in this project's venv."""
+        return [f"synth_pkg{i}" for i in range(self.installed_packages)]
+
+    def exclude_patterns(self) -> list[str]:
+        """Return exclude patterns to use when analyzing this project.
+
+        The patterns are a mix of the kinds of patterns seen in real projects.
+        Only the last one actually matches anything in the generated project.
+        """
+        kinds = ["/build{}/", "*.generated{}.py", "docs/**/conf{}.py", "!keep{}.py"]
+        patterns = [kinds[i % len(kinds)].format(i) for i in range(self.exclude_rules)]
+        return [*patterns, "/excluded/"] if patterns else []
+
+    def _code_path(self, index: int, *, notebook: bool) -> str:
+        # Spread files across a tree of nested directories
+        dir_index = index // self.files_per_dir
+        dir_parts = [f"dir{dir_index % 10}", f"sub{dir_index}"]
+        suffix = "ipynb" if notebook else "py"
+        return "/".join(["src", *dir_parts, f"module{index}.{suffix}"])
+
+    def _imports(self, rng: random.Random) -> list[str]:
+        names = [*self.package_names(), *STDLIB_IMPORTS, "not_installed"]
+        return [f"import {rng.choice(names)}\n" for _ in range(self.imports_per_file)]
+
+    @staticmethod
+    def _notebook(lines: list[str]) -> str:
+        cells: list[dict[str, object]] = [
+            {
+                "cell_type": "code",
+                "execution_count": None,
+                "metadata": {},
+                "outputs": [],
+                "source": lines[i : i + 5],
+            }
+            for i in range(0, len(lines), 5)
+        ]
+        notebook = {
+            "cells": cells,
+            "metadata": {"language_info": {"name": "python"}},
+            "nbformat": 4,
+            "nbformat_minor": 5,
+        }
+        return json.dumps(notebook, indent=1)
+
+    def _write_venv(self, venv_dir: Path) -> None:
+        # Just enough for FawltyDeps to recognize a Python environment with
+        # these packages installed, without the cost of venv.create().
+        (venv_dir / "bin").mkdir(parents=True)
+        (venv_dir / "bin" / "python").touch()
+        site_dir = site_packages(venv_dir)
+        site_dir.mkdir(parents=True)
+        for name in self.package_names():
+            dist_info_dir = site_dir / f"{name}-1.0.dist-info"
+            dist_info_dir.mkdir()
+            (dist_info_dir / "METADATA").write_text(f"Name: {name}\nVersion: 1.0\n")
+            (dist_info_dir / "top_level.txt").write_text(f"{name}\n")
+            (site_dir / f"{name}.py").touch()
+
+    def write(self, root: Path) -> Path:
+        """Write this project into the given (empty) directory, and return it."""
+        rng = random.Random(self.seed)  # noqa: S311, not used for security
+        notebooks = round(self.files * self.notebook_ratio)
+        for i in range(self.files):
+            notebook = i < notebooks
+            path = root / self._code_path(i, notebook=notebook)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            lines = self._imports(rng)
+            path.write_text(self._notebook(lines) if notebook else "".join(lines))
+
+        # Code that is only found when exclude patterns are not applied
+        (root / "excluded").mkdir()
+        (root / "excluded" / "ignored.py").write_text("import excluded_only\n")
+
+        names = self.package_names()
+        for i in range(self.deps_files):
+            reqs = "".join(f"{name}\n" for name in names[i :: self.deps_files])
+            (root / f"requirements{i}.txt").write_text(reqs)
+
+        self._write_venv(root / "venv")
+        return root
@@ -0,0 +1,171 @@
+"""Verify that --baseline/--changed reuse the results of a previous run."""
+
+import pytest
+
+from fawltydeps.baseline import create_analysis, load_baseline
+from fawltydeps.extract_imports import forget_module_locations
+from fawltydeps.main import Analysis
+from fawltydeps.settings import Action, Settings
+
+from .utils import run_fawltydeps_function, run_fawltydeps_subprocess
+
+
+def results(analysis):
+    """Normalize undeclared/unused deps for comparison across analyses."""
+    return (
+        sorted(
+            (dep.name, sorted(set(dep.references)), dep.candidates)
+            for dep in analysis.undeclared_deps
+        ),
+        sorted((dep.name, sorted(set(dep.references))) for dep in analysis.unused_deps),
+    )
+
+
+@pytest.fixture
+def project(fake_project):
+    return fake_project(
+        files_with_imports={
+            "a.py": ["numpy", "requests"],
+            "b.py": ["requests", "pandas"],
+            "sub/c.py": ["mylib"],
+        },
+        declared_deps=["requests", "click"],
+        fake_venvs={".venv": {"requests": {"requests"}, "click": {"click"}}},
+    )
+
+
+@pytest.fixture
+def settings(project):
+    return Settings(
+        actions={Action.REPORT_UNDECLARED, Action.REPORT_UNUSED},
+        code={project},
+        deps={project},
+        pyenvs={project / ".venv"},
+    )
+
+
+@pytest.fixture
+def baseline(settings, tmp_path):
+    baseline_file = tmp_path / "baseline.json"
+    with baseline_file.open("w") as f:
+        Analysis.create(settings).print_json(f)
+    return load_baseline(baseline_file)
+
+
+def parsed_names(analysis):
+    return {src.path.name for src in analysis.parsed}
+
+
+def test_create_analysis__nothing_changed__parses_nothing(settings, baseline):
+    analysis = create_analysis(settings, baseline, set())
+
+    assert analysis.parsed == set()
+    assert results(analysis) == results(Analysis.create(settings))
+
+
+def test_create_analysis__modified_code__parses_only_that_file(
+    project, settings, baseline
+):
+    (project / "a.py").write_text("import numpy\nimport click\n")
+    analysis = create_analysis(settings, baseline, {project / "a.py"})
+
+    assert parsed_names(analysis) == {"a.py"}
+    assert results(analysis) == results(Analysis.create(settings))
+
+
+def test_create_analysis__modified_deps__parses_only_that_file(
+    project, settings, baseline
+):
+    (project / "requirements.txt").write_text("requests\npandas\n")
+    analysis = create_analysis(settings, baseline, {project / "requirements.txt"})
+
+    assert parsed_names(analysis) == {"requirements.txt"}
+    assert results(analysis) == results(Analysis.create(settings))
+
+
+def test_create_analysis__removed_file__drops_its_imports(project, settings, baseline):
+    (project / "b.py").unlink()
+    analysis = create_analysis(settings, baseline, {project / "b.py"})
+
+    assert "pandas" not in {imp.name for imp in analysis.imports}
+    assert results(analysis) == results(Analysis.create(settings))
+
+
+def test_create_analysis__new_first_party_module__reparses_its_importers(
+    project, settings, baseline
+):
+    (project / "sub" / "mylib").mkdir()
+    (project / "sub" / "mylib" / "__init__.py").write_text("import click\n")
+    forget_module_locations()  # as if running in a new process
+    analysis = create_analysis(
+        settings, baseline, {project / "sub" / "mylib" / "__init__.py"}
+    )
+
+    # Only code next to sub/mylib/ can import it as a first-party module
+    assert parsed_names(analysis) == {"c.py", "__init__.py"}
+    assert "mylib" not in {imp.name for imp in analysis.imports}
+    assert results(analysis) == results(Analysis.create(settings))
+
+
+def test_create_analysis__parse_timeout__parses_changed_code_in_isolation(
+    project, settings, baseline, fail_parsing
+):
+    fail_parsing("a.py")
+    settings = settings.copy(update={"parse_timeout": 60})
+    analysis = create_analysis(settings, baseline, {project / "a.py"})
+
+    assert parsed_names(analysis) == {"a.py"}
+    assert [src.path for src in analysis.failed_sources] == [project / "a.py"]
+    assert "numpy" not in {imp.name for imp in analysis.imports}
+
+
+def test_load_baseline__failed_source__is_not_reused(
+    settings, tmp_path, monkeypatch, fail_parsing
+):
+    fail_parsing("a.py")
+    baseline_file = tmp_path / "baseline.json"
+    with baseline_file.open("w") as f:
+        Analysis.create(settings.copy(update={"parse_timeout": 60})).print_json(f)
+    monkeypatch.undo()
+    analysis = create_analysis(settings, load_baseline(baseline_file), set())
+
+    assert parsed_names(analysis) == {"a.py"}
+    assert results(analysis) == results(Analysis.create(settings))
+
+
+def test_main__changed_from_stdin__same_output_as_full_run(project, tmp_path):
+    args = [str(project), "--pyenv", str(project / ".venv")]
+    baseline_output, _ = run_fawltydeps_function(*args, "--json")
+    args.append("--detailed")
+    baseline_file = tmp_path / "baseline.json"
+    baseline_file.write_text(baseline_output)
+    (project / "b.py").write_text("import click\n")
+
+    expect_output, expect_exit_code = run_fawltydeps_function(*args)
+    output, exit_code = run_fawltydeps_function(
+        *args,
+        f"--baseline={baseline_file}",
+        "--changed",
+        "-",
+        to_stdin=f"{project / 'b.py'}\n",
+    )
+    assert output == expect_output
+    assert exit_code == expect_exit_code
+
+
+def test_main__changed_without_baseline__fails_with_exit_code_2(project):
+    _output, errors, returncode = run_fawltydeps_subprocess(
+        str(project), "--changed", "a.py"
+    )
+    assert "--changed requires --baseline" in errors
+    assert returncode == 2  # noqa: PLR2004
+
+
+def test_main__invalid_baseline__fails_with_exit_code_2(project, tmp_path):
+    baseline_file = tmp_path / "baseline.json"
+    baseline_file.write_text('{"sources": [{"path": "a.py"}]}')
+    _output, errors, returncode = run_fawltydeps_subprocess(
+        str(project), f"--baseline={baseline_file}"
+    )
+    assert "Not a valid baseline (from fawltydeps --json)" in errors
+    assert returncode == 2  # noqa: PLR2004
@@ -0,0 +1,188 @@
+"""Verify that --batch analyzes each project in a monorepo separately."""
+
+import io
+import json
+
+import pytest
+
+from fawltydeps import packages
+from fawltydeps.batch import Monorepo, ProjectAnalysis, SharedResolvers, run_batch
+from fawltydeps.settings import OutputFormat, Settings
+
+from .utils import run_fawltydeps_function
+
+MONOREPO_FILES = {
+    "proj_a/pyproject.toml": '[project]\nname = "a"\ndependencies = ["requests"]\n',
+    "proj_a/a.py": "import requests\nimport numpy\n",
+    "proj_b/setup.cfg": "[options]\ninstall_requires =\n    click\n",
+    "proj_b/b.py": "import click\n",
+    "proj_b/nested/pyproject.toml": (
+        '[project]\nname = "nested"\ndependencies = ["pandas"]\n'
+    ),
+    "proj_b/nested/n.py": "import pandas\n",
+    "scripts/not_a_project.py": "import yaml\n",
+}
+
+
+@pytest.fixture
+def monorepo(write_tmp_files, fake_venv):
+    root = write_tmp_files(MONOREPO_FILES)
+    fake_venv(
+        {"requests": {"requests"}, "click": {"click"}, "pandas": {"pandas"}},
+        venv_dir=root / "venv",
+    )
+    # A project-specific venv, with a project file that must not be found
+    _venv_dir, site_packages = fake_venv(
+        {"numpy": {"numpy"}}, venv_dir=root / "proj_a" / "venv"
+    )
+    (site_packages / "setup.py").touch()
+    return root
+
+
+def test_find__finds_projects_and_pyenvs(monorepo):
+    found = Monorepo.find(Settings(code={monorepo}, deps={monorepo}, pyenvs=set()))
+
+    assert found.projects == [
+        monorepo / "proj_a",
+        monorepo / "proj_b",
+        monorepo / "proj_b" / "nested",
+    ]
+    assert {src.path.relative_to(monorepo).parts[0] for src in found.pyenvs} == {
+        "venv",
+        "proj_a",
+    }
+
+
+def test_project_settings__excludes_nested_and_picks_pyenvs(monorepo):
+    settings = Settings(code={monorepo}, deps={monorepo}, pyenvs={monorepo})
+    found = Monorepo.find(settings)
+
+    settings_b = found.project_settings(settings, monorepo / "proj_b")
+    assert settings_b.code == settings_b.deps == {monorepo / "proj_b"}
+    assert "/nested/" in settings_b.exclude
+    assert {path.relative_to(monorepo).parts[0] for path in settings_b.pyenvs} == {
+        "venv"
+    }
+    settings_a = found.project_settings(settings, monorepo / "proj_a")
+    assert {path.relative_to(monorepo).parts[0] for path in settings_a.pyenvs} == {
+        "venv",
+        "proj_a",
+    }
+
+
+def test_project_analysis__same_pyenvs__shares_resolvers(monorepo):
+    settings = Settings(code={monorepo}, deps={monorepo}, pyenvs={monorepo})
+    found = Monorepo.find(settings)
+    shared = SharedResolvers()
+    analyses = [
+        ProjectAnalysis(found.project_settings(settings, project), shared)
+        for project in [
+            monorepo / "proj_b",
+            monorepo / "proj_b" / "nested",
+            monorepo / "proj_a",
+        ]
+    ]
+    for analysis in analyses:
+        analysis.compute()
+    analysis_b, analysis_nested, analysis_a = analyses
+
+    assert analysis_b.resolvers is analysis_nested.resolvers
+    assert analysis_a.resolvers is not analysis_b.resolvers
+    # Python environments seen by both are read once, into our own cache
+    assert shared.envs_cache.hits > 0
+    assert packages.installed_envs_cache is None
+    # Nothing is shared with another batch run
+    other = ProjectAnalysis(
+        found.project_settings(settings, monorepo / "proj_b"), SharedResolvers()
+    )
+    assert other.resolvers is not analysis_b.resolvers
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_run_batch__json__reports_each_project(monorepo, jobs):
+    settings = Settings(
+        code={monorepo},
+        deps={monorepo},
+        pyenvs={monorepo},
+        output_format=OutputFormat.JSON,
+    )
+    out = io.StringIO()
+    exit_code = run_batch(settings, out, jobs)
+    report = json.loads(out.getvalue())
+
+    undeclared = {
+        proj["project"]: [dep["name"] for dep in proj["analysis"]["undeclared_deps"]]
+        for proj in report["projects"]
+    }
+    assert undeclared == {
+        str(monorepo / "proj_a"): ["numpy"],
+        str(monorepo / "proj_b"): [],
+        str(monorepo / "proj_b" / "nested"): [],
+    }
+    assert [proj["exit_code"] for proj in report["projects"]] == [3, 0, 0]
+    assert exit_code == report["exit_code"] == 3  # noqa: PLR2004
+
+
+def test_run_batch__ndjson__identifies_project_in_each_record(monorepo):
+    settings = Settings(
+        code={monorepo},
+        deps={monorepo},
+        pyenvs={monorepo},
+        output_format=OutputFormat.NDJSON,
+    )
+    out = io.StringIO()
+    exit_code = run_batch(settings, out, 1)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+
+    assert all(list(record)[:2] == ["project", "record"] for record in records)
+    undeclared = [
+        (record["project"], record["name"])
+        for record in records
+        if record["record"] == "undeclared_dep"
+    ]
+    assert undeclared == [(str(monorepo / "proj_a"), "numpy")]
+    assert exit_code == 3  # noqa: PLR2004
+
+
+def test_run_batch__project_with_own_config__uses_it(monorepo):
+    with (monorepo / "proj_a" / "pyproject.toml").open("a") as f:
+        f.write('[tool.fawltydeps]\nignore_undeclared = ["numpy"]\n')
+    settings = Settings(
+        code={monorepo},
+        deps={monorepo},
+        pyenvs={monorepo},
+        output_format=OutputFormat.JSON,
+    )
+    out = io.StringIO()
+    exit_code = run_batch(settings, out, 1)
+    report = json.loads(out.getvalue())
+
+    assert [proj["exit_code"] for proj in report["projects"]] == [0, 0, 0]
+    assert exit_code == 0
+
+
+def test_main__batch__command_line_overrides_project_config(monorepo):
+    with (monorepo / "proj_a" / "pyproject.toml").open("a") as f:
+        f.write('[tool.fawltydeps]\nignore_undeclared = ["numpy"]\n')
+    output, exit_code = run_fawltydeps_function(
+        str(monorepo), "--batch", "--jobs=1", "--json", "--ignore-undeclared=yaml"
+    )
+    report = json.loads(output)
+
+    [proj_a] = [p for p in report["projects"] if p["project"].endswith("proj_a")]
+    assert [dep["name"] for dep in proj_a["analysis"]["undeclared_deps"]] == ["numpy"]
+    assert exit_code == 3  # noqa: PLR2004
+
+
+def test_main__batch__prints_each_project_like_a_separate_run(monorepo):
+    output, exit_code = run_fawltydeps_function(
+        str(monorepo / "proj_b"), "--batch", "--jobs=1", "--detailed"
+    )
+    expect_output, expect_exit_code = run_fawltydeps_function(
+        str(monorepo / "proj_b" / "nested"), "--detailed"
+    )
+
+    assert output.startswith(f"==> {monorepo / 'proj_b'} <==\n")
+    _, nested_output = output.split(f"==> {monorepo / 'proj_b' / 'nested'} <==\n")
+    assert nested_output.strip() == expect_output
+    assert exit_code == expect_exit_code
@@ -0,0 +1,311 @@
+"""Performance benchmarks for FawltyDeps.
+
+These are disabled by default. Run them with:
+
+    pytest -m benchmark -s
+
+(or 'nox -s benchmarks'). The results are printed to stdout. To also write
+them to a JSON file (e.g. for tracking trends across commits), add:
+
+    --benchmark-results=FILE
+
+Many of these benchmarks run against synthetic projects (see
+tests/synthetic_project.py) whose size is given by the test parameters. All
+benchmarks run offline.
+"""
+
+import json
+import logging
+import os
+import platform
+import time
+import timeit
+from collections.abc import Callable
+from operator import attrgetter
+from pathlib import Path
+
+import pytest
+
+from fawltydeps.dir_traversal import DirectoryTraversal
+from fawltydeps.extract_imports import parse_code
+from fawltydeps.gitignore_parser import Rule, match_rules, match_rules_in_dir
+from fawltydeps.main import Analysis
+from fawltydeps.packages import (
+    LocalPackageResolver,
+    pyenv_sources,
+    resolve_dependencies,
+    setup_resolvers,
+)
+from fawltydeps.settings import Action, Settings
+from fawltydeps.types import Location, ParsedImport
+from fawltydeps.utils import version
+
+from .synthetic_project import SyntheticProject
+
+pytestmark = pytest.mark.benchmark
+
+# All results reported by the benchmarks in this session
+RESULTS: list[dict[str, object]] = []
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _write_results(request):
+    yield
+    path = request.config.getoption("benchmark_results")
+    if path is not None:
+        results = {
+            "fawltydeps_version": str(version()),
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "results": RESULTS,
+        }
+        Path(path).write_text(json.dumps(results, indent=2) + "\n")
+
+
+@pytest.fixture(scope="module")
+def synthetic_project(tmp_path_factory):
+    """Write SyntheticProject instances, reusing identical projects."""
+    written: dict[SyntheticProject, Path] = {}
+
+    def _inner(project: SyntheticProject) -> Path:
+        if project not in written:
+            written[project] = project.write(tmp_path_factory.mktemp("synthetic"))
+        return written[project]
+
+    return _inner
+
+
+def best_time_per_call(func: Callable[[], object], number: int, repeat: int = 5):
+    """Return the best observed time (in seconds) for one call to func()."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def report(name: str, seconds: float, **params: object) -> None:
+    """Print one benchmark result, and record it for --benchmark-results."""
+    print(f"{name:<60} {seconds * 1e6:10.1f} µs")
+    RESULTS.append({"name": name, "seconds": seconds, "params": params})
+
+
+def test_parse_code__logging_overhead_per_file_at_default_verbosity(caplog):
+    # A file with many import statements, like __init__.py files in large
+    # packages, or generated code.
+    code = "".join(
+        f"import mod{i}\nfrom pkg{i}.sub import name{i}\n" for i in range(200)
+    )
+    source = Location("<stdin>")
+
+    def parse() -> object:
+        return list(parse_code(code, source=source))
+
+    caplog.set_level(logging.WARNING)  # the default verbosity
+    with_logging = best_time_per_call(parse, number=20)
+
+    logging.disable(logging.CRITICAL)
+    try:
+        without_logging = best_time_per_call(parse, number=20)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    report("parse_code(), 400 imports, verbosity 0", with_logging)
+    report("parse_code(), 400 imports, logging disabled", without_logging)
+    report("  => logging overhead per file", with_logging - without_logging)
+
+
+def test_location__cost_of_creating_one_parsed_import():
+    source = Location(Path("some/dir/module.py"))
+
+    def create() -> object:
+        return ParsedImport("numpy", source.supply(lineno=17))
+
+    report("ParsedImport + Location.supply()", best_time_per_call(create, 10_000))
+
+
+def test_location__sorting_many_parsed_imports():
+    paths = [Path(f"pkg{i // 10}/module{i}.py") for i in range(1000)]
+    imports = [
+        ParsedImport(f"mod{n}", Location(path, lineno=n))
+        for path in reversed(paths)
+        for n in range(100, 0, -1)
+    ]
+
+    def sort() -> object:
+        return sorted(imports, key=attrgetter("source", "name"))
+
+    report("sorted() 100000 ParsedImports by location", best_time_per_call(sort, 1))
+
+
+@pytest.mark.parametrize("rules", [10, 100, 1000])
+def test_match_rules__many_paths_against_many_rules(rules):
+    base_dir = Path("/project")
+    patterns = SyntheticProject(exclude_rules=rules).exclude_patterns()
+    parsed = [Rule.from_pattern(pattern, base_dir) for pattern in patterns]
+    paths = [base_dir / f"src/dir{i % 10}/sub{i}/module{i}.py" for i in range(1000)]
+
+    def match() -> object:
+        return [match_rules(parsed, path, is_dir=False) for path in paths]
+
+    report(
+        f"match_rules(), 1000 paths, {rules} rules",
+        best_time_per_call(match, 1),
+        rules=rules,
+    )
+
+
+@pytest.mark.parametrize("rules", [10, 100, 1000])
+def test_match_rules_in_dir__many_names_against_many_rules(rules):
+    base_dir = Path("/project")
+    patterns = SyntheticProject(exclude_rules=rules).exclude_patterns()
+    parsed = [Rule.from_pattern(pattern, base_dir) for pattern in patterns]
+    dir_path = base_dir / "src/dir0/sub0"
+    names = {f"module{i}.py" for i in range(1000)}
+
+    def match() -> object:
+        return match_rules_in_dir(parsed, dir_path, names, is_dir=False)
+
+    report(
+        f"match_rules_in_dir(), 1000 names, {rules} rules",
+        best_time_per_call(match, 1),
+        rules=rules,
+    )
+
+
+@pytest.mark.parametrize("files", [100, 1000])
+@pytest.mark.parametrize("exclude_rules", [0, 100])
+def test_directory_traversal__synthetic_project(
+    synthetic_project, files, exclude_rules
+):
+    project = SyntheticProject(files=files, exclude_rules=exclude_rules)
+    root = synthetic_project(project)
+
+    def traverse() -> object:
+        traversal: DirectoryTraversal[None] = DirectoryTraversal()
+        traversal.add(root)
+        for pattern in project.exclude_patterns():
+            traversal.exclude(pattern, root)
+        return list(traversal.traverse())
+
+    report(
+        f"DirectoryTraversal.traverse(), {files} files, {exclude_rules} rules",
+        best_time_per_call(traverse, 1),
+        **project.params(),
+    )
+
+
+@pytest.mark.parametrize("threads", [0, 8])
+@pytest.mark.parametrize("delay_ms", [0, 1])
+def test_directory_traversal__threads__several_roots(
+    synthetic_project, monkeypatch, threads, delay_ms
+):
+    # Three separate projects, each with many small directories
+    roots = [
+        synthetic_project(SyntheticProject(files=500, files_per_dir=5, seed=seed))
+        for seed in range(3)
+    ]
+    # Emulate a slow (e.g. network) filesystem, where listing a dir takes time
+    scandir = os.scandir
+    monkeypatch.setattr(
+        os, "scandir", lambda path: time.sleep(delay_ms / 1000) or scandir(path)
+    )
+
+    def traverse() -> object:
+        traversal: DirectoryTraversal[None] = DirectoryTraversal(threads=threads)
+        for root in roots:
+            traversal.add(root)
+        return list(traversal.traverse())
+
+    report(
+        f"DirectoryTraversal.traverse(), 3 roots, {threads} threads, {delay_ms}ms",
+        best_time_per_call(traverse, 1),
+        threads=threads,
+        delay_ms=delay_ms,
+    )
+
+
+@pytest.mark.parametrize("depth", [10, 100, 300])
+def test_directory_traversal__deep_tree(tmp_path, depth):
+    # A chain of nested directories, each with a couple of siblings
+    cur = tmp_path
+    for _ in range(depth):
+        for name in ["x", "y"]:
+            (cur / name).mkdir()
+        cur = cur / "d"
+        cur.mkdir()
+
+    def traverse() -> object:
+        traversal: DirectoryTraversal[str] = DirectoryTraversal()
+        traversal.add(tmp_path, "data")
+        return list(traversal.traverse())
+
+    report(
+        f"DirectoryTraversal.traverse(), depth {depth}",
+        best_time_per_call(traverse, 1),
+        depth=depth,
+    )
+
+
+@pytest.mark.parametrize("installed_packages", [10, 100, 1000])
+def test_local_package_resolver__packages(synthetic_project, installed_packages):
+    project = SyntheticProject(files=0, installed_packages=installed_packages)
+    pyenvs = pyenv_sources(synthetic_project(project) / "venv")
+
+    def enumerate_packages() -> object:
+        return LocalPackageResolver(pyenvs).packages
+
+    report(
+        f"LocalPackageResolver.packages, {installed_packages} packages",
+        best_time_per_call(enumerate_packages, 1),
+        **project.params(),
+    )
+
+
+@pytest.mark.parametrize("installed_packages", [10, 100, 1000])
+def test_resolve_dependencies__cold_and_warm(synthetic_project, installed_packages):
+    project = SyntheticProject(files=0, installed_packages=installed_packages)
+    pyenvs = pyenv_sources(synthetic_project(project) / "venv")
+    deps = [*project.package_names(), "not_installed"]
+
+    def cold() -> object:
+        return resolve_dependencies(deps, list(setup_resolvers(pyenv_srcs=pyenvs)))
+
+    resolvers = list(setup_resolvers(pyenv_srcs=pyenvs))
+
+    def warm() -> object:
+        return resolve_dependencies(deps, resolvers)
+
+    name = f"resolve_dependencies(), {installed_packages} packages"
+    report(f"{name}, new resolvers", best_time_per_call(cold, 1), **project.params())
+    report(
+        f"{name}, reused resolvers", best_time_per_call(warm, 10), **project.params()
+    )
+
+
+@pytest.mark.parametrize(
+    "project",
+    [
+        SyntheticProject(files=100),
+        SyntheticProject(files=1000),
+        SyntheticProject(files=1000, imports_per_file=50),
+        SyntheticProject(files=1000, notebook_ratio=0.5),
+        SyntheticProject(files=1000, deps_files=20, exclude_rules=100),
+        SyntheticProject(files=1000, installed_packages=1000),
+    ],
+    ids=SyntheticProject.describe,
+)
+def test_analysis__synthetic_project(synthetic_project, project):
+    root = synthetic_project(project)
+    settings = Settings(
+        actions={Action.REPORT_UNDECLARED, Action.REPORT_UNUSED},
+        code={root},
+        deps={root},
+        pyenvs={root},
+        exclude={".*", *project.exclude_patterns()},
+    )
+
+    def analyze() -> object:
+        return Analysis.create(settings)
+
+    report(
+        f"Analysis.create(), {project.describe()}",
+        best_time_per_call(analyze, 1, repeat=3),
+        **project.params(),
+    )
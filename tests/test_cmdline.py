@@ -9,6 +9,7 @@ import json
 import logging
 from dataclasses import dataclass, field
 from itertools import dropwhile
+from operator import itemgetter
 from pathlib import Path
 from textwrap import dedent
 
@@ -16,13 +17,15 @@ import pytest
 from importlib_metadata import files as package_files
 
 from fawltydeps.main import (
+    FAILED_SOURCES_OUTPUT_PREFIX,
+    SKIPPED_SOURCES_OUTPUT_PREFIX,
     UNDECLARED_DEPS_OUTPUT_PREFIX,
     UNUSED_DEPS_OUTPUT_PREFIX,
     VERBOSE_PROMPT,
     Analysis,
     version,
 )
-from fawltydeps.settings import DEFAULT_IGNORE_UNUSED
+from fawltydeps.settings import DEFAULT_IGNORE_UNUSED, OutputFormat, Settings
 from fawltydeps.types import Location, UnusedDependency
 from fawltydeps.utils import site_packages
 
@@ -60,9 +63,18 @@ def make_json_settings_dict(**customizations):
         "install_deps": False,
         "exclude": [".*"],
         "exclude_from": [],
+        "use_gitignore": False,
         "verbosity": 0,
         "custom_mapping_file": [],
         "base_dir": None,
+        "source_discovery": "walk",
+        "extra_code_formats": [],
+        "traversal_threads": 0,
+        "max_file_size": None,
+        "max_files_per_dir": None,
+        "max_files": None,
+        "parse_timeout": None,
+        "parse_memory_limit": None,
     }
     assert all(k in defaults for k in customizations)
     return defaults | customizations
@@ -189,6 +201,25 @@ def test_list_imports_json__from_py_file__prints_imports_from_file(write_tmp_fil
     assert returncode == EXIT_SUCCESS
 
 
+def test_list_imports_json_compact__from_py_file__prints_compact_json(
+    write_tmp_files,
+):
+    tmp_path = write_tmp_files({"myfile.py": "import my_requests\n"})
+    output, returncode = run_fawltydeps_function(
+        "--list-imports", "--json-compact", f"--code={tmp_path / 'myfile.py'}"
+    )
+    parsed = json.loads(output)
+    assert parsed["settings"]["output_format"] == "json_compact"
+    assert parsed["imports"] == [
+        {
+            "name": "my_requests",
+            "source": {"path": f"{tmp_path / 'myfile.py'}", "lineno": 1},
+        },
+    ]
+    assert output == json.dumps(parsed, separators=(",", ":"))
+    assert returncode == EXIT_SUCCESS
+
+
 def test_list_imports__from_ipynb_file__prints_imports_from_file(write_tmp_files):
     tmp_path = write_tmp_files(
         {
@@ -268,7 +299,8 @@ def test_list_imports__from_unsupported_file__fails_with_exit_code_2(tmp_path):
         "--list-imports", f"--code={filepath}"
     )
     assert (
-        f"Supported formats are .py and .ipynb; Cannot parse code: {filepath}" in errors
+        "Supported formats are .ipynb, .md, .py, .pyi, .qmd, .Rmd, .rmd; "
+        f"Cannot parse code: {filepath}" in errors
     )
     assert returncode == EXIT_CLI_PARSE_ERROR
 
@@ -603,6 +635,82 @@ def test_list_sources_detailed__from_both_python_file_and_stdin(fake_project):
     assert returncode == EXIT_SUCCESS
 
 
+def test_list_imports__with_max_file_size__reports_skipped_files(fake_project):
+    tmp_path = fake_project(
+        files_with_imports={"small.py": ["foo"], "big.py": ["bar"] * 100},
+    )
+    big_size = (tmp_path / "big.py").stat().st_size
+    output, returncode = run_fawltydeps_function(
+        "--list-imports", f"{tmp_path}", "--max-file-size", "100"
+    )
+    expect = [
+        "foo",
+        "",
+        f"{SKIPPED_SOURCES_OUTPUT_PREFIX}:",
+        f"- {tmp_path / 'big.py'} ({big_size} bytes, more than max_file_size = 100)",
+        "",
+        VERBOSE_PROMPT,
+    ]
+    assert output.splitlines() == expect
+    assert returncode == EXIT_SUCCESS
+
+
+def test_list_imports__with_parse_timeout__reports_failed_files(fake_project):
+    tmp_path = fake_project(files_with_imports={"slow.py": ["foo"] * 10_000})
+    output, returncode = run_fawltydeps_function(
+        "--list-imports", f"{tmp_path}", "--parse-timeout", "0.000001"
+    )
+    expect = [
+        f"{FAILED_SOURCES_OUTPUT_PREFIX}:",
+        f"- {tmp_path / 'slow.py'} (Parsing took more than 1e-06 seconds)",
+        "",
+        VERBOSE_PROMPT,
+    ]
+    assert output.splitlines() == expect
+    assert returncode == EXIT_SUCCESS
+
+
+def test_list_imports_json__with_parse_timeout__includes_failed_sources(
+    fake_project,
+):
+    tmp_path = fake_project(files_with_imports={"slow.py": ["foo"] * 10_000})
+    output, returncode = run_fawltydeps_function(
+        "--list-imports", f"{tmp_path}", "--json", "--parse-timeout", "0.000001"
+    )
+    assert json.loads(output)["failed_sources"] == [
+        {
+            "source_type": "FailedSource",
+            "path": f"{tmp_path / 'slow.py'}",
+            "reason": "Parsing took more than 1e-06 seconds",
+        }
+    ]
+    assert returncode == EXIT_SUCCESS
+
+
+def test_list_sources_detailed__with_max_files_per_dir__lists_skipped_dir(
+    fake_project,
+):
+    tmp_path = fake_project(
+        files_with_imports={
+            "code.py": ["foo"],
+            str(Path("gen", "a.py")): ["foo"],
+            str(Path("gen", "b.py")): ["foo"],
+        },
+    )
+    output, returncode = run_fawltydeps_function(
+        "--list-sources", f"{tmp_path}", "--detailed", "--max-files-per-dir", "1"
+    )
+    expect = [
+        "Sources of Python code:",
+        f"  {tmp_path / 'code.py'} (using {tmp_path} as base for 1st-party imports)",
+        "",
+        "Skipped sources:",
+        f"  {tmp_path / 'gen'} (2 files to parse, more than max_files_per_dir = 1)",
+    ]
+    assert output.splitlines() == expect
+    assert returncode == EXIT_SUCCESS
+
+
 def test_list_sources__with_exclude_from(fake_project):
     tmp_path = fake_project(
         files_with_imports={
@@ -860,6 +968,73 @@ def test_check_json__simple_project__can_report_both_undeclared_and_unused(
     assert returncode == EXIT_UNDECLARED  # --json does not affect exit code
 
 
+def test_check_ndjson__simple_project__prints_one_record_per_line(fake_project):
+    tmp_path = fake_project(
+        imports=["my_requests"],
+        declared_deps=["my_pandas"],
+        fake_venvs={"my_venv": {}},
+    )
+
+    expect_sources = [
+        {
+            "record": "source",
+            "source_type": "CodeSource",
+            "path": f"{tmp_path / 'code.py'}",
+            "base_dir": f"{tmp_path}",
+        },
+        {
+            "record": "source",
+            "source_type": "DepsSource",
+            "path": f"{tmp_path / 'requirements.txt'}",
+            "parser_choice": "requirements.txt",
+        },
+        {
+            "record": "source",
+            "source_type": "PyEnvSource",
+            "path": f"{site_packages(tmp_path / 'my_venv')}",
+        },
+    ]
+    expect_rest = [
+        {
+            "record": "import",
+            "name": "my_requests",
+            "source": {"path": f"{tmp_path / 'code.py'}", "lineno": 1},
+        },
+        {
+            "record": "declared_dep",
+            "name": "my_pandas",
+            "source": {"path": f"{tmp_path / 'requirements.txt'}"},
+        },
+        {
+            "record": "undeclared_dep",
+            "name": "my_requests",
+            "references": [{"path": f"{tmp_path / 'code.py'}", "lineno": 1}],
+            "candidates": [],
+        },
+        {
+            "record": "unused_dep",
+            "name": "my_pandas",
+            "references": [{"path": f"{tmp_path / 'requirements.txt'}"}],
+        },
+    ]
+    output, returncode = run_fawltydeps_function(
+        "--check",
+        "--ndjson",
+        f"--code={tmp_path}",
+        f"--deps={tmp_path}",
+        f"--pyenv={tmp_path}",
+    )
+    records = [json.loads(line) for line in output.splitlines()]
+    # Sources are found in no particular order, but are all reported first
+    num_sources = len(expect_sources)
+    by_path = itemgetter("path")
+    assert sorted(records[:num_sources], key=by_path) == sorted(
+        expect_sources, key=by_path
+    )
+    assert records[num_sources:] == expect_rest
+    assert returncode == EXIT_UNDECLARED  # --ndjson does not affect exit code
+
+
 def test_check_undeclared__simple_project__reports_only_undeclared(fake_project):
     tmp_path = fake_project(
         imports=["my_requests"],
@@ -1297,9 +1472,18 @@ def test_cmdline_on_ignore_options(args, imports, dependencies, expected, fake_p
                 # install_deps = false
                 # exclude = ['.*']
                 # exclude_from = []
+                # use_gitignore = false
                 # verbosity = 0
                 # custom_mapping_file = []
                 # base_dir = ...
+                # source_discovery = 'walk'
+                # extra_code_formats = []
+                # traversal_threads = 0
+                # max_file_size = ...
+                # max_files_per_dir = ...
+                # max_files = ...
+                # parse_timeout = ...
+                # parse_memory_limit = ...
                 # [tool.fawltydeps.custom_mapping]
                 """
             ).splitlines(),
@@ -1324,9 +1508,18 @@ def test_cmdline_on_ignore_options(args, imports, dependencies, expected, fake_p
                 # install_deps = false
                 # exclude = ['.*']
                 # exclude_from = []
+                # use_gitignore = false
                 # verbosity = 0
                 # custom_mapping_file = []
                 # base_dir = ...
+                # source_discovery = 'walk'
+                # extra_code_formats = []
+                # traversal_threads = 0
+                # max_file_size = ...
+                # max_files_per_dir = ...
+                # max_files = ...
+                # parse_timeout = ...
+                # parse_memory_limit = ...
                 # [tool.fawltydeps.custom_mapping]
                 """
             ).splitlines(),
@@ -1351,9 +1544,18 @@ def test_cmdline_on_ignore_options(args, imports, dependencies, expected, fake_p
                 # install_deps = false
                 # exclude = ['.*']
                 # exclude_from = []
+                # use_gitignore = false
                 # verbosity = 0
                 # custom_mapping_file = []
                 # base_dir = ...
+                # source_discovery = 'walk'
+                # extra_code_formats = []
+                # traversal_threads = 0
+                # max_file_size = ...
+                # max_files_per_dir = ...
+                # max_files = ...
+                # parse_timeout = ...
+                # parse_memory_limit = ...
                 # [tool.fawltydeps.custom_mapping]
                 """
             ).splitlines(),
@@ -1378,9 +1580,18 @@ def test_cmdline_on_ignore_options(args, imports, dependencies, expected, fake_p
                 install_deps = true
                 exclude = ['bar/', 'foo*']
                 # exclude_from = []
+                # use_gitignore = false
                 # verbosity = 0
                 # custom_mapping_file = []
                 # base_dir = ...
+                # source_discovery = 'walk'
+                # extra_code_formats = []
+                # traversal_threads = 0
+                # max_file_size = ...
+                # max_files_per_dir = ...
+                # max_files = ...
+                # parse_timeout = ...
+                # parse_memory_limit = ...
                 # [tool.fawltydeps.custom_mapping]
                 """
             ).splitlines(),
@@ -1405,9 +1616,18 @@ def test_cmdline_on_ignore_options(args, imports, dependencies, expected, fake_p
                 # install_deps = false
                 exclude = ['/foo/bar', 'baz/*']
                 exclude_from = ['my_ignore']
+                # use_gitignore = false
                 # verbosity = 0
                 # custom_mapping_file = []
                 # base_dir = ...
+                # source_discovery = 'walk'
+                # extra_code_formats = []
+                # traversal_threads = 0
+                # max_file_size = ...
+                # max_files_per_dir = ...
+                # max_files = ...
+                # parse_timeout = ...
+                # parse_memory_limit = ...
                 # [tool.fawltydeps.custom_mapping]
                 """
             ).splitlines(),
@@ -1496,3 +1716,39 @@ def pyproject_toml_contents():
         "uvicorn",
     ]
     return data, uniq_deps
+
+
+@pytest.mark.parametrize(
+    ("aggregate_imports", "expect_imports"),
+    [
+        pytest.param(True, 3, id="aggregated"),
+        pytest.param(False, 10, id="keeps_all"),
+    ],
+)
+def test_analysis__aggregate_imports__keeps_only_first_few_imports_per_name(
+    fake_project, aggregate_imports, expect_imports
+):
+    tmp_path = fake_project(
+        files_with_imports={f"code{i}.py": ["numpy"] for i in range(10)}
+    )
+    settings = Settings(code={tmp_path}, deps={tmp_path})
+    records = []
+    analysis = Analysis.create(
+        settings,
+        on_record=lambda *rec: records.append(rec),
+        aggregate_imports=aggregate_imports,
+    )
+
+    assert [imp.name for imp in analysis.imports] == ["numpy"] * expect_imports
+    assert [undeclared.name for undeclared in analysis.undeclared_deps] == ["numpy"]
+    assert sum(kind == "import" for kind, _ in records) == 10  # noqa: PLR2004
+
+
+def test_analysis__default_settings__keeps_every_import(fake_project):
+    tmp_path = fake_project(
+        files_with_imports={f"code{i}.py": ["numpy"] for i in range(10)}
+    )
+    analysis = Analysis.create(Settings(code={tmp_path}, deps={tmp_path}))
+    assert analysis.settings.output_format == OutputFormat.HUMAN_SUMMARY
+    assert len(analysis.imports) == 10  # noqa: PLR2004
+    assert len(analysis.undeclared_deps[0].references) == 10  # noqa: PLR2004
@@ -0,0 +1,219 @@
+"""Verify the daemon mode: A long-running server with warm caches."""
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+
+from fawltydeps import daemon, extract_imports, packages, traverse_project
+from fawltydeps.types import CodeSource
+
+from .utils import run_fawltydeps_function
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="Unix sockets are not supported"
+)
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are limited to ~100 chars, so avoid the long tmp_path
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield Path(tmpdir, "fd.sock")
+
+
+@pytest.fixture
+def server(socket_path):
+    """Run a daemon in a background thread, and disable its caches afterwards."""
+    srv = daemon.make_server(socket_path)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield srv
+    finally:
+        srv.shutdown()
+        srv.server_close()
+        thread.join()
+        extract_imports.parsed_imports_cache = None
+        packages.installed_envs_cache = None
+        traverse_project.sources_cache = None
+
+
+def request(socket_path, *args):
+    return daemon.send_request(
+        socket_path, ["--config-file", os.devnull, *args], cwd=Path.cwd()
+    )
+
+
+@pytest.mark.usefixtures("server")
+def test_daemon__same_output_as_running_fawltydeps_directly(socket_path, fake_project):
+    project = fake_project(
+        imports=["requests", "numpy"],
+        declared_deps=["requests", "pandas"],
+        fake_venvs={"my_venv": {"requests": ["requests"], "pandas": ["pandas"]}},
+    )
+    args = [str(project), "--detailed", "--pyenv", str(project / "my_venv")]
+    expect_output, expect_exit_code = run_fawltydeps_function(*args)
+
+    response = request(socket_path, *args)
+    assert response["stdout"].strip() == expect_output
+    assert response["exit_code"] == expect_exit_code
+
+
+@pytest.mark.usefixtures("server")
+def test_daemon__repeated_request__reuses_parsed_imports(socket_path, write_tmp_files):
+    project = write_tmp_files({"code.py": "import numpy\n"})
+    first = request(socket_path, "--list-imports", str(project))
+    misses = extract_imports.parsed_imports_cache.misses
+    second = request(socket_path, "--list-imports", str(project))
+
+    assert second == first
+    assert extract_imports.parsed_imports_cache.misses == misses
+    assert extract_imports.parsed_imports_cache.hits > 0
+    assert traverse_project.sources_cache.hits > 0
+
+
+@pytest.mark.usefixtures("server")
+def test_daemon__modified_file__is_parsed_again(socket_path, write_tmp_files):
+    project = write_tmp_files({"code.py": "import numpy\n"})
+    first = request(socket_path, "--list-imports", str(project))
+    (project / "code.py").write_text("import numpy\nimport pandas\n")
+    second = request(socket_path, "--list-imports", str(project))
+
+    assert "pandas" not in first["stdout"]
+    assert "pandas" in second["stdout"]
+
+
+@pytest.mark.usefixtures("server")
+def test_daemon__new_file__is_found(socket_path, write_tmp_files):
+    project = write_tmp_files({"code.py": "import numpy\n"})
+    request(socket_path, "--list-imports", str(project))
+    (project / "other.py").write_text("import pandas\n")
+    response = request(socket_path, "--list-imports", str(project))
+
+    assert "pandas" in response["stdout"]
+
+
+@pytest.mark.usefixtures("server")
+def test_daemon__modified_gitignore__is_applied(socket_path, write_tmp_files):
+    project = write_tmp_files(
+        {".gitignore": "# nothing\n", "code.py": "import numpy\n"}
+    )
+    args = ["--list-imports", "--use-gitignore", str(project)]
+    first = request(socket_path, *args)
+    (project / ".gitignore").write_text("code.py\n")
+    second = request(socket_path, *args)
+
+    assert "numpy" in first["stdout"]
+    assert "numpy" not in second["stdout"]
+
+
+@pytest.mark.usefixtures("server")
+def test_daemon__invalid_argument__returns_argparse_error(socket_path):
+    response = request(socket_path, "--no-such-option")
+    assert response["exit_code"] == 2  # noqa: PLR2004
+    assert "unrecognized arguments: --no-such-option" in response["stderr"]
+
+
+@pytest.mark.usefixtures("server")
+@pytest.mark.parametrize(
+    "args",
+    [
+        pytest.param(["--watch"], id="watch"),
+        pytest.param(["--batch"], id="batch"),
+        pytest.param(["--daemon", "other.sock"], id="daemon"),
+    ],
+)
+def test_daemon__server_mode_option__is_rejected(socket_path, args):
+    response = request(socket_path, *args)
+    assert response["exit_code"] == 2  # noqa: PLR2004
+    assert f"Cannot use {args[0]} in a request" in response["stderr"]
+
+
+@pytest.mark.usefixtures("server")
+@pytest.mark.parametrize(
+    "args",
+    [
+        pytest.param(["--code", "-"], id="code"),
+        pytest.param(["--deps", "-"], id="deps"),
+        pytest.param(["--baseline", "base.json", "--changed", "-"], id="changed"),
+    ],
+)
+def test_daemon__reading_from_stdin__is_rejected(socket_path, args):
+    response = request(socket_path, *args)
+    assert response["exit_code"] == 2  # noqa: PLR2004
+    assert f"Cannot read from stdin ({args[-2]} -)" in response["stderr"]
+
+
+@pytest.mark.usefixtures("server")
+def test_daemon__deleted_project__is_pruned_from_caches(socket_path, tmp_path):
+    for name in ["kept", "deleted"]:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "code.py").write_text("import numpy\n")
+        request(socket_path, "--list-imports", str(tmp_path / name))
+    shutil.rmtree(tmp_path / "deleted")
+    daemon.prune_caches()
+
+    assert len(extract_imports.parsed_imports_cache) == 1
+    assert len(traverse_project.sources_cache) == 1
+    response = request(socket_path, "--list-imports", str(tmp_path / "kept"))
+    assert "numpy" in response["stdout"]
+
+
+def test_parsed_imports_cache__max_entries__forgets_least_recently_used(tmp_path):
+    cache = extract_imports.ParsedImportsCache(max_entries=2)
+    sources = []
+    for name in ["a.py", "b.py", "c.py"]:
+        (tmp_path / name).write_text("import numpy\n")
+        sources.append(CodeSource(tmp_path / name))
+
+    def lookup(src):
+        return list(cache.lookup(src, (), lambda: iter([])))
+
+    lookup(sources[0])
+    lookup(sources[1])
+    lookup(sources[0])  # a.py is now more recently used than b.py
+    lookup(sources[2])  # forgets b.py
+    assert len(cache) == 2  # noqa: PLR2004
+    misses = cache.misses
+    lookup(sources[0])
+    assert cache.misses == misses
+    lookup(sources[1])
+    assert cache.misses == misses + 1
+
+
+@pytest.mark.usefixtures("server")
+def test_make_server__already_running__refuses_to_start(socket_path):
+    with pytest.raises(OSError, match="already listening"):
+        daemon.make_server(socket_path)
+
+
+@pytest.mark.usefixtures("server")
+def test_make_server__socket__is_only_accessible_by_owner(socket_path):
+    assert socket_path.stat().st_mode & 0o077 == 0
+    # The umask of the process is restored
+    saved_umask = os.umask(0o022)
+    os.umask(saved_umask)
+    assert saved_umask != 0o077  # noqa: PLR2004
+
+
+def test_make_server__stale_socket__is_replaced(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(str(socket_path))  # bound, but never listening
+    srv = daemon.make_server(socket_path)
+    try:
+        assert daemon.is_server_alive(socket_path)
+    finally:
+        srv.server_close()
+        extract_imports.parsed_imports_cache = None
+        packages.installed_envs_cache = None
+        traverse_project.sources_cache = None
+
+
+def test_client_main__no_server__fails_with_exit_code_2(socket_path, capsys):
+    assert daemon.client_main([str(socket_path), "--list-imports"]) == 2  # noqa: PLR2004
+    assert "Cannot connect to FawltyDeps daemon" in capsys.readouterr().err
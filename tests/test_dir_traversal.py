@@ -1,6 +1,8 @@
 """Test core functionality of DirectoryTraversal class."""
 
+import copy
 import sys
+import threading
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from pathlib import Path
@@ -9,7 +11,13 @@ from typing import Generic, Optional, TypeVar, Union
 
 import pytest
 
-from fawltydeps.dir_traversal import DirectoryTraversal, TraversalStep
+from fawltydeps import dir_traversal
+from fawltydeps.dir_traversal import (
+    DirectoryTraversal,
+    DirId,
+    StatCache,
+    TraversalStep,
+)
 from fawltydeps.gitignore_parser import RuleError, RuleMissing
 
 from .utils import assert_unordered_equivalence
@@ -1051,3 +1059,204 @@ def test_DirectoryTraversal__raises_error__when_adding_missing_dir(tmp_path):
     traversal = DirectoryTraversal()
     with pytest.raises(NotADirectoryError):
         traversal.add(tmp_path / "MISSING")
+
+
+@pytest.mark.parametrize(
+    "vector", [pytest.param(v, id=v.id) for v in directory_traversal_vectors]
+)
+def test_DirectoryTraversal_w_threads__yields_same_steps_in_same_order(
+    vector: DirectoryTraversalVector, tmp_path
+):
+    traversal = vector.setup(tmp_path)
+    threaded = copy.deepcopy(traversal)
+    threaded.threads = 4
+    assert list(threaded.traverse()) == list(traversal.traverse())
+
+
+def test_DirectoryTraversal_w_threads__skip_dir_during_traversal(tmp_path):
+    for i in range(5):
+        for j in range(5):
+            (tmp_path / f"root{i}" / f"dir{j}" / "sub").mkdir(parents=True)
+    (tmp_path / "root0" / "loop").symlink_to(tmp_path)
+
+    def traverse(threads: int) -> list[Path]:
+        traversal: DirectoryTraversal = DirectoryTraversal(threads=threads)
+        for i in range(5):
+            traversal.add(tmp_path / f"root{i}")
+        steps = []
+        for step in traversal.traverse():
+            steps.append(step.dir)
+            if step.dir.name == "dir1":
+                traversal.skip_dir(step.dir / "sub")
+            if step.dir.name == "root2":
+                traversal.skip_dir(tmp_path / "root3")
+        return steps
+
+    expect = traverse(threads=0)
+    assert tmp_path / "root1" / "dir1" / "sub" not in expect
+    assert tmp_path / "root3" not in expect
+    assert traverse(threads=4) == expect
+
+
+def test_DirectoryTraversal_w_threads__exclude_during_traversal(tmp_path):
+    for i in range(5):
+        for j in range(5):
+            (tmp_path / f"dir{i}" / f"sub{j}").mkdir(parents=True)
+
+    def traverse(threads: int) -> list[Path]:
+        traversal: DirectoryTraversal = DirectoryTraversal(threads=threads)
+        traversal.add(tmp_path)
+        steps = []
+        for step in traversal.traverse():
+            steps.append(step.dir)
+            if step.dir.name == "dir1":
+                traversal.exclude("sub3/")
+        return steps
+
+    expect = traverse(threads=0)
+    assert tmp_path / "dir0" / "sub3" in expect
+    assert tmp_path / "dir2" / "sub3" not in expect
+    assert traverse(threads=4) == expect
+
+
+def test_DirectoryTraversal_w_threads_and_gitignore__does_not_prefetch_ignored(
+    write_tmp_files, monkeypatch
+):
+    tmp_path = write_tmp_files(
+        {".gitignore": "node_modules/\n", "a/node_modules/pkg/x.js": "", "a/x.py": ""}
+    )
+    # Hold back listing a/ until tmp_path (and its .gitignore) has been traversed
+    traversed_root = threading.Event()
+    listed = []
+    real_list_dir = dir_traversal.list_dir
+
+    def list_dir(path):
+        if path.name == "a":
+            traversed_root.wait(timeout=10)
+        listed.append(path)
+        return real_list_dir(path)
+
+    monkeypatch.setattr(dir_traversal, "list_dir", list_dir)
+    traversal: DirectoryTraversal = DirectoryTraversal(use_gitignore=True, threads=2)
+    traversal.add(tmp_path)
+    steps = []
+    for step in traversal.traverse():
+        steps.append(step.dir)
+        if step.dir == tmp_path:
+            traversed_root.set()
+    assert steps == [tmp_path, tmp_path / "a"]
+    assert tmp_path / "a" in listed
+    assert tmp_path / "a" / "node_modules" / "pkg" not in listed
+
+
+def test_DirectoryTraversal__attach_data_to_parent_during_traversal(tmp_path):
+    (tmp_path / "a" / "b" / "c").mkdir(parents=True)
+    traversal: DirectoryTraversal = DirectoryTraversal()
+    traversal.add(tmp_path, "root")
+    traversal.add(tmp_path / "a" / "b" / "c", "c")
+    actual = {}
+    for step in traversal.traverse():
+        actual[step.dir.relative_to(tmp_path)] = step.attached
+        if step.dir == tmp_path / "a":  # add data to visited dirs
+            traversal.add(tmp_path, "more root")
+            traversal.add(tmp_path / "a", "a")
+    assert actual == {
+        Path(): ["root"],
+        Path("a"): ["root"],
+        Path("a/b"): ["root", "more root", "a"],
+        Path("a/b/c"): ["root", "more root", "a", "c"],
+    }
+
+
+def test_DirectoryTraversal_w_gitignore__rules_apply_within_their_own_dir(
+    write_tmp_files,
+):
+    tmp_path = write_tmp_files(
+        {
+            ".git/info/exclude": "*.log\n",
+            ".gitignore": "build/\n*.tmp\n",
+            "a/.gitignore": "!keep.tmp\ndata/\n",
+            "a/keep.tmp": "",
+            "a/drop.tmp": "",
+            "a/data/x.py": "",
+            "a/build/x.py": "",
+            "b/data/x.py": "",
+            "b/x.log": "",
+            "nested/.git/HEAD": "",
+            "nested/x.tmp": "",
+        }
+    )
+    traversal: DirectoryTraversal = DirectoryTraversal(use_gitignore=True)
+    traversal.add(tmp_path / "a")
+    traversal.add(tmp_path / "b")
+    traversal.add(tmp_path / "nested")
+    traversal.exclude(".git")
+    steps = {step.dir: step for step in traversal.traverse()}
+
+    assert set(steps) == {
+        tmp_path / "a",
+        tmp_path / "b",
+        tmp_path / "b" / "data",
+        tmp_path / "nested",
+    }
+    assert steps[tmp_path / "a"].excluded_subdirs == {
+        tmp_path / "a" / "build",  # from the parent's .gitignore
+        tmp_path / "a" / "data",  # from a/.gitignore
+    }
+    assert steps[tmp_path / "a"].excluded_files == {tmp_path / "a" / "drop.tmp"}
+    assert steps[tmp_path / "b"].excluded_files == {tmp_path / "b" / "x.log"}
+    # Rules from the outer checkout do not apply inside the nested checkout
+    assert steps[tmp_path / "nested"].files == {tmp_path / "nested" / "x.tmp"}
+    assert tmp_path / ".gitignore" in traversal.ignore_files
+
+
+def test_DirectoryTraversal_w_gitignore__exclude_patterns_take_precedence(
+    write_tmp_files,
+):
+    tmp_path = write_tmp_files({".gitignore": "*.py\n", "x.py": "", "y.py": ""})
+    traversal: DirectoryTraversal = DirectoryTraversal(use_gitignore=True)
+    traversal.add(tmp_path)
+    traversal.exclude("!x.py")
+    [step] = traversal.traverse()
+    assert step.files == {tmp_path / ".gitignore", tmp_path / "x.py"}
+    assert step.excluded_files == {tmp_path / "y.py"}
+
+
+def test_StatCache__is_bounded_and_counts_hits_and_misses(tmp_path):
+    dirs = [tmp_path / f"dir{i}" for i in range(3)]
+    for path in dirs:
+        path.mkdir()
+    cache = StatCache(max_size=2)
+    assert [cache.dir_id(path) for path in dirs] == list(map(DirId.from_path, dirs))
+    assert cache.dir_id(dirs[2]) == DirId.from_path(dirs[2])
+    assert (cache.hits, cache.misses, len(cache)) == (1, 3, 2)
+
+    cache.reset()
+    assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+
+
+def test_StatCache__resolves_relative_paths_until_reset(tmp_path, monkeypatch):
+    (tmp_path / "a" / "sub").mkdir(parents=True)
+    (tmp_path / "b" / "sub").mkdir(parents=True)
+    cache = StatCache()
+    monkeypatch.chdir(tmp_path / "a")
+    assert cache.dir_id(Path("sub")) == DirId.from_path(tmp_path / "a" / "sub")
+    monkeypatch.chdir(tmp_path / "b")
+    assert cache.dir_id(Path("sub")) == DirId.from_path(tmp_path / "a" / "sub")
+    cache.reset()
+    assert cache.dir_id(Path("sub")) == DirId.from_path(tmp_path / "b" / "sub")
+
+
+def test_DirectoryTraversal__resets_stat_cache__when_finished(tmp_path):
+    (tmp_path / "sub").mkdir()
+    traversal: DirectoryTraversal = DirectoryTraversal()
+    traversal.add(tmp_path)
+    for _ in traversal.traverse():
+        assert len(traversal.stat_cache) > 0
+    assert len(traversal.stat_cache) == 0
+
+    # A directory replaced after the traversal is seen as a new directory
+    (tmp_path / "sub").rename(tmp_path / "old")
+    (tmp_path / "sub").mkdir()
+    traversal.add(tmp_path / "sub")
+    assert [step.dir for step in traversal.traverse()] == [tmp_path / "sub"]
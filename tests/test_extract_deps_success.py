@@ -1,5 +1,6 @@
 """Test that dependencies are parsed from requirements files."""
 
+import logging
 from textwrap import dedent
 
 import pytest
@@ -316,6 +317,58 @@ def test_parse_requirements_txt(write_tmp_files, file_content, expect_deps):
             ["botocore1", "botocore2", "botocore3"],
             id="extras_with_varying_types",
         ),
+        pytest.param(
+            """\
+            from setuptools import setup
+
+            if __name__ == "__main__":
+                my_deps = ["pandas", "click"]
+                setup(
+                    name="MyLib",
+                    install_requires=my_deps,
+                )
+            """,
+            ["pandas", "click"],
+            id="setup_call_inside_if_block__uses_variable_from_same_block",
+        ),
+        pytest.param(
+            """\
+            from setuptools import setup
+
+            common_deps = ["pandas"]
+
+            def unrelated():
+                extra_deps = ["not-used"]
+
+            def main():
+                extra_deps = ["click"]
+                setup(
+                    name="MyLib",
+                    install_requires=common_deps,
+                    extras_require={"extra": extra_deps},
+                )
+
+            main()
+            """,
+            ["pandas", "click"],
+            id="setup_call_inside_function__uses_function_and_module_variables",
+        ),
+        pytest.param(
+            """\
+            from setuptools import setup
+
+            my_deps = ["pandas", "click"]
+
+            setup(
+                name="MyLib",
+                install_requires=my_deps,
+            )
+
+            my_deps = ["not-used"]
+            """,
+            ["pandas", "click"],
+            id="reassignment_after_setup_call__is_ignored",
+        ),
     ],
 )
 def test_parse_setup_py(write_tmp_files, file_content, expect_deps):
@@ -327,6 +380,30 @@ def test_parse_setup_py(write_tmp_files, file_content, expect_deps):
     assert_unordered_equivalence(result, expected)
 
 
+def test_parse_setup_py__code_after_setup_call__is_not_evaluated(
+    write_tmp_files, caplog
+):
+    tmp_path = write_tmp_files(
+        {
+            "setup.py": """\
+                from setuptools import setup
+
+                setup(name="MyLib", install_requires=["pandas"])
+
+                x: int = 1
+                y = some_function()
+                """,
+        }
+    )
+    path = tmp_path / "setup.py"
+
+    caplog.set_level(logging.DEBUG)
+    result = list(parse_setup_py(path))
+    assert result == deps_factory("pandas", path=path)
+    assert "some_function" not in caplog.text
+    assert "Don't know how to parse" not in caplog.text
+
+
 @pytest.mark.parametrize(
     ("file_content", "expect_deps"),
     [
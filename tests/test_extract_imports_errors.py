@@ -1,9 +1,13 @@
 """Verify graceful failure when we cannot extract imports from Python code."""
 
 import logging
+from pathlib import Path
 from textwrap import dedent
 
+import pytest
+
 from fawltydeps.extract_imports import (
+    parse_cells,
     parse_code,
     parse_notebook_file,
     parse_python_file,
@@ -30,6 +34,34 @@ def test_parse_notebook_file__on_invalid_json__logs_error(tmp_path, caplog):
     assert f"Could not parse code from {script}" in caplog.text
 
 
+def test_parse_notebook_file__streamed_invalid_json__logs_error(
+    tmp_path, caplog, monkeypatch
+):
+    monkeypatch.setattr("fawltydeps.extract_imports.STREAM_NOTEBOOK_SIZE", 0)
+    script = tmp_path / "test.ipynb"
+    script.write_text('{"cells": [{"cell_type": "code", "source": ["import numpy"]')
+    caplog.set_level(logging.ERROR)
+    assert list(parse_notebook_file(script)) == []
+    assert f"Could not parse code from {script}" in caplog.text
+
+
+def test_parse_notebook_file__streamed_invalid_json_after_cells__keeps_their_imports(
+    tmp_path, caplog, monkeypatch
+):
+    # With the metadata first, cells are parsed as they are streamed in
+    monkeypatch.setattr("fawltydeps.extract_imports.STREAM_NOTEBOOK_SIZE", 0)
+    script = tmp_path / "test.ipynb"
+    script.write_text(
+        '{"metadata": {"language_info": {"name": "python"}},'
+        ' "cells": [{"cell_type": "code", "source": ["import numpy"]}, {"cell'
+    )
+    caplog.set_level(logging.ERROR)
+    assert list(parse_notebook_file(script)) == [
+        ParsedImport("numpy", Location(script, cellno=1, lineno=1))
+    ]
+    assert f"Could not parse code from {script}" in caplog.text
+
+
 def test_parse_notebook_file__on_parse_error_one_cell__logs_error_and_continues(
     tmp_path, caplog
 ):
@@ -140,3 +172,40 @@ def test_parse_notebook_file__on_invalid_python_one_cell__logs_error_and_continu
         ParsedImport("pandas", Location(script, lineno=1, cellno=2))
     ]
     assert f"Could not parse code from {script}[1]" in caplog.text
+
+
+@pytest.mark.parametrize(
+    ("cells", "expect_errors"),
+    [
+        pytest.param(
+            ["import numpy\n", "import pandas as\n", "import requests\n"],
+            [2],
+            id="syntax_error_in_one_cell",
+        ),
+        pytest.param(
+            ["import numpy\nx = (\n", "1)\nimport requests\n"],
+            [1, 2],
+            id="statement_spans_cells",
+        ),
+        pytest.param(
+            ["import numpy\n@decorator\n", "def f():\n    import requests\n"],
+            [1],
+            id="decorator_in_previous_cell",
+        ),
+    ],
+)
+def test_parse_cells__code_spanning_cells__fails_like_parse_code_per_cell(
+    caplog, cells, expect_errors
+):
+    sources = [Location(Path("nb.ipynb"), cellno) for cellno in range(1, 4)]
+    expect = [
+        imp
+        for source, code in zip(sources, cells)
+        for imp in parse_code(code, source=source)
+    ]
+    caplog.clear()
+    caplog.set_level(logging.ERROR)
+    assert list(parse_cells(list(zip(sources, cells)))) == expect
+    assert [record.getMessage().split(":")[0] for record in caplog.records] == [
+        f"Could not parse code from {sources[n - 1]}" for n in expect_errors
+    ]
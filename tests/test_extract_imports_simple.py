@@ -1,5 +1,6 @@
 """Test that we can extract simple imports from Python code."""
 
+import ast
 import json
 import logging
 from dataclasses import dataclass, field
@@ -11,12 +12,23 @@ from typing import Union
 import pytest
 
 from fawltydeps.extract_imports import (
+    CODE_SUFFIXES,
+    aggregate_imports,
+    parse_cells,
     parse_code,
     parse_notebook_file,
     parse_python_file,
     parse_sources,
+    python_chunks,
+    validate_code_source,
+)
+from fawltydeps.types import (
+    CodeSource,
+    Location,
+    ParsedImport,
+    PathOrSpecial,
+    UnparseablePathError,
 )
-from fawltydeps.types import CodeSource, Location, ParsedImport, PathOrSpecial
 
 from .utils import dedent_bytes
 
@@ -87,7 +99,7 @@ def write_code_sources(write_tmp_files):
         tmp_path = write_tmp_files(file_contents)
         sources = []
         for filepath in file_contents:
-            assert filepath.endswith((".py", ".ipynb"))
+            assert filepath.endswith(tuple(CODE_SUFFIXES))
             sources.append(CodeSource(tmp_path / filepath, tmp_path / base_dir))
         return tmp_path, sources
 
@@ -495,6 +507,103 @@ def test_parse_sources__imports__are_extracted_in_order_of_encounter(
     assert list(parse_sources(code_sources)) == expect
 
 
+QUARTO_DOCUMENT = """\
+    ---
+    title: "Report"
+    ---
+
+    ```{python}
+    #| echo: false
+    import pandas
+    ```
+
+    ```{r}
+    library(not_python)
+    ```
+
+    ```{python, echo=FALSE}
+    %matplotlib inline
+    from my_plotlib import pyplot
+    ```
+    """
+
+JUPYTEXT_MARKDOWN = """\
+    ---
+    jupyter:
+      jupytext:
+        text_representation:
+          format_name: markdown
+    ---
+
+    ```python
+    import numpy
+    ```
+    """
+
+
+@pytest.mark.parametrize(
+    ("filename", "code", "expect"),
+    [
+        pytest.param("stub.pyi", "import numpy\n", [("numpy", 1)], id="python_stub"),
+        pytest.param(
+            "report.qmd",
+            QUARTO_DOCUMENT,
+            [("pandas", 7), ("my_plotlib", 16)],
+            id="quarto",
+        ),
+        pytest.param(
+            "report.Rmd", QUARTO_DOCUMENT, [("pandas", 7), ("my_plotlib", 16)], id="rmd"
+        ),
+        pytest.param(
+            "notebook.md", JUPYTEXT_MARKDOWN, [("numpy", 9)], id="jupytext_markdown"
+        ),
+    ],
+)
+def test_parse_sources__other_code_formats__extracts_python_imports(
+    write_code_sources, filename, code, expect
+):
+    tmp_path, code_sources = write_code_sources({filename: code})
+    assert list(parse_sources(code_sources)) == imports_w_linenos(
+        expect, tmp_path / filename
+    )
+
+
+def test_python_chunks__other_code_blocks__are_skipped():
+    document = dedent(
+        """\
+        ````markdown
+        ```python
+        import not_a_chunk
+        ```
+        ````
+        ~~~ipython3
+        import first
+        ~~~
+        ```{code-cell} ipython3
+        import second
+        ```
+        ```python
+        import unterminated
+        """
+    ).splitlines(keepends=True)
+    assert list(python_chunks(document)) == [
+        (7, ["import first\n"]),
+        (10, ["import second\n"]),
+        (13, ["import unterminated\n"]),
+    ]
+
+
+def test_validate_code_source__plain_markdown__is_rejected(tmp_path):
+    readme = tmp_path / "README.md"
+    readme.write_text("# Title\n\n```python\nimport numpy\n```\n")
+    with pytest.raises(UnparseablePathError):
+        validate_code_source(readme)
+
+    notebook = tmp_path / "notebook.md"
+    notebook.write_text(dedent(JUPYTEXT_MARKDOWN))
+    assert validate_code_source(notebook) == CodeSource(notebook)
+
+
 @dataclass
 class FirstPartyImportTestVector:
     """Test vectors for verifying that 1st-party imports are ignored by parse_sources()."""
@@ -597,3 +706,132 @@ def test_parse_sources__legacy_encoding_on_stdin__extracts_import():
 
     expect = imports_w_linenos([("numpy", 6)], "<stdin>")
     assert list(parse_sources([CodeSource("<stdin>")], BytesIO(code))) == expect
+
+
+def test_parse_code__debug_logging_disabled__does_not_format_debug_messages(
+    monkeypatch, caplog
+):
+    def fail(*_args, **_kwargs):
+        raise AssertionError("ast.dump() must not be called")
+
+    monkeypatch.setattr("ast.dump", fail)
+    caplog.set_level(logging.WARNING)
+    code = "import numpy\nfrom pandas import DataFrame\n"
+    expect = imports_w_linenos([("numpy", 1), ("pandas", 2)])
+    assert list(parse_code(code, source=Location("<stdin>"))) == expect
+
+
+def test_parse_code__debug_logging_enabled__logs_import_nodes(caplog):
+    caplog.set_level(logging.DEBUG)
+    list(parse_code("import numpy\n", source=Location("<stdin>")))
+    assert "Import(names=[alias(name='numpy')])" in caplog.text
+
+
+def test_aggregate_imports__keeps_count_and_first_few_imports_per_name():
+    imports = imports_w_linenos(
+        [("numpy", 1), ("pandas", 2), ("numpy", 3), ("numpy", 4), ("numpy", 5)]
+    )
+    assert aggregate_imports(imports, max_references=2) == {
+        "numpy": (4, imports_w_linenos([("numpy", 1), ("numpy", 3)])),
+        "pandas": (1, imports_w_linenos([("pandas", 2)])),
+    }
+
+
+@pytest.mark.parametrize("metadata_first", [False, True])
+def test_parse_notebook_file__streamed__extracts_same_imports(
+    tmp_path, monkeypatch, metadata_first
+):
+    output = {
+        "output_type": "display_data",
+        "data": {"image/png": "x" * 10_000, "text/plain": ['"]}\\', "[{"]},
+    }
+    cells = [
+        {"cell_type": "markdown", "source": ["import not_code\n"]},
+        {
+            "cell_type": "code",
+            "outputs": [output],
+            "source": ["%pip install numpy\n", "import numpy\n"],
+        },
+        {"cell_type": "code", "source": "import pandas\nfrom x.y import z\n"},
+    ]
+    members = [("cells", cells), ("metadata", {"language_info": {"name": "python"}})]
+    if metadata_first:
+        members.reverse()
+    script = tmp_path / "test.ipynb"
+    script.write_text(json.dumps(dict(members), indent=1))
+
+    loaded = list(parse_notebook_file(script))
+    monkeypatch.setattr("fawltydeps.extract_imports.STREAM_NOTEBOOK_SIZE", 0)
+    streamed = list(parse_notebook_file(script))
+
+    expect = imports_w_linenos_cellnos(
+        [("numpy", 2, 2), ("pandas", 1, 3), ("x", 2, 3)], script
+    )
+    assert loaded == streamed == expect
+
+
+@pytest.mark.parametrize(
+    "cells",
+    [
+        pytest.param([], id="no_cells"),
+        pytest.param(["import numpy"], id="one_cell_no_newline"),
+        pytest.param(
+            ["import numpy\n", "", "# comment\n", "from pandas import x\r\n"],
+            id="empty_cells_and_crlf",
+        ),
+        pytest.param(
+            [
+                "def f():\n    import inner\n    return 1\n",
+                "import outer\nif True:\n\n    import nested\n",
+                "@decorator\nclass C:\n    from klass import y\n",
+            ],
+            id="nested_imports",
+        ),
+    ],
+)
+def test_parse_cells__same_as_parse_code_per_cell(cells):
+    sources = [Location(Path("nb.ipynb"), cellno) for cellno in range(1, 10)]
+    expect = [
+        imp
+        for source, code in zip(sources, cells)
+        for imp in parse_code(code, source=source)
+    ]
+    assert list(parse_cells(list(zip(sources, cells)))) == expect
+
+
+def test_parse_code__imports_in_all_kinds_of_statements__same_order_as_ast_walk():
+    code = dedent(
+        """\
+        import a
+        try:
+            import b
+        except ImportError:
+            import c
+        else:
+            import d
+        finally:
+            import e
+        match x:
+            case 1:
+                import f
+        @decorator(lambda: 1)
+        def g():
+            import h
+            with x:
+                for y in z:
+                    import i
+                else:
+                    import j
+        class K:
+            import l
+        while True:
+            import m
+        """
+    )
+    expect = [
+        node.names[0].name
+        for node in ast.walk(ast.parse(code))
+        if isinstance(node, ast.Import)
+    ]
+    assert len(expect) == 11  # noqa: PLR2004
+    assert [imp.name for imp in parse_code(code, source=Location("<stdin>"))] == expect
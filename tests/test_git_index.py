@@ -0,0 +1,222 @@
+"""Verify that we find the same files as git, by reading the git index."""
+
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from fawltydeps import traverse_project
+from fawltydeps.git_index import GitIndexError, parse_index, walk
+from fawltydeps.settings import Settings, SourceDiscovery
+from fawltydeps.traverse_project import SourcesCache, find_sources
+from fawltydeps.types import CodeSource, DepsSource
+
+GIT = shutil.which("git")
+
+pytestmark = pytest.mark.skipif(GIT is None, reason="needs git")
+
+PROJECT_FILES = {
+    ".gitignore": "build/\n*.log\n!keep.log\n",
+    "main.py": "import requests\n",
+    "requirements.txt": "requests\n",
+    "pkg/__init__.py": "",
+    "pkg/sub/deep_module_with_a_rather_long_name.py": "import numpy\n",
+    "pkg/sub/.gitignore": "generated.py\n",
+    "build/lib/copy_of_main.py": "import requests\n",
+    "debug.log": "",
+    "keep.log": "",
+}
+TRACKED = [
+    ".gitignore",
+    "main.py",
+    "requirements.txt",
+    "pkg/__init__.py",
+    "pkg/sub/deep_module_with_a_rather_long_name.py",
+    "pkg/sub/.gitignore",
+]
+UNTRACKED = {
+    "untracked.py": "import pandas\n",
+    "new_dir/new_module.py": "import click\n",
+    "pkg/sub/generated.py": "import numpy\n",  # ignored by pkg/sub/.gitignore
+}
+
+
+def git(cwd: Path, *args: str) -> str:
+    assert GIT is not None
+    proc = subprocess.run(
+        [GIT, "-c", "user.name=x", "-c", "user.email=x@y", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return proc.stdout
+
+
+@pytest.fixture
+def git_project(write_tmp_files):
+    project = write_tmp_files(PROJECT_FILES)
+    git(project, "init", "-q")
+    git(project, "add", *TRACKED)
+    write_tmp_files(UNTRACKED)
+    return project
+
+
+def walked_files(top: Path, **kwargs) -> set[str]:
+    return {
+        (Path(cur) / name).relative_to(top).as_posix()
+        for cur, _subdirs, files in walk(top, **kwargs)
+        for name in files
+    }
+
+
+@pytest.mark.parametrize("index_version", [2, 3, 4])
+def test_parse_index__all_versions__same_paths_as_git_ls_files(
+    git_project, index_version
+):
+    git(git_project, "add", "--intent-to-add", "untracked.py")  # extended flags
+    git(git_project, "update-index", "--index-version", str(index_version))
+    expect = git(git_project, "ls-files", "-z").split("\0")[:-1]
+
+    data = (git_project / ".git" / "index").read_bytes()
+    assert [path for path, _mode in parse_index(data)] == expect
+
+
+def test_parse_index__not_an_index__raises_error():
+    with pytest.raises(GitIndexError):
+        list(parse_index(b"not an index at all"))
+
+
+def test_walk__tracked_only__same_files_as_git_ls_files(git_project):
+    expect = set(git(git_project, "ls-files", "-z").split("\0")[:-1])
+    assert walked_files(git_project) == expect
+
+
+def test_walk__include_untracked__same_files_as_git_ls_files_others(git_project):
+    expect = set(
+        git(
+            git_project, "ls-files", "-z", "--cached", "--others", "--exclude-standard"
+        ).split("\0")[:-1]
+    )
+    assert walked_files(git_project, include_untracked=True) == expect
+
+
+def test_walk__subdir_of_checkout__only_yields_files_under_subdir(git_project):
+    assert walked_files(git_project / "pkg" / "sub", include_untracked=True) == {
+        ".gitignore",
+        "deep_module_with_a_rather_long_name.py",
+    }
+
+
+def test_walk__not_in_git_checkout__walks_filesystem(write_tmp_files):
+    project = write_tmp_files({"a.py": "", "sub/b.py": ""})
+    assert walked_files(project) == {"a.py", "sub/b.py"}
+
+
+@pytest.mark.parametrize(
+    ("source_discovery", "expect_code"),
+    [
+        pytest.param(
+            SourceDiscovery.WALK,
+            {
+                "main.py",
+                "pkg/__init__.py",
+                "pkg/sub/deep_module_with_a_rather_long_name.py",
+                "pkg/sub/generated.py",
+                "build/lib/copy_of_main.py",
+                "untracked.py",
+                "new_dir/new_module.py",
+            },
+            id="walk",
+        ),
+        pytest.param(
+            SourceDiscovery.GIT,
+            {
+                "main.py",
+                "pkg/__init__.py",
+                "pkg/sub/deep_module_with_a_rather_long_name.py",
+                "untracked.py",
+                "new_dir/new_module.py",
+            },
+            id="git",
+        ),
+        pytest.param(
+            SourceDiscovery.GIT_TRACKED,
+            {
+                "main.py",
+                "pkg/__init__.py",
+                "pkg/sub/deep_module_with_a_rather_long_name.py",
+            },
+            id="git_tracked",
+        ),
+    ],
+)
+def test_find_sources__source_discovery__finds_expected_sources(
+    git_project, source_discovery, expect_code
+):
+    settings = Settings(
+        code={git_project},
+        deps={git_project},
+        pyenvs=set(),
+        source_discovery=source_discovery,
+    )
+    sources = list(find_sources(settings, {CodeSource, DepsSource}))
+    code = {
+        src.path.relative_to(git_project).as_posix()
+        for src in sources
+        if isinstance(src, CodeSource)
+    }
+    deps = {
+        src.path.relative_to(git_project).as_posix()
+        for src in sources
+        if isinstance(src, DepsSource)
+    }
+    assert code == expect_code
+    assert deps == {"requirements.txt"}
+
+
+def test_find_sources__git__finds_untracked_pyenv(git_project, fake_venv):
+    _venv_dir, site_packages = fake_venv({}, venv_dir=git_project / "venv")
+    (git_project / ".gitignore").write_text("venv/\n")
+    settings = Settings(
+        code=set(),
+        deps=set(),
+        pyenvs={git_project},
+        source_discovery=SourceDiscovery.GIT,
+    )
+    pyenvs = list(find_sources(settings))
+    assert [os.fspath(src.path) for src in pyenvs] == [os.fspath(site_packages)]
+
+
+@pytest.fixture
+def cached_sources(monkeypatch):
+    monkeypatch.setattr(traverse_project, "sources_cache", SourcesCache())
+
+    def code_sources(settings):
+        return {
+            src.path.relative_to(next(iter(settings.code))).as_posix()
+            for src in find_sources(settings, {CodeSource})
+        }
+
+    return code_sources
+
+
+def test_find_sources__cached__git_add__is_noticed(git_project, cached_sources):
+    settings = Settings(
+        code={git_project}, source_discovery=SourceDiscovery.GIT_TRACKED
+    )
+    assert "untracked.py" not in cached_sources(settings)
+    git(git_project, "add", "untracked.py")  # only the git index changes
+    assert "untracked.py" in cached_sources(settings)
+    assert traverse_project.sources_cache.misses == 2  # noqa: PLR2004
+
+
+def test_find_sources__cached__gitignore_edited__is_noticed(
+    git_project, cached_sources
+):
+    settings = Settings(code={git_project}, source_discovery=SourceDiscovery.GIT)
+    assert "pkg/sub/generated.py" not in cached_sources(settings)
+    (git_project / "pkg" / "sub" / ".gitignore").write_text("# nothing\n")
+    assert "pkg/sub/generated.py" in cached_sources(settings)
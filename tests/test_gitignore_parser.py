@@ -6,7 +6,14 @@ from typing import NamedTuple, Union
 
 import pytest
 
-from fawltydeps.gitignore_parser import match_rules, parse_gitignore_lines
+from fawltydeps.gitignore_parser import (
+    Rule,
+    RuleKind,
+    last_matching_rule,
+    match_rules,
+    match_rules_in_dir,
+    parse_gitignore_lines,
+)
 
 PathOrStr = Union[str, Path]
 
@@ -249,3 +256,45 @@ def test_symlink_to_another_directory(tmp_path):
     # Verify behavior according to https://git-scm.com/docs/gitignore#_notes:
     # Symlinks are not followed and are matched as if they were regular files.
     assert match_rules(rules, link, is_dir=False)
+
+
+@pytest.mark.parametrize(
+    ("pattern", "kind", "text"),
+    [
+        pytest.param("node_modules", RuleKind.EXACT, "node_modules", id="name"),
+        pytest.param("build/", RuleKind.EXACT, "build", id="dir_name"),
+        pytest.param("**/__pycache__", RuleKind.EXACT, "__pycache__", id="any_dir"),
+        pytest.param("!keep.py", RuleKind.EXACT, "keep.py", id="negated"),
+        pytest.param("*.egg-info", RuleKind.SUFFIX, ".egg-info", id="suffix"),
+        pytest.param("tmp*", RuleKind.PREFIX, "tmp", id="prefix"),
+        pytest.param("*", RuleKind.REGEX, "*", id="star"),
+        pytest.param("*.py[cod]", RuleKind.REGEX, "*.py[cod]", id="char_set"),
+        pytest.param("a*b", RuleKind.REGEX, "a*b", id="inner_star"),
+        pytest.param("*gen*", RuleKind.REGEX, "*gen*", id="stars_around"),
+        pytest.param("/build", RuleKind.REGEX, "build", id="anchored"),
+        pytest.param("docs/conf.py", RuleKind.REGEX, "docs/conf.py", id="slash"),
+        pytest.param("\\*.py", RuleKind.REGEX, "\\*.py", id="escaped"),
+    ],
+)
+def test_rule_kind(pattern, kind, text):
+    rule = Rule.from_pattern(pattern, Path("/base"))
+    assert (rule.kind, rule.text) == (kind, text)
+
+
+@pytest.mark.parametrize("vector", [pytest.param(v, id=v.id) for v in test_vectors])
+@pytest.mark.parametrize("base_dir", [None, Path("/some/dir"), Path("dir")])
+def test_match_rules_in_dir__matches_like_last_matching_rule(vector, base_dir):
+    if base_dir is None and any("/" in p.rstrip("/") for p in vector.patterns):
+        pytest.skip("Anchored patterns need a base_dir")
+    rules = list(parse_gitignore_lines(vector.patterns, base_dir))
+    paths = [Path(path) for path in [*vector.does_match, *vector.doesnt_match]]
+    dirs = {Path("/some/dir"), Path("dir"), Path(), *(path.parent for path in paths)}
+    for dir_path in dirs:
+        names = {path.name for path in paths} | {"dir", "sub", "o.py"}
+        for is_dir in [False, True]:
+            expect = {
+                name: rule
+                for name in names
+                if (rule := last_matching_rule(rules, dir_path / name, is_dir=is_dir))
+            }
+            assert match_rules_in_dir(rules, dir_path, names, is_dir=is_dir) == expect
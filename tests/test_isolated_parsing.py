@@ -0,0 +1,156 @@
+"""Verify that isolated parsing survives pathological files."""
+
+import io
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+import pytest
+
+from fawltydeps.isolated_parsing import WorkerPool, parse_sources
+from fawltydeps.types import CodeSource, FailedSource, Location, ParsedImport
+
+
+def parse_all(sources, stdin=None, **kwargs):
+    failed: list[FailedSource] = []
+    imports = list(parse_sources(sources, stdin, on_failure=failed.append, **kwargs))
+    return imports, failed
+
+
+def test_parse_sources__no_limits__finds_same_imports_as_in_process(tmp_path):
+    (tmp_path / "a.py").write_text("import numpy\n")
+    (tmp_path / "b.py").write_text("import pandas\nfrom requests import get\n")
+    sources = [CodeSource(tmp_path / name) for name in ["a.py", "b.py"]]
+    imports, failed = parse_all(sources, timeout=60)
+    assert sorted(imports, key=lambda i: i.name) == [
+        ParsedImport("numpy", Location(tmp_path / "a.py", lineno=1)),
+        ParsedImport("pandas", Location(tmp_path / "b.py", lineno=1)),
+        ParsedImport("requests", Location(tmp_path / "b.py", lineno=2)),
+    ]
+    assert failed == []
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="monkeypatching only reaches workers that are forked",
+)
+def test_parse_sources__exception_in_parser__reports_failed_source(
+    tmp_path, caplog, monkeypatch
+):
+    # Anything but a SyntaxError (which is already handled by the parser)
+    def explode(*_args, **_kwargs):
+        raise RecursionError("maximum recursion depth exceeded")
+
+    monkeypatch.setattr("fawltydeps.extract_imports.parse_source", explode)
+    (tmp_path / "deep.py").write_text("import numpy\n")
+    caplog.set_level(logging.ERROR)
+    imports, failed = parse_all([CodeSource(tmp_path / "deep.py")], timeout=60)
+    assert imports == []
+    reason = "RecursionError: maximum recursion depth exceeded"
+    assert failed == [FailedSource(tmp_path / "deep.py", reason)]
+    assert f"Could not parse code from {tmp_path / 'deep.py'}" in caplog.text
+
+
+def test_parse_sources__parsing_too_slow__reports_failed_sources(tmp_path):
+    paths = [tmp_path / f"module{i}.py" for i in range(3)]
+    for path in paths:
+        path.write_text("import numpy\n" * 10_000)
+    imports, failed = parse_all([CodeSource(path) for path in paths], timeout=1e-6)
+    assert imports == []
+    assert sorted(failed, key=lambda f: f.path) == [
+        FailedSource(path, "Parsing took more than 1e-06 seconds") for path in paths
+    ]
+
+
+@pytest.mark.skipif(
+    sys.platform.startswith("win"), reason="memory limits are not supported"
+)
+def test_parse_sources__parsing_needs_too_much_memory__reports_failed_source(
+    tmp_path,
+):
+    (tmp_path / "small.py").write_text("import numpy\n")
+    (tmp_path / "big.py").write_text("import pandas\n" * 200_000)
+    sources = [CodeSource(tmp_path / "small.py"), CodeSource(tmp_path / "big.py")]
+    imports, failed = parse_all(sources, memory_limit=200_000_000)
+    assert imports == [ParsedImport("numpy", Location(tmp_path / "small.py", lineno=1))]
+    assert [f.path for f in failed] == [tmp_path / "big.py"]
+    assert failed[0].reason.startswith(("MemoryError", "Parser died"))
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="monkeypatching only reaches workers that are forked",
+)
+def test_parse_sources__slow_worker_start_up__does_not_count_against_timeout(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(
+        "fawltydeps.isolated_parsing.limit_memory", lambda _limit: time.sleep(1)
+    )
+    (tmp_path / "a.py").write_text("import numpy\n")
+    imports, failed = parse_all([CodeSource(tmp_path / "a.py")], timeout=0.5)
+    assert imports == [ParsedImport("numpy", Location(tmp_path / "a.py", lineno=1))]
+    assert failed == []
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="monkeypatching only reaches workers that are forked",
+)
+def test_parse_sources__worker_dies_on_start_up__reports_failed_source(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr("fawltydeps.isolated_parsing.limit_memory", os._exit)
+    (tmp_path / "a.py").write_text("import numpy\n")
+    imports, failed = parse_all([CodeSource(tmp_path / "a.py")], memory_limit=1)
+    assert imports == []
+    assert failed == [FailedSource(tmp_path / "a.py", "Parser died (exit code 1)")]
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="monkeypatching only reaches workers that are forked",
+)
+def test_parse_sources__worker_stalls_on_start_up__reports_failed_source(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(
+        "fawltydeps.isolated_parsing.limit_memory", lambda _limit: time.sleep(60)
+    )
+    monkeypatch.setattr("fawltydeps.isolated_parsing.STARTUP_TIMEOUT", 0.5)
+    (tmp_path / "a.py").write_text("import numpy\n")
+    imports, failed = parse_all([CodeSource(tmp_path / "a.py")], memory_limit=1)
+    assert imports == []
+    reason = "Parser did not start within 0.5 seconds"
+    assert failed == [FailedSource(tmp_path / "a.py", reason)]
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="monkeypatching only reaches workers that are forked",
+)
+def test_worker_pool__memory_error__retires_worker(tmp_path, monkeypatch):
+    def parse_in_worker(src, *_args, **_kwargs):
+        if src.path.name == "big.py":
+            raise MemoryError
+        yield ParsedImport(str(os.getpid()), Location(src.path, lineno=1))
+
+    monkeypatch.setattr("fawltydeps.extract_imports.parse_source", parse_in_worker)
+    paths = [tmp_path / name for name in ["a.py", "b.py", "big.py", "c.py"]]
+    for path in paths:
+        path.write_text("")
+    failed: list[FailedSource] = []
+    pool = WorkerPool(60, None, failed.append, size=1)
+    pids = {i.source.path.name: i.name for i in pool.parse(map(CodeSource, paths))}
+    assert failed == [FailedSource(tmp_path / "big.py", "MemoryError")]
+    assert pids["a.py"] == pids["b.py"]  # reused while parsing succeeds
+    assert pids["c.py"] != pids["a.py"]  # replaced after running out of memory
+
+
+def test_parse_sources__stdin__is_parsed_in_process():
+    stdin = io.BytesIO(b"import numpy\n")
+    imports, failed = parse_all([CodeSource("<stdin>")], stdin, timeout=60)
+    assert imports == [ParsedImport("numpy", Location("<stdin>", lineno=1))]
+    assert failed == []
@@ -0,0 +1,67 @@
+"""Verify that our incremental JSON reader reads what the json module reads."""
+
+import io
+import json
+
+import hypothesis.strategies as st
+import pytest
+from hypothesis import given
+
+from fawltydeps.json_reader import JsonReader
+
+json_values = st.recursive(
+    st.none() | st.booleans() | st.integers() | st.floats(allow_nan=False) | st.text(),
+    lambda children: st.lists(children) | st.dictionaries(st.text(), children),
+)
+
+
+def read_all(reader: JsonReader) -> object:
+    """Read the next value via .iter_object()/.iter_array() where possible."""
+    char = reader._peek()  # noqa: SLF001
+    if char == "{":
+        return {key: read_all(reader) for key in reader.iter_object()}
+    if char == "[":
+        return [read_all(reader) for _ in reader.iter_array()]
+    return reader.read_value()
+
+
+@given(value=json_values, indent=st.sampled_from([None, 1]))
+def test_read_all__matches_json_loads(value, indent):
+    doc = json.dumps(value, indent=indent)
+    assert read_all(JsonReader(io.StringIO(doc), chunk_size=3)) == json.loads(doc)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 2**16])
+def test_skip_value__skips_tricky_values_across_chunk_boundaries(chunk_size):
+    skipped = {
+        "brackets": ["]", "}", "[{", '"]'],
+        "escapes": ['\\"', "\\", "\\\\\\", "\n"],
+        "nested": [[[{"a": [{}]}]], 1.5e-3, True, None],
+        "big": "x" * 10_000,
+    }
+    doc = json.dumps({"skip": skipped, "keep": ["\\", '"'], "last": 1})
+    reader = JsonReader(io.StringIO(doc), chunk_size=chunk_size)
+    found = {}
+    for key in reader.iter_object():
+        if key == "skip":
+            reader.skip_value()
+        else:
+            found[key] = reader.read_value()
+    assert found == {"keep": ["\\", '"'], "last": 1}
+
+
+@pytest.mark.parametrize(
+    "doc",
+    [
+        pytest.param('{"a": "unterminated}', id="unterminated_string"),
+        pytest.param('{"a": [1, 2}', id="unterminated_array"),
+        pytest.param('{"a": }', id="missing_value"),
+        pytest.param('{"a" 1}', id="missing_colon"),
+        pytest.param('{"a": 1 "b": 2}', id="missing_comma"),
+        pytest.param('{"a": nope}', id="invalid_value"),
+        pytest.param("", id="empty"),
+    ],
+)
+def test_read_all__invalid_json__raises_decode_error(doc):
+    with pytest.raises(json.JSONDecodeError):
+        read_all(JsonReader(io.StringIO(doc), chunk_size=4))
@@ -0,0 +1,72 @@
+"""Verify that our incremental JSON writer matches the json module's output."""
+
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from fawltydeps.json_writer import JsonWriter, encode
+from fawltydeps.types import (
+    DeclaredDependency,
+    Location,
+    ParsedImport,
+    UndeclaredDependency,
+)
+
+test_documents = {
+    "empty": [],
+    "scalars": [("a", None), ("b", 1), ("c", "two\nlines"), ("d", "ünïcödé")],
+    "empty_containers": [("list", []), ("set", set()), ("dict", {})],
+    "nested": [
+        ("list", [1, [2, 3], {"x": [4, {}]}]),
+        ("dict", {"y": {"z": [None, True]}}),
+    ],
+    "fawltydeps_types": [
+        (
+            "imports",
+            [
+                ParsedImport("numpy", Location(Path("foo.py"), lineno=3)),
+                ParsedImport("pandas", Location(Path("bar.ipynb"), 2, 5)),
+                ParsedImport("requests", Location("<stdin>", lineno=1)),
+            ],
+        ),
+        (
+            "declared_deps",
+            [DeclaredDependency("numpy", Location(Path("requirements.txt")))],
+        ),
+        (
+            "undeclared_deps",
+            [
+                UndeclaredDependency(
+                    "pandas", [Location(Path("bar.ipynb"), 2, 5)], {"b", "a"}
+                )
+            ],
+        ),
+        ("names", {"foo", "bar", "baz"}),
+    ],
+}
+
+
+@pytest.mark.parametrize(
+    "members", [pytest.param(v, id=k) for k, v in test_documents.items()]
+)
+@pytest.mark.parametrize(
+    ("indent", "separators"), [(2, (",", ": ")), (None, (",", ":"))]
+)
+def test_write_object__matches_json_dumps(members, indent, separators):
+    expect = json.dumps(
+        dict(members), indent=indent, separators=separators, default=encode
+    )
+    out = io.StringIO()
+    JsonWriter(out, indent=indent).write_object(members)
+    assert out.getvalue() == expect
+
+
+def test_encode__parsed_import__same_as_dataclass_serialization():
+    imp = ParsedImport("numpy", Location(Path("foo.ipynb"), 2, 3))
+    expect = {
+        "name": "numpy",
+        "source": {"path": "foo.ipynb", "cellno": 2, "lineno": 3},
+    }
+    assert json.loads(json.dumps(imp, default=encode)) == expect
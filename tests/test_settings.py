@@ -15,7 +15,13 @@ import pytest
 from hypothesis import HealthCheck, given, settings, strategies
 
 from fawltydeps.main import build_parser
-from fawltydeps.settings import DEFAULT_IGNORE_UNUSED, Action, OutputFormat, Settings
+from fawltydeps.settings import (
+    DEFAULT_IGNORE_UNUSED,
+    Action,
+    OutputFormat,
+    Settings,
+    SourceDiscovery,
+)
 from fawltydeps.types import TomlData
 
 if sys.version_info >= (3, 11):
@@ -44,8 +50,17 @@ EXPECT_DEFAULTS = dict(
     install_deps=False,
     exclude={".*"},
     exclude_from=set(),
+    use_gitignore=False,
     verbosity=0,
     custom_mapping_file=set(),
+    source_discovery=SourceDiscovery.WALK,
+    extra_code_formats=set(),
+    traversal_threads=0,
+    max_file_size=None,
+    max_files_per_dir=None,
+    max_files=None,
+    parse_timeout=None,
+    parse_memory_limit=None,
 )
 
 
@@ -278,6 +293,11 @@ settings_tests_samples = [
         config=dict(actions="list_imports"),  # actions is not a list
         expect=ValidationError,
     ),
+    SettingsTestVector(
+        "config_file_negative_limit__raises_ValidationError",
+        config=dict(traversal_threads=-2),  # limits must not be negative
+        expect=ValidationError,
+    ),
     SettingsTestVector(
         "config_file__overrides_some_defaults",
         config=dict(actions=["list_deps"], deps=["my_requirements.txt"]),
@@ -394,6 +414,11 @@ settings_tests_samples = [
         cmdline=dict(actions="list_imports"),  # should be list/set, not str
         expect=ValidationError,
     ),
+    SettingsTestVector(
+        "cmd_line_negative_limit__raises_ValidationError",
+        cmdline=dict(max_files=-1),  # limits must not be negative
+        expect=ValidationError,
+    ),
     SettingsTestVector(
         "cmd_line__overrides_some_defaults",
         cmdline=dict(actions={Action.LIST_IMPORTS}, ignore_unused={"foo", "bar"}),
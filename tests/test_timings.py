@@ -0,0 +1,72 @@
+"""Verify the --timings and --profile instrumentation."""
+
+import io
+import json
+import pstats
+import time
+
+from fawltydeps import timings
+from fawltydeps.timings import Timings, instrumented
+
+from .utils import run_fawltydeps_function
+
+SLEEP = 0.05
+
+
+def test_measure__nested_stages__times_are_exclusive():
+    t = Timings()
+    with t.measure("outer"), t.measure("inner"):
+        time.sleep(SLEEP)
+
+    assert list(t.stages) == ["inner", "outer"]
+    assert t.stages["inner"].wall >= SLEEP
+    assert t.stages["outer"].wall < SLEEP
+
+
+def test_measure__not_active__is_a_noop():
+    with timings.measure("anything") as stage:
+        pass
+    assert stage is None
+
+
+def test_instrumented__reports_stages_and_deactivates():
+    out = io.StringIO()
+    with instrumented(timings=True, profile=None, out=out), timings.measure("x"):
+        pass
+
+    assert timings.active is None
+    lines = out.getvalue().splitlines()
+    assert lines[0].startswith("Stage")
+    assert lines[1].startswith("x ")
+    assert lines[-1].startswith("Total")
+
+
+def test_main__timings__included_in_json_output(fake_project):
+    project = fake_project(imports=["requests"], declared_deps=["requests"])
+    output, _exit_code = run_fawltydeps_function(
+        str(project), "--json", "--timings", "--pyenv", str(project)
+    )
+    stages = {stage["name"]: stage for stage in json.loads(output)["timings"]}
+
+    assert {
+        "traversal",
+        "parse code",
+        "parse deps",
+        "setup resolvers",
+        "resolution",
+        "undeclared deps",
+        "unused deps",
+    } <= stages.keys()
+    assert stages["parse code"]["count"] == 1
+    assert all(stage["wall"] >= 0 for stage in stages.values())
+
+
+def test_main__profile__writes_pstats_file(fake_project, tmp_path):
+    project = fake_project(imports=["requests"], declared_deps=["requests"])
+    profile = tmp_path / "fawltydeps.pstats"
+    run_fawltydeps_function(
+        str(project), f"--profile={profile}", "--pyenv", str(project)
+    )
+
+    stats = pstats.Stats(str(profile))
+    assert any(func[2] == "create" for func in stats.stats)
@@ -0,0 +1,117 @@
+"""Verify behavior of the TOML document cache."""
+
+import os
+from textwrap import dedent
+
+import pytest
+
+from fawltydeps.extract_deps.pyproject_toml_parser import parse_pyproject_toml
+from fawltydeps.main import Analysis
+from fawltydeps.settings import Settings
+from fawltydeps.toml_cache import TomlCache, TOMLDecodeError, toml_cache
+
+
+def touch_later(path):
+    """Bump the mtime of the given path, independent of timestamp resolution."""
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_document__same_file_twice__is_parsed_once(tmp_path):
+    path = tmp_path / "test.toml"
+    path.write_text("[foo]\nbar = 1\n")
+    cache = TomlCache()
+    with cache.document(path) as first:
+        assert first == {"foo": {"bar": 1}}
+    with cache.document(path) as second:
+        assert second is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_document__modified_file__is_parsed_again(tmp_path):
+    path = tmp_path / "test.toml"
+    path.write_text("[foo]\nbar = 1\n")
+    cache = TomlCache()
+    with cache.document(path) as first:
+        assert first == {"foo": {"bar": 1}}
+    path.write_text("[foo]\nbar = 22\n")
+    touch_later(path)
+    with cache.document(path) as second:
+        assert second == {"foo": {"bar": 22}}
+    assert (cache.hits, cache.misses, len(cache)) == (0, 2, 1)
+
+
+def test_document__invalid_toml__propagates_error_and_caches_nothing(tmp_path):
+    path = tmp_path / "test.toml"
+    path.write_text("[foo\n")
+    cache = TomlCache()
+    with pytest.raises(TOMLDecodeError), cache.document(path):
+        pass
+    assert len(cache) == 0
+
+
+def test_document__missing_file__propagates_error(tmp_path):
+    cache = TomlCache()
+    with pytest.raises(FileNotFoundError), cache.document(tmp_path / "missing"):
+        pass
+
+
+def test_document__large_file__is_evicted_when_last_user_is_done(tmp_path):
+    path = tmp_path / "large.toml"
+    path.write_text("[foo]\nbar = 1\n")
+    cache = TomlCache(large_file_size=4)
+    with cache.document(path) as outer:
+        with cache.document(path) as inner:
+            assert inner is outer
+        assert len(cache) == 1  # still in use by outer
+    assert len(cache) == 0
+
+
+def test_document__total_size_is_bounded__least_recently_used_is_evicted(
+    tmp_path,
+):
+    paths = [tmp_path / f"{i}.toml" for i in range(3)]
+    for i, path in enumerate(paths):
+        path.write_text(f"num = {i}\n")  # 8 bytes each
+    cache = TomlCache(max_total_size=20)
+    for path in paths:
+        with cache.document(path):
+            pass
+    assert cache.total_size == sum(p.stat().st_size for p in paths[1:])
+    with cache.document(paths[2]):  # still cached
+        pass
+    with cache.document(paths[0]):  # was evicted, must be parsed again
+        pass
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_pyproject_toml__shared_between_settings_and_deps_parser(tmp_path):
+    path = tmp_path / "pyproject.toml"
+    path.write_text(
+        dedent(
+            """\
+            [project]
+            name = "my_project"
+            dependencies = ["foo"]
+
+            [tool.fawltydeps]
+            ignore_unused = ["foo"]
+            """
+        )
+    )
+    toml_cache.clear()
+    misses = toml_cache.misses
+    settings = Settings.config(config_file=path)()
+    assert settings.ignore_unused == {"foo"}
+    assert [dep.name for dep in parse_pyproject_toml(path)] == ["foo"]
+    assert toml_cache.misses == misses + 1
+
+
+def test_analysis_create__clears_toml_cache_at_end_of_run(fake_project):
+    project = fake_project(
+        imports=["foo"], files_with_declared_deps={"pyproject.toml": ["foo"]}
+    )
+    settings = Settings(code={project}, deps={project}, pyenvs=set())
+    analysis = Analysis.create(settings)
+    assert [dep.name for dep in analysis.declared_deps] == ["foo"]
+    assert len(toml_cache) == 0
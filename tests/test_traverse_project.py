@@ -10,14 +10,16 @@ from typing import Optional
 
 import pytest
 
+from fawltydeps import traverse_project
 from fawltydeps.gitignore_parser import RuleMissing
 from fawltydeps.settings import ParserChoice, Settings
-from fawltydeps.traverse_project import find_sources
+from fawltydeps.traverse_project import SourceLimits, SourcesCache, find_sources
 from fawltydeps.types import (
     CodeSource,
     DepsSource,
     PathOrSpecial,
     PyEnvSource,
+    SkippedSource,
     UnparseablePathError,
 )
 
@@ -1031,3 +1033,106 @@ def test_find_sources_with_relative_paths(
         record.message for record in caplog.records if record.levelno == logging.WARNING
     ]
     assert_unordered_equivalence(actual_warnings, vector.expect_warnings)
+
+
+@pytest.mark.parametrize(
+    ("limits", "expect_skipped"),
+    [
+        pytest.param({}, {}, id="no_limits"),
+        pytest.param(
+            {"max_file_size": 100},
+            {"big.py": "1000 bytes, more than max_file_size = 100"},
+            id="max_file_size",
+        ),
+        pytest.param(
+            {"max_files_per_dir": 3},
+            {"generated": "5 files to parse, more than max_files_per_dir = 3"},
+            id="max_files_per_dir",
+        ),
+        pytest.param(
+            {"max_files": 0},
+            {
+                ".": "3 files to parse, after reaching max_files = 0",
+                "generated": "5 files to parse, after reaching max_files = 0",
+            },
+            id="max_files",
+        ),
+    ],
+)
+def test_find_sources__with_limits__yields_skipped_sources(
+    tmp_path, limits, expect_skipped
+):
+    (tmp_path / "small.py").write_text("import foo\n")
+    (tmp_path / "big.py").write_text("#" * 999 + "\n")
+    (tmp_path / "requirements.txt").write_text("foo\n")
+    (tmp_path / "generated").mkdir()
+    for i in range(5):
+        (tmp_path / "generated" / f"gen{i}.py").write_text("import bar\n")
+    # Files given directly are never skipped
+    given = tmp_path / "generated" / "gen0.py"
+    settings = Settings(code={tmp_path, given}, deps={tmp_path}, pyenvs=set(), **limits)
+
+    sources = set(find_sources(settings))
+    skipped = {
+        src.path: src.reason for src in sources if isinstance(src, SkippedSource)
+    }
+    assert skipped == {
+        tmp_path / path: reason for path, reason in expect_skipped.items()
+    }
+    parsed = {src.path for src in sources if not isinstance(src, SkippedSource)}
+    assert given in parsed
+    for path in skipped:
+        assert not any(path in (p, p.parent) for p in parsed - {given})
+
+
+@pytest.mark.parametrize(
+    ("extra_code_formats", "expect_found"),
+    [
+        pytest.param(set(), {"code.py"}, id="default"),
+        pytest.param({".pyi", ".qmd"}, {"code.py", "stub.pyi", "doc.qmd"}, id="extra"),
+    ],
+)
+def test_find_sources__extra_code_formats__are_only_found_when_enabled(
+    tmp_path, extra_code_formats, expect_found
+):
+    (tmp_path / "code.py").write_text("import foo\n")
+    (tmp_path / "stub.pyi").write_text("import bar\n")
+    (tmp_path / "doc.qmd").write_text("```{python}\nimport baz\n```\n")
+    # Files given directly are always parsed
+    given = tmp_path / "given" / "notes.Rmd"
+    given.parent.mkdir()
+    given.write_text("```{python}\nimport qux\n```\n")
+    settings = Settings(code={tmp_path, given}, extra_code_formats=extra_code_formats)
+
+    sources = set(find_sources(settings, {CodeSource}))
+    assert {src.path for src in sources} == {
+        *(tmp_path / name for name in expect_found),
+        given,
+    }
+
+
+def test_source_limits__file_removed_before_size_check__is_dropped(tmp_path):
+    (tmp_path / "kept.py").write_text("import foo\n")
+    (tmp_path / "removed.py").write_text("import bar\n")
+    sources = [CodeSource(tmp_path / "kept.py"), CodeSource(tmp_path / "removed.py")]
+    (tmp_path / "removed.py").unlink()
+
+    limits = SourceLimits(Settings(max_file_size=100))
+    assert list(limits.apply(tmp_path, sources)) == [sources[0]]
+
+
+def test_find_sources__cached__file_edited_past_max_file_size__is_skipped(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(traverse_project, "sources_cache", SourcesCache())
+    code = tmp_path / "code.py"
+    code.write_text("import foo\n")
+    settings = Settings(code={tmp_path}, deps=set(), pyenvs=set(), max_file_size=100)
+    dir_mtime = tmp_path.stat().st_mtime_ns
+
+    assert set(find_sources(settings)) == {CodeSource(code, tmp_path)}
+    code.write_text("import foo\n" * 100)  # edited in place
+    os.utime(tmp_path, ns=(dir_mtime, dir_mtime))
+    assert set(find_sources(settings)) == {
+        SkippedSource(code, "1100 bytes, more than max_file_size = 100")
+    }
@@ -1,13 +1,23 @@
 """Verify behavior of our basic types."""
 
+import copy
+import gc
 import os
+import pickle
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import FrozenInstanceError
 from pathlib import Path
 
 import pytest
 
-from fawltydeps.types import DeclaredDependency, Location, ParsedImport
+from fawltydeps.types import (
+    CodeSource,
+    DeclaredDependency,
+    Location,
+    ParsedImport,
+    PathTable,
+)
 
 testdata = {  # Test ID -> (Location args, expected string representation, sort order)
     # First arg must be a Path, or "<stdin>"
@@ -136,3 +146,94 @@ def test_declareddependency_is_immutable():
         dd.name = "bar_package"
     with pytest.raises(FrozenInstanceError):
         dd.source = dd.source.supply(lineno=123)
+
+
+def test_path_table__equal_paths__map_to_same_entry():
+    table = PathTable()
+    foo = table.intern(Path("foo.py"))
+    stdin = table.intern("<stdin>")
+    assert table.intern(Path("foo.py")) is foo
+    assert (foo.id, stdin.id) == (0, 1)
+    assert len(table) == len({foo, stdin})
+
+
+def test_path_table__unused_entries__are_removed():
+    table = PathTable()
+    foo = table.intern(Path("foo.py"))
+    bar_id = table.intern(Path("bar.py")).id  # no reference to the entry is kept
+    gc.collect()
+    assert len(table) == 1
+    assert table.intern(Path("foo.py")) is foo
+    assert table.intern(Path("bar.py")).id != bar_id
+
+
+def test_path_table__concurrent_interning__maps_equal_paths_to_same_entry():
+    table = PathTable()
+    paths = [Path(f"file{i}.py") for i in range(100)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: list(map(table.intern, paths)), range(8)))
+    assert all(a is b for entries in results for a, b in zip(entries, results[0]))
+    assert len({entry.id for entry in results[0]}) == len(paths)
+
+
+def test_location__equal_paths__stay_equal_while_other_entries_come_and_go():
+    loc = Location(Path("foo.py"), lineno=1)
+    for i in range(100):
+        Location(Path(f"tmp{i}.py"))
+    gc.collect()
+    assert Location(Path("foo.py"), lineno=1) == loc
+    assert hash(Location(Path("foo.py"), lineno=1)) == hash(loc)
+
+
+def test_location__same_path_as_source__shares_path_object(tmp_path):
+    code = tmp_path / "code.py"
+    code.touch()
+    loc = Location(code)
+    source = CodeSource(Path(str(code)))
+    assert source.path is loc.path
+
+
+def test_location__equal_paths__share_one_path_object():
+    loc1 = Location(Path("foo") / "bar.py")
+    loc2 = Location(Path("foo/bar.py"), lineno=3)
+    assert loc1.path is loc2.path
+    assert loc2.supply(cellno=2).path is loc1.path
+
+
+@pytest.mark.parametrize(
+    ("loc", "expect"),
+    [
+        pytest.param(Location("<stdin>"), {"path": "<stdin>"}, id="path_only"),
+        pytest.param(
+            Location(Path("foo.py"), lineno=3),
+            {"path": Path("foo.py"), "lineno": 3},
+            id="path_and_lineno",
+        ),
+        pytest.param(
+            Location(Path("foo.ipynb"), 2, 3),
+            {"path": Path("foo.ipynb"), "cellno": 2, "lineno": 3},
+            id="path_cellno_and_lineno",
+        ),
+    ],
+)
+def test_location__to_dict__omits_unset_members(loc, expect):
+    assert loc.to_dict() == expect
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        pytest.param(Location(Path("foo.ipynb"), 2, 3), id="Location"),
+        pytest.param(
+            ParsedImport("foo_module", Location(Path("foo.py"), lineno=1)),
+            id="ParsedImport",
+        ),
+        pytest.param(
+            DeclaredDependency("foo_package", Location(Path("requirements.txt"))),
+            id="DeclaredDependency",
+        ),
+    ],
+)
+def test_immutable_types__survive_copy_and_pickle(obj):
+    assert copy.deepcopy(obj) == obj
+    assert pickle.loads(pickle.dumps(obj)) == obj  # noqa: S301
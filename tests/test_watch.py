@@ -0,0 +1,174 @@
+"""Verify the incremental analysis behind 'fawltydeps --watch'."""
+
+import io
+import threading
+import time
+
+import pytest
+
+from fawltydeps.main import Analysis
+from fawltydeps.settings import Action, Settings
+from fawltydeps.watch import IncrementalAnalysis, InotifyWaiter, watch
+
+from .utils import run_fawltydeps_function, run_fawltydeps_subprocess
+
+
+def results(analysis):
+    """Normalize undeclared/unused deps for comparison across analyses."""
+    return (
+        sorted(
+            (dep.name, sorted(set(dep.references)), dep.candidates)
+            for dep in analysis.undeclared_deps
+        ),
+        sorted((dep.name, sorted(set(dep.references))) for dep in analysis.unused_deps),
+    )
+
+
+@pytest.fixture
+def project(fake_project):
+    return fake_project(
+        files_with_imports={
+            "a.py": ["numpy", "requests"],
+            "b.py": ["requests", "pandas"],
+        },
+        declared_deps=["requests", "click"],
+        fake_venvs={".venv": {"requests": {"requests"}, "click": {"click"}}},
+    )
+
+
+@pytest.fixture
+def settings(project):
+    return Settings(
+        actions={Action.REPORT_UNDECLARED, Action.REPORT_UNUSED},
+        code={project},
+        deps={project},
+        pyenvs={project / ".venv"},
+    )
+
+
+def test_update__first_time__matches_full_analysis(settings):
+    state = IncrementalAnalysis(settings)
+    changed = state.update()
+
+    assert changed == state.sources
+    assert results(state.analysis()) == results(Analysis.create(settings))
+
+
+def test_update__nothing_changed__parses_nothing_and_reuses_resolution(settings):
+    state = IncrementalAnalysis(settings)
+    state.update()
+    state.analysis()
+    resolvers = state.resolvers
+
+    assert state.update() == set()
+    assert state.resolvers is resolvers
+
+
+def test_update__modified_file__reparses_only_that_file(project, settings):
+    state = IncrementalAnalysis(settings)
+    state.update()
+    imports_in_b = state.imports[
+        next(s for s in state.imports if s.path.name == "b.py")
+    ]
+    (project / "a.py").write_text("import numpy\nimport click\nimport scipy\n")
+    changed = state.update()
+
+    assert [src.path.name for src in changed] == ["a.py"]
+    assert any(
+        imp is imports_in_b[0] for imps in state.imports.values() for imp in imps
+    )
+    assert set(state.importers) == {"numpy", "click", "scipy", "requests", "pandas"}
+    assert results(state.analysis()) == results(Analysis.create(settings))
+
+
+def test_update__modified_file__reuses_traversal(project, settings):
+    state = IncrementalAnalysis(settings)
+    state.update()
+    (project / "a.py").write_text("import numpy\n")
+    state.update()
+    assert (state.sources_cache.misses, state.sources_cache.hits) == (1, 1)
+
+    (project / "c.py").write_text("import scipy\n")
+    changed = state.update()
+    assert state.sources_cache.misses == 2  # noqa: PLR2004
+    assert "c.py" in {src.path.name for src in changed}
+    assert "scipy" in state.importers
+
+
+def test_update__parse_timeout__parses_code_in_isolation(
+    project, settings, monkeypatch, fail_parsing
+):
+    fail_parsing("a.py")
+    state = IncrementalAnalysis(settings.copy(update={"parse_timeout": 60}))
+    state.update()
+    assert [src.path for src in state.analysis().failed_sources] == [project / "a.py"]
+    assert "numpy" not in state.importers
+
+    monkeypatch.undo()
+    (project / "a.py").write_text("import requests\n")
+    state.update()
+    assert state.analysis().failed_sources == []
+
+
+def test_update__removed_file__drops_its_reference_counts(project, settings):
+    state = IncrementalAnalysis(settings)
+    state.update()
+    (project / "b.py").unlink()
+    changed = state.update()
+
+    # a.py is also re-parsed, as b.py was a potential first-party import
+    assert {src.path.name for src in changed} == {"a.py", "b.py"}
+    assert "pandas" not in state.importers
+    assert sum(state.importers["requests"].values()) == 1
+    assert results(state.analysis()) == results(Analysis.create(settings))
+
+
+def test_update__new_declared_dep__redoes_resolution(project, settings):
+    state = IncrementalAnalysis(settings)
+    state.update()
+    state.analysis()
+    (project / "requirements.txt").write_text("requests\nclick\npandas\n")
+    state.update()
+
+    assert state.resolvers is None
+    analysis = state.analysis()
+    assert "pandas" not in {dep.name for dep in analysis.undeclared_deps}
+    assert results(analysis) == results(Analysis.create(settings))
+
+
+def test_watch__one_round__prints_same_output_as_fawltydeps(project):
+    args = [str(project), "--detailed", "--pyenv", str(project / ".venv")]
+    expect_output, expect_exit_code = run_fawltydeps_function(*args)
+
+    settings = Settings(
+        code={project},
+        deps={project},
+        pyenvs={project / ".venv"},
+        output_format="human_detailed",
+    )
+    out = io.StringIO()
+    exit_code = watch(settings, out, max_rounds=1)
+    assert out.getvalue().strip() == expect_output
+    assert exit_code == expect_exit_code
+
+
+def test_main__watch_code_from_stdin__fails_with_exit_code_2():
+    _output, errors, returncode = run_fawltydeps_subprocess("--watch", "--code", "-")
+    assert "Cannot watch code read from stdin" in errors
+    assert returncode == 2  # noqa: PLR2004
+
+
+def test_inotify_waiter__file_modified__returns_before_timeout(tmp_path):
+    try:
+        waiter = InotifyWaiter()
+    except (OSError, AttributeError):
+        pytest.skip("inotify is not available")
+    waiter.interval = 10.0
+    waiter.watch([tmp_path])
+    threading.Timer(0.1, (tmp_path / "new.py").touch).start()
+    try:
+        start = time.monotonic()
+        waiter.wait()
+        assert time.monotonic() - start < waiter.interval
+    finally:
+        waiter.close()